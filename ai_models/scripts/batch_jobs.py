@@ -0,0 +1,243 @@
+import os
+import json
+import random
+import argparse
+from time import monotonic, sleep, time
+
+
+# Orchestration for sharded batch prediction: the scoring input is split into N
+# shards by student hash, shards are submitted with bounded concurrency and
+# polled with exponential backoff, and job state is written to a JSON file after
+# every change so an interrupted run resumes where it stopped.
+#
+# A client does the cloud side and has three methods:
+#   shard_source(source, shard, shards) -> source of one shard (table id)
+#   submit(source, destination, name)   -> job id
+#   status(job_id)                      -> (state, rows scored or None)
+# VertexClient talks to BigQuery + aiplatform; FakeClient needs nothing and is
+# used for dry runs and tests.
+
+STATE_FILE = "batch_jobs.json"
+SUCCEEDED = "JOB_STATE_SUCCEEDED"
+FAILED = "JOB_STATE_FAILED"
+CANCELLED = "JOB_STATE_CANCELLED"
+EXPIRED = "JOB_STATE_EXPIRED"
+# Some instances failed; the shard is retried (a retry rescores the whole shard
+# into a new destination table) and only counts as succeeded when fully scored
+PARTIALLY_SUCCEEDED = "JOB_STATE_PARTIALLY_SUCCEEDED"
+PENDING = "PENDING"  # not submitted yet
+DONE_STATES = {SUCCEEDED, FAILED, CANCELLED, EXPIRED, PARTIALLY_SUCCEEDED}
+RETRY_STATES = DONE_STATES - {SUCCEEDED}
+# Still going; any other state Vertex reports is treated as FAILED
+ACTIVE_STATES = {"SUBMITTED", "JOB_STATE_QUEUED", "JOB_STATE_PENDING", "JOB_STATE_RUNNING",
+                 "JOB_STATE_CANCELLING", "JOB_STATE_PAUSED", "JOB_STATE_UPDATING"}
+
+
+def shard_query(source: str, shard: int, shards: int) -> str:
+    # Stable split on student_id so every student's candidates land in one shard
+    return (f"SELECT * FROM `{source}` "
+            f"WHERE MOD(ABS(FARM_FINGERPRINT(student_id)), {shards}) = {shard}")
+
+
+# -----------------------------
+# Clients
+# -----------------------------
+
+class VertexClient:
+    def __init__(self, project: str, location: str, model_id: str):
+        try:
+            from google.cloud import aiplatform
+        except ImportError:
+            raise SystemExit("The vertex backend needs google-cloud-aiplatform: pip install google-cloud-aiplatform")
+        self.aiplatform = aiplatform
+        self.project = project
+        self.location = location
+        aiplatform.init(project=project, location=location)
+        self.model = aiplatform.Model(model_name=f"projects/{project}/locations/{location}/models/{model_id}")
+        self._bq = None
+
+    def shard_source(self, source: str, shard: int, shards: int) -> str:
+        if shards == 1:
+            return source
+        if self._bq is None:
+            try:
+                from google.cloud import bigquery
+            except ImportError:
+                raise SystemExit("Sharding needs google-cloud-bigquery: pip install google-cloud-bigquery")
+            self._bq = bigquery.Client(project=self.project, location=self.location)
+        table = f"{source}_shard{shard:03d}of{shards:03d}"
+        self._bq.query(f"CREATE OR REPLACE TABLE `{table}` AS {shard_query(source, shard, shards)}").result()
+        return table
+
+    def submit(self, source: str, destination: str, name: str) -> str:
+        job = self.model.batch_predict(
+            job_display_name=name,
+            bigquery_source=f"bq://{source}",
+            bigquery_destination_prefix=f"bq://{destination}",
+            sync=False,
+        )
+        job.wait_for_resource_creation()
+        return job.resource_name
+
+    def status(self, job_id: str):
+        job = self.aiplatform.BatchPredictionJob(job_id)
+        stats = job.completion_stats
+        rows = int(stats.successful_count) if stats and stats.successful_count else None
+        return job.state.name, rows
+
+
+class FakeClient:
+    # Every job "scores" `rows` rows, runs for a random duration and fails with
+    # probability fail_rate. The outcome is encoded in the job id, so a resumed
+    # run can poll jobs submitted by an earlier process.
+
+    def __init__(self, rows: int = 1_000_000, seconds=(1.0, 5.0), fail_rate: float = 0.0, seed: int = 42):
+        self.rows = rows
+        self.seconds = seconds
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+
+    def shard_source(self, source: str, shard: int, shards: int) -> str:
+        return source if shards == 1 else f"{source}_shard{shard:03d}of{shards:03d}"
+
+    def submit(self, source: str, destination: str, name: str) -> str:
+        finish = time() + self.rng.uniform(*self.seconds)
+        state = FAILED if self.rng.random() < self.fail_rate else SUCCEEDED
+        return f"fake/{name}/{finish:.3f}/{state}/{self.rows}"
+
+    def status(self, job_id: str):
+        _, _, finish, state, rows = job_id.split("/")
+        if time() < float(finish):
+            return "JOB_STATE_RUNNING", None
+        return state, int(rows) if state == SUCCEEDED else None
+
+
+# -----------------------------
+# State + orchestration
+# -----------------------------
+
+def load_state(path: str, source: str, shards: int):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["source"] == source and state["shards"] == shards:
+            return state
+        print(f"Ignoring {path}: it tracks {state['shards']} shard(s) of {state['source']}")
+    return {
+        "source": source,
+        "shards": shards,
+        "jobs": [{"shard": i, "state": PENDING, "attempts": 0} for i in range(shards)],
+    }
+
+
+def save_state(path: str, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run_jobs(client, source: str, destination: str, shards: int = 1, max_concurrent: int = 4,
+             retries: int = 2, state_path: str = STATE_FILE, wait: bool = True,
+             poll_initial: float = 5.0, poll_max: float = 120.0, name: str = "recs"):
+    state = load_state(state_path, source, shards)
+    jobs = state["jobs"]
+    # Failed jobs from an earlier run get their remaining attempts
+    for job in jobs:
+        if job["state"] in RETRY_STATES and job["attempts"] <= retries:
+            job["state"] = PENDING
+    started, run_started = monotonic(), time()
+    next_poll = {}  # shard -> (monotonic time, interval)
+
+    def running():
+        return [j for j in jobs if j.get("job_id") and j["state"] not in DONE_STATES | {PENDING}]
+
+    while True:
+        # Submit up to max_concurrent
+        for job in jobs:
+            if len(running()) >= max_concurrent:
+                break
+            if job["state"] != PENDING:
+                continue
+            shard = job["shard"]
+            job["source"] = job.get("source") or client.shard_source(source, shard, shards)
+            job["job_id"] = client.submit(job["source"], destination, f"{name}-{shard:03d}of{shards:03d}")
+            job["state"] = "SUBMITTED"
+            job["attempts"] += 1
+            job["submitted_at"] = time()
+            job.pop("finished_at", None)
+            job.pop("rows", None)
+            next_poll[shard] = (monotonic() + poll_initial, poll_initial)
+            print(f"shard {shard}: submitted {job['job_id']} (attempt {job['attempts']})")
+            save_state(state_path, state)
+
+        active = running()
+        if not wait or not active:
+            break
+
+        # Poll whatever is due, back off the rest
+        due = min(next_poll.get(j["shard"], (0, poll_initial))[0] for j in active)
+        sleep(max(0.0, due - monotonic()))
+        for job in active:
+            shard = job["shard"]
+            at, interval = next_poll.get(shard, (0, poll_initial))
+            if at > monotonic():
+                continue
+            job["state"], rows = client.status(job["job_id"])
+            if job["state"] not in DONE_STATES | ACTIVE_STATES:
+                print(f"shard {shard}: unknown state {job['state']}, treating it as failed")
+                job["state"] = FAILED
+            if job["state"] in DONE_STATES:
+                job["finished_at"] = time()
+                job["rows"] = rows
+                if job["state"] != SUCCEEDED and job["attempts"] <= retries:
+                    print(f"shard {shard}: {job['state']}, retrying")
+                    job["state"] = PENDING
+                else:
+                    print(f"shard {shard}: {job['state']}")
+            else:
+                interval = min(poll_max, interval * 2)
+                next_poll[shard] = (monotonic() + interval * random.uniform(0.8, 1.2), interval)
+            save_state(state_path, state)
+
+    report(state, monotonic() - started, run_started)
+    return state
+
+
+def report(state, wall: float, run_started: float = 0.0):
+    # Throughput covers only the shards that finished in this run, timed from
+    # the earliest of their submissions (a resumed job may predate the run)
+    print(f"{'shard':>5}  {'state':<30}{'attempts':>9}{'rows':>14}{'secs':>9}{'rows/s':>12}")
+    for job in state["jobs"]:
+        secs = job["finished_at"] - job["submitted_at"] if job.get("finished_at") else None
+        rows = job.get("rows")
+        print(f"{job['shard']:>5}  {job['state']:<30}{job['attempts']:>9}"
+              f"{f'{rows:,}' if rows is not None else '-':>14}"
+              f"{f'{secs:.1f}' if secs is not None else '-':>9}"
+              f"{f'{rows / secs:,.0f}' if rows and secs else '-':>12}")
+    done = sum(j["state"] == SUCCEEDED for j in state["jobs"])
+    total = sum(j.get("rows") or 0 for j in state["jobs"] if j["state"] == SUCCEEDED)
+    now = [j for j in state["jobs"] if j["state"] == SUCCEEDED and j.get("finished_at", 0) >= run_started]
+    rows = sum(j.get("rows") or 0 for j in now)
+    span = max([j["finished_at"] for j in now], default=0) - min([run_started] + [j["submitted_at"] for j in now])
+    print(f"{done}/{len(state['jobs'])} shard(s) succeeded, {total:,} rows; wall clock {wall:.1f}s"
+          + (f"; {len(now)} shard(s) finished this run, {rows:,} rows in {span:.1f}s ({rows / span:,.0f} rows/s)"
+             if rows and span > 0 else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dry run of sharded batch prediction against FakeClient")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--max-concurrent", type=int, default=3)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--rows", type=int, default=22_000_000)
+    parser.add_argument("--state", default=STATE_FILE)
+    args = parser.parse_args()
+
+    client = FakeClient(args.rows // args.shards, (1.0, 4.0), args.fail_rate)
+    run_jobs(client, "project.dataset.recs_scoring_input", "project.dataset", args.shards,
+             args.max_concurrent, state_path=args.state, poll_initial=0.5, poll_max=2.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from time import perf_counter
+
+import data_gen as dg
+from schemas import TABLE_SCHEMAS
+from table_io import peak_rss_mb, write_table
+
+
+# Benchmarks for the data_gen.py stages, the table writers, Faker text and the
+# local feature pipeline at several scale factors (scale 1 = DEFAULT_COUNTS).
+# Every (case, scale) runs in its own process, so peak RSS belongs to that case
+# alone; the tables a stage samples from are built first and not timed.
+#
+#   python scripts\bench_pipeline.py --scales 1,2,4 --out bench.json
+#   python scripts\bench_pipeline.py --compare bench.json          # exit 1 on regressions
+#   python scripts\bench_pipeline.py --cases events,write_csv --profile cprofile
+#
+# --profile cprofile prints the top functions by own time (and keeps the .prof
+# files); --profile tracemalloc prints the top allocation sites. Both slow the
+# timed run down, so don't compare their timings with plain runs.
+
+AS_OF = datetime(2026, 10, 1)
+
+
+class World:
+    # Entity tables in data_gen order, built on first use
+    def __init__(self, scale: float):
+        self.counts = dg.scale_counts(scale)
+        dg.set_as_of(AS_OF)
+        dg.seed_everything(dg.SEED)
+        self._cache = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._cache:
+            getattr(self, f"_build_{name}")()
+        return self._cache[name]
+
+    def _build_users(self):
+        c = self.counts
+        users, students, tutors, admins = dg.generate_users(c["students"], c["tutors"], c["admins"])
+        self._cache.update(users=users, student_ids=students, tutor_ids=tutors, admin_ids=admins)
+
+    _build_student_ids = _build_tutor_ids = _build_admin_ids = _build_users
+
+    def _build_tutor_profiles(self):
+        self._cache["tutor_profiles"] = dg.generate_tutor_profiles(self.tutor_ids, self.admin_ids)
+
+    def _build_venues(self):
+        self._cache["venues"] = dg.generate_venues(self.counts["venues"])
+
+    def _build_classes(self):
+        self._cache["classes"] = dg.generate_classes(self.counts["classes"], self.tutor_profiles, self.venues)
+
+    def _build_enrollments(self):
+        self._cache["enrollments"] = dg.generate_enrollments(self.classes, self.student_ids, self.counts["enrollments"])
+
+    def _build_events(self):
+        self._cache["events"] = list(dg.iter_events(self.enrollments, self.classes, self.student_ids,
+                                                    self.counts["events"]))
+
+
+# -----------------------------
+# Cases: setup(world) -> run() -> output (rows, or an int row count)
+# -----------------------------
+
+def case_users(w):
+    c = w.counts
+    return lambda: dg.generate_users(c["students"], c["tutors"], c["admins"])[0]
+
+
+def case_profiles(w):
+    students, tutors, admins = w.student_ids, w.tutor_ids, w.admin_ids
+    return lambda: (dg.generate_student_profiles(students), dg.generate_tutor_profiles(tutors, admins),
+                    dg.generate_admin_profiles(admins))
+
+
+def case_classes(w):
+    tutor_profiles, venues = w.tutor_profiles, w.venues
+    return lambda: dg.generate_classes(w.counts["classes"], tutor_profiles, venues)
+
+
+def case_class_sessions(w):
+    classes, venues = w.classes, w.venues
+    return lambda: dg.generate_class_sessions(classes, venues)
+
+
+def case_enrollments(w):
+    classes, students = w.classes, w.student_ids
+    return lambda: dg.generate_enrollments(classes, students, w.counts["enrollments"])
+
+
+def case_billing(w):
+    enrollments, classes, admins = w.enrollments, w.classes, w.admin_ids
+    return lambda: dg.generate_billing(enrollments, classes, admins)
+
+
+def case_messages(w):
+    classes, students, tutors = w.classes, w.student_ids, w.tutor_ids
+    return lambda: dg.generate_messages(classes, students, tutors, w.counts["messages"])
+
+
+def case_notifications(w):
+    students, tutors = w.student_ids, w.tutor_ids
+    return lambda: dg.generate_notifications(students, tutors, w.counts["notifications"])
+
+
+def case_events(w):
+    enrollments, classes, students = w.enrollments, w.classes, w.student_ids
+    return lambda: dg.generate_events(enrollments, classes, students, w.counts["events"])
+
+
+def case_events_funnel(w):
+    profiles = dg.generate_student_profiles(w.student_ids)
+    classes, enrollments = w.classes, w.enrollments
+    return lambda: list(dg.funnel_events(profiles, classes, enrollments, w.counts["events"], dg.SEED))
+
+
+def case_faker_text(w):
+    # The Faker calls behind message/notification/announcement text, one per row
+    n = w.counts["messages"] + w.counts["notifications"] + w.counts["announcements"]
+    return lambda: [dg.fake.sentence(nb_words=12) for _ in range(n)]
+
+
+def writer_case(fmt: str):
+    def setup(w):
+        events = w.events
+        out = tempfile.mkdtemp(prefix="bench_")
+
+        def run():
+            path = os.path.join(out, f"events.{fmt}")
+            try:
+                return write_table(events, path, TABLE_SCHEMAS["event_interaction"], fmt)[0]
+            finally:
+                shutil.rmtree(out, ignore_errors=True)
+        return run
+    return setup
+
+
+def case_weekly_demand(w):
+    from demand_rollup import generate_weekly_demand
+    events, classes = w.events, w.classes
+    return lambda: generate_weekly_demand(events, classes)
+
+
+def case_rec_features(w):
+    # load_engine + every training pair block, from a CSV dataset written in setup
+    from rec_features import load_engine
+
+    out = tempfile.mkdtemp(prefix="bench_")
+    dg.run_shard(0, 1, dg.SEED, w.counts, AS_OF, out)
+    for t in dg.REFERENCE_TABLES:
+        write_table(getattr(dg, f"generate_{t}s")(), os.path.join(out, t, "part-00000.csv"), TABLE_SCHEMAS[t])
+
+    def run():
+        try:
+            engine = load_engine(out, AS_OF)
+            return sum(len(block) for block in engine.blocks(500_000))
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return run
+
+
+CASES = {
+    "users": case_users,
+    "profiles": case_profiles,
+    "classes": case_classes,
+    "class_sessions": case_class_sessions,
+    "enrollments": case_enrollments,
+    "billing": case_billing,
+    "messages": case_messages,
+    "notifications": case_notifications,
+    "events": case_events,
+    "events_funnel": case_events_funnel,
+    "faker_text": case_faker_text,
+    "write_csv": writer_case("csv"),
+    "write_parquet": writer_case("parquet"),
+    "weekly_demand": case_weekly_demand,
+    "rec_features": case_rec_features,
+}
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+
+def count(output) -> int:
+    if isinstance(output, int):
+        return output
+    if isinstance(output, tuple):
+        return sum(len(part) for part in output)
+    return len(output)
+
+
+def run_case(case: str, scale: float, profile: str = None, prof_dir: str = "."):
+    # In the child process: setup, one timed run, optional profile
+    run = CASES[case](World(scale))
+    rss_setup = peak_rss_mb()
+
+    if profile == "cprofile":
+        import cProfile
+        import pstats
+
+        prof = cProfile.Profile()
+        started = perf_counter()
+        rows = count(prof.runcall(run))
+        seconds = perf_counter() - started
+        path = os.path.join(prof_dir, f"{case}_s{scale:g}.prof")
+        prof.dump_stats(path)
+        print(f"--- {case} @ {scale:g}: top functions by own time ({path})")
+        pstats.Stats(prof, stream=sys.stdout).sort_stats("tottime").print_stats(15)
+    elif profile == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start(10)
+        started = perf_counter()
+        output = run()
+        seconds = perf_counter() - started
+        # Taken while the output is alive, so the sites that built it show up
+        snapshot = tracemalloc.take_snapshot()
+        rows = count(output)
+        del output
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"--- {case} @ {scale:g}: traced peak {traced_peak / 1e6:.1f} MB; top allocation sites of the output")
+        for stat in snapshot.statistics("lineno")[:15]:
+            print(f"  {stat.size / 1e6:>8.2f} MB  {stat.count:>9,}  {stat.traceback[0]}")
+    else:
+        started = perf_counter()
+        rows = count(run())
+        seconds = perf_counter() - started
+
+    peak = peak_rss_mb()
+    return {
+        "case": case,
+        "scale": scale,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(rows / seconds) if seconds else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "rss_growth_mb": round(peak - rss_setup, 1) if peak is not None else None,
+    }
+
+
+def spawn(case: str, scale: float, profile: str, prof_dir: str):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", case, str(scale), "--prof-dir", prof_dir]
+    if profile:
+        cmd += ["--profile", profile]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+        else:
+            print(line)
+    if proc.returncode != 0 or result is None:
+        print(proc.stderr.strip())
+        raise SystemExit(f"{case} @ {scale:g} failed")
+    return result
+
+
+def best_of(results):
+    # Fastest repeat; peak RSS is the largest seen
+    best = min(results, key=lambda r: r["seconds"])
+    return dict(best, peak_rss_mb=max((r["peak_rss_mb"] or 0) for r in results) or None)
+
+
+def print_results(results):
+    print(f"{'case':<15}{'scale':>7}{'rows':>12}{'secs':>10}{'rows/s':>13}{'peak MB':>10}{'+MB':>8}")
+    for r in results:
+        print(f"{r['case']:<15}{r['scale']:>7g}{r['rows']:>12,}{r['seconds']:>10.3f}"
+              f"{r['rows_per_s'] or 0:>13,}{r['peak_rss_mb'] or 0:>10.0f}{r['rss_growth_mb'] or 0:>8.0f}")
+
+
+def compare(results, baseline_path: str, threshold: float) -> int:
+    # Cases that got slower (seconds) or bigger (peak RSS) than threshold x baseline
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["scale"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nvs {baseline_path} (regression above {threshold:g}x)")
+    print(f"{'case':<15}{'scale':>7}{'time':>9}{'rss':>9}")
+    for r in results:
+        base = baseline.get((r["case"], r["scale"]))
+        if base is None:
+            continue
+        t = r["seconds"] / max(base["seconds"], 1e-9)
+        m = (r["peak_rss_mb"] or 0) / base["peak_rss_mb"] if base.get("peak_rss_mb") else 1.0
+        flag = t > threshold or m > threshold
+        regressions += flag
+        print(f"{r['case']:<15}{r['scale']:>7g}{t:>8.2f}x{m:>8.2f}x" + ("  REGRESSION" if flag else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data generation, writers and feature pipeline")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--scales", default="1,2,4")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], default=None)
+    parser.add_argument("--prof-dir", default=".", help="Where cProfile .prof files go")
+    parser.add_argument("--out", default=None, help="Write results as JSON (usable as a --compare baseline)")
+    parser.add_argument("--compare", default=None, metavar="BASELINE_JSON")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--child", nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_case(args.child[0], float(args.child[1]), args.profile, args.prof_dir)
+        print("RESULT " + json.dumps(result))
+        return
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise SystemExit(f"Unknown case(s): {', '.join(unknown)}")
+    scales = [float(s) for s in args.scales.split(",")]
+
+    results = []
+    for case in cases:
+        for scale in scales:
+            results.append(best_of([spawn(case, scale, args.profile, args.prof_dir) for _ in range(args.repeat)]))
+    print_results(results)
+
+    if args.out:
+        doc = {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU(s)",
+            "profile": args.profile,
+            "results": results,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+    if args.compare:
+        if compare(results, args.compare, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import random
+import time as clock
+
+import data_gen as dg
+
+
+# How generate_class_sessions scales with schedule density. Every tutor gets the
+# same number of published classes, all at a handful of venues, and the run is
+# timed with the interval index and with the old per-day linear scan.
+
+
+class LinearIndex:
+    # The pre-index behaviour: one list per key and an any(overlaps(...)) scan
+    def __init__(self):
+        self._items = {}
+
+    def is_free(self, key, start, end) -> bool:
+        return not any(dg.overlaps(start, end, s, e) for s, e in self._items.get(key, ()))
+
+    def add(self, key, start, end):
+        self._items.setdefault(key, []).append((start, end))
+
+
+def make_fixture(num_tutors: int, classes_per_tutor: int, num_venues: int):
+    venues = [
+        {"venue_id": f"venue-{i}", "area_code": "CMB-01", "capacity": 200}
+        for i in range(num_venues)
+    ]
+    classes = []
+    for t in range(num_tutors):
+        for k in range(classes_per_tutor):
+            classes.append({
+                "class_id": f"class-{t}-{k}",
+                "tutor_id": f"tutor-{t}",
+                "status": "published",
+                "venue_id": venues[(t + k) % num_venues]["venue_id"] if k % 2 == 0 else "",
+            })
+    return classes, venues
+
+
+def timed(index_cls, classes, venues, seed: int):
+    dg.IntervalIndex, original = index_cls, dg.IntervalIndex
+    try:
+        random.seed(seed)
+        start = clock.perf_counter()
+        sessions = dg.generate_class_sessions(classes, venues)
+        return len(sessions), clock.perf_counter() - start
+    finally:
+        dg.IntervalIndex = original
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tutors", type=int, default=50)
+    parser.add_argument("--venues", type=int, default=5)
+    parser.add_argument("--densities", default="1,2,4,8,16,32,64")
+    parser.add_argument("--seed", type=int, default=dg.SEED)
+    args = parser.parse_args()
+
+    print(f"{'classes/tutor':>13}  {'sessions':>9}  {'index s':>9}  {'linear s':>9}  {'speedup':>8}")
+    for k in (int(x) for x in args.densities.split(",")):
+        classes, venues = make_fixture(args.tutors, k, args.venues)
+        n, t_index = timed(dg.IntervalIndex, classes, venues, args.seed)
+        n_linear, t_linear = timed(LinearIndex, classes, venues, args.seed)
+        assert n == n_linear, "index and linear scan disagree"
+        print(f"{k:>13}  {n:>9,}  {t_index:>9.3f}  {t_linear:>9.3f}  {t_linear / t_index:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
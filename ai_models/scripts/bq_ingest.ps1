@@ -31,10 +31,19 @@ Get-Content $ddlPath -Raw | & $bqCmd --location=$Region query --use_legacy_sql=f
 Write-Host "Uploading CSVs to gs://$Bucket/csv/ ..."
 & $gcloudCmd storage cp -r "data/*.csv" "gs://$Bucket/csv/" | Out-Null
 
+# Tables written with data_gen.py --partition are directories of dt=YYYY-MM-DD parts
+$partitioned = @("event_interaction", "message", "notification", "payment") | Where-Object { Test-Path "data/$_/_partitions.json" }
+foreach ($table in $partitioned) {
+  try { & $gcloudCmd storage rm -r "gs://$Bucket/csv/$table" 2>$null | Out-Null } catch { }
+  & $gcloudCmd storage cp -r "data/$table" "gs://$Bucket/csv/" | Out-Null
+}
+
 # Load into staging tables
 Write-Host "Loading staging tables ..."
 function LoadCsv($table, $file) {
   $target = "$($ProjectId):$Dataset.$table"
+  $name = [IO.Path]::GetFileNameWithoutExtension($file)
+  if ($partitioned -contains $name) { $file = "$name/dt=*" }
   & $bqCmd --location=$Region load --replace --source_format=CSV --skip_leading_rows=1 $target "gs://$Bucket/csv/$file"
 }
 
@@ -0,0 +1,356 @@
+import os
+import csv
+import random
+import shutil
+import sqlite3
+import argparse
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from time import perf_counter, sleep
+
+from schemas import TABLE_SCHEMAS
+from table_io import table_files
+
+
+# Parallel replacement for bq_ingest.ps1: loads the generated CSVs into the
+# *_stg tables, then runs transform.sql. Every table is cut into chunks of about
+# --chunk-mb (byte ranges of whole rows, so nothing is rewritten on disk); a
+# chunk is uploaded and loaded as one append job, and all chunks of all tables
+# run on one thread pool, largest first. Uploads and loads are retried with
+# exponential backoff. A load that failed may still have gone through, so a
+# retry first asks whether an earlier attempt's job succeeded: no chunk is
+# loaded twice.
+#
+# A client does the warehouse side:
+#   prepare()                               (re)create the empty staging tables
+#   upload(path, start, end, name) -> uri   bytes [start, end) of a local file
+#   load(table, uris, job_id)      -> rows  append to <table>_stg, all or nothing
+#   finished(job_id)               -> rows  of that job if it succeeded, else None
+#   finish()                                staging -> final tables
+# BigQueryClient uses GCS + BigQuery; LocalClient keeps the staging tables in
+# SQLite, for measuring and testing ingest without GCP.
+#
+#   python scripts\bq_ingest.py --data data
+#   python scripts\bq_ingest.py --client local --local-fail-rate 0.05
+
+PROJECT_ID = "ai-classmate-sri-lanka-001"
+DATASET = "ai_classmate"
+BUCKET = "ai-classmate-data-ai-classmate-sri-lanka-001-asia-south1"
+REGION = "asia-south1"
+PREFIX = "csv/ingest"
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql")
+MAX_URIS = 10_000  # BigQuery limit per load job
+
+Chunk = namedtuple("Chunk", "table index pieces bytes")  # pieces: [(path, start, end)]
+
+
+# -----------------------------
+# Chunking
+# -----------------------------
+
+def split_csv(path: str, chunk_bytes: int):
+    # -> (header, [(start, end)]): byte ranges of whole rows after the header. A
+    # quoted field may hold a newline, so a range only ends where no quote is open.
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = pos = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        if size - start <= chunk_bytes:
+            return header, [(start, size)] if size > start else []
+        ranges, quoted = [], False
+        for line in f:
+            pos += len(line)
+            if line.count(b'"') % 2:
+                quoted = not quoted
+            if not quoted and pos - start >= chunk_bytes:
+                ranges.append((start, pos))
+                start = pos
+        if pos > start:
+            ranges.append((start, pos))
+        return header, ranges
+
+
+def plan_chunks(data_dir: str, table: str, chunk_bytes: int):
+    # A big file becomes several chunks; small files (dt= partitions, increments)
+    # share one until it reaches chunk_bytes
+    columns = ",".join(c for c, _ in TABLE_SCHEMAS[table])
+    chunks, pieces, size = [], [], 0
+    for path in table_files(data_dir, table):
+        if not path.endswith(".csv"):
+            raise SystemExit(f"{path}: bq_ingest.py loads CSV; generate with --format csv")
+        header, ranges = split_csv(path, chunk_bytes)
+        if header.decode("utf-8").strip() != columns:
+            raise SystemExit(f"{path}: columns don't match the {table}_stg table")
+        for start, end in ranges:
+            pieces.append((path, start, end))
+            size += end - start
+            if size >= chunk_bytes or len(pieces) == MAX_URIS:
+                chunks.append(Chunk(table, len(chunks), pieces, size))
+                pieces, size = [], 0
+    if pieces:
+        chunks.append(Chunk(table, len(chunks), pieces, size))
+    return chunks
+
+
+# -----------------------------
+# Clients
+# -----------------------------
+
+def read_sql(name: str) -> str:
+    with open(os.path.join(SQL_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class BigQueryClient:
+    def __init__(self, project: str, dataset: str, bucket: str, location: str):
+        try:
+            from google.cloud import bigquery, storage
+        except ImportError:
+            raise SystemExit("The bigquery client needs google-cloud-bigquery and google-cloud-storage: "
+                             "pip install google-cloud-bigquery google-cloud-storage")
+        self.bigquery = bigquery
+        self.project = project
+        self.dataset = dataset
+        self.bq = bigquery.Client(project=project, location=location)
+        self.bucket = storage.Client(project=project).bucket(bucket)
+
+    def prepare(self):
+        # ddl.sql creates the final tables if needed and replaces every *_stg table
+        self.bq.query(read_sql("ddl.sql")).result()
+
+    def upload(self, path: str, start: int, end: int, name: str) -> str:
+        with open(path, "rb") as f:
+            f.seek(start)
+            self.bucket.blob(name).upload_from_file(f, size=end - start, content_type="text/csv")
+        return f"gs://{self.bucket.name}/{name}"
+
+    def load(self, table: str, uris, job_id: str) -> int:
+        config = self.bigquery.LoadJobConfig(
+            source_format="CSV",
+            skip_leading_rows=0,  # ranges start after the header
+            allow_quoted_newlines=True,
+            write_disposition="WRITE_APPEND",
+        )
+        job = self.bq.load_table_from_uri(uris, f"{self.project}.{self.dataset}.{table}_stg",
+                                          job_id=job_id, job_config=config)
+        job.result()
+        return job.output_rows
+
+    def finished(self, job_id: str):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            job = self.bq.get_job(job_id)
+        except NotFound:
+            return None
+        try:
+            job.result()  # waits if it is still running
+        except Exception:
+            return None
+        return job.output_rows
+
+    def finish(self):
+        print("Transforming staging -> final ...")
+        self.bq.query(read_sql("transform.sql")).result()
+
+
+class LocalClient:
+    # "Uploads" copy the byte range into <root>/bucket and loads insert into
+    # <root>/ingest.sqlite, every column TEXT like the BigQuery staging tables.
+    # A load and its job record commit in one transaction. fail_rate fails that
+    # share of calls, half before the work and half after it (a lost response).
+
+    def __init__(self, root: str, fail_rate: float = 0.0, seed: int = 42):
+        self.root = root
+        self.bucket = os.path.join(root, "bucket")
+        self.db = os.path.join(root, "ingest.sqlite")
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def conn(self):
+        # sqlite3 connections stay in the thread that made them
+        if not hasattr(self.local, "conn"):
+            self.local.conn = sqlite3.connect(self.db, timeout=600)
+        return self.local.conn
+
+    def draw(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def prepare(self):
+        shutil.rmtree(self.bucket, ignore_errors=True)
+        os.makedirs(self.bucket)
+        conn = self.conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for table, schema in TABLE_SCHEMAS.items():
+                conn.execute(f'DROP TABLE IF EXISTS "{table}_stg"')
+                conn.execute(f'CREATE TABLE "{table}_stg" ({", ".join(f"{c} TEXT" for c, _ in schema)})')
+            conn.execute("DROP TABLE IF EXISTS _jobs")
+            conn.execute("CREATE TABLE _jobs (job_id TEXT PRIMARY KEY, rows INTEGER)")
+
+    def upload(self, path: str, start: int, end: int, name: str) -> str:
+        fail = self.draw()
+        if fail < self.fail_rate / 2:
+            raise RuntimeError("simulated upload error")
+        dst = os.path.join(self.bucket, *name.split("/"))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(path, "rb") as src, open(dst, "wb") as out:
+            src.seek(start)
+            remaining = end - start
+            while remaining:
+                block = src.read(min(remaining, 1 << 20))
+                out.write(block)
+                remaining -= len(block)
+        if fail < self.fail_rate:
+            raise RuntimeError("simulated lost upload response")
+        return dst
+
+    def load(self, table: str, uris, job_id: str) -> int:
+        fail = self.draw()
+        conn = self.conn()
+        sql = f'INSERT INTO "{table}_stg" VALUES ({", ".join("?" * len(TABLE_SCHEMAS[table]))})'
+        rows = 0
+
+        def records(f):
+            nonlocal rows
+            for row in csv.reader(f):
+                rows += 1
+                yield [v or None for v in row]  # empty CSV fields load as NULL, as in BigQuery
+
+        with conn:
+            for uri in uris:
+                with open(uri, newline="", encoding="utf-8") as f:
+                    conn.executemany(sql, records(f))
+            conn.execute("INSERT INTO _jobs VALUES (?, ?)", (job_id, rows))
+            if fail < self.fail_rate / 2:
+                raise RuntimeError("simulated load error")  # rolls back
+        if fail < self.fail_rate:
+            raise RuntimeError("simulated lost load response")
+        return rows
+
+    def finished(self, job_id: str):
+        row = self.conn().execute("SELECT rows FROM _jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def finish(self):
+        print(f"Local client: staging tables are in {self.db}; transform.sql is BigQuery SQL and was not run")
+
+
+# -----------------------------
+# Ingest
+# -----------------------------
+
+def with_retry(fn, retries: int):
+    # (result, attempts); backoff 0.5s, 1s, 2s, ... (at most 30s) with jitter
+    for attempt in range(retries + 1):
+        try:
+            return fn(), attempt + 1
+        except Exception:
+            if attempt == retries:
+                raise
+            sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def ingest_chunk(client, chunk: Chunk, run_id: str, retries: int):
+    # -> (rows, retries, seconds)
+    started = perf_counter()
+    uris, extra = [], 0
+    for i, (path, start, end) in enumerate(chunk.pieces):
+        name = f"{PREFIX}/{chunk.table}/part-{chunk.index:05d}-{i:05d}.csv"
+        uri, tries = with_retry(lambda: client.upload(path, start, end, name), retries)
+        uris.append(uri)
+        extra += tries - 1
+
+    job_ids = []
+
+    def load():
+        # An attempt that raised may have loaded anyway; never load a chunk twice
+        for job_id in job_ids:
+            rows = client.finished(job_id)
+            if rows is not None:
+                return rows
+        job_ids.append(f"{run_id}_{chunk.table}_{chunk.index:05d}_{len(job_ids)}")
+        return client.load(chunk.table, uris, job_ids[-1])
+
+    rows, tries = with_retry(load, retries)
+    return rows, extra + tries - 1, perf_counter() - started
+
+
+def ingest(client, data_dir: str, tables, workers: int = 8, chunk_mb: int = 256, retries: int = 5,
+           transform: bool = True):
+    try:
+        chunks = [c for t in tables for c in plan_chunks(data_dir, t, chunk_mb << 20)]
+    except FileNotFoundError as e:
+        raise SystemExit(f"{e}; generate every table first (data_gen.py without --tables)")
+    print("Preparing staging tables ...")
+    client.prepare()
+    run_id = f"ingest_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}_{random.getrandbits(24):06x}"
+    print(f"Loading {len(chunks)} chunks of {len(tables)} tables on {workers} workers ...")
+    started = perf_counter()
+    rows, sizes, counts, retried, latencies, failed = Counter(), Counter(), Counter(), 0, [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Largest first, so a big table's last chunk doesn't start at the end
+        futures = {pool.submit(ingest_chunk, client, c, run_id, retries): c
+                   for c in sorted(chunks, key=lambda c: -c.bytes)}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                n, tries, secs = future.result()
+            except Exception as e:
+                failed.append(f"{chunk.table} chunk {chunk.index}: {e}")
+                continue
+            rows[chunk.table] += n
+            sizes[chunk.table] += chunk.bytes
+            counts[chunk.table] += 1
+            retried += tries
+            latencies.append(secs)
+    elapsed = perf_counter() - started
+
+    width = max(len(t) for t in tables)
+    print(f"{'table':<{width}}  {'chunks':>6}  {'MB':>9}  {'rows':>12}")
+    for table in tables:
+        print(f"{table:<{width}}  {counts[table]:>6}  {sizes[table] / 1e6:>9.1f}  {rows[table]:>12,}")
+    total, mb = sum(rows.values()), sum(sizes.values()) / 1e6
+    latencies = sorted(latencies) or [0.0]
+    print(f"{total:,} rows, {mb:,.1f} MB in {elapsed:.1f}s ({mb / max(elapsed, 1e-9):,.1f} MB/s, "
+          f"{total / max(elapsed, 1e-9):,.0f} rows/s); chunk p50 {latencies[len(latencies) // 2]:.2f}s, "
+          f"max {latencies[-1]:.2f}s; {retried} retries")
+    if failed:
+        raise SystemExit("Failed after retries, transform skipped:\n  " + "\n  ".join(failed))
+    if transform:
+        client.finish()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generated CSVs into the staging tables in parallel")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--client", choices=["bigquery", "local"], default="bigquery")
+    parser.add_argument("--project", default=PROJECT_ID)
+    parser.add_argument("--dataset", default=DATASET, help="ddl.sql and transform.sql use ai_classmate")
+    parser.add_argument("--bucket", default=BUCKET)
+    parser.add_argument("--region", default=REGION)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-mb", type=int, default=256, help="Target bytes of CSV per load job")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--skip-transform", action="store_true", help="Only fill the *_stg tables")
+    parser.add_argument("--local-dir", default=None, help="Default: <data>/_ingest")
+    parser.add_argument("--local-fail-rate", type=float, default=0.0,
+                        help="Share of local uploads/loads that fail, to exercise retries")
+    args = parser.parse_args()
+
+    if args.client == "local":
+        client = LocalClient(args.local_dir or os.path.join(args.data, "_ingest"), args.local_fail_rate)
+    else:
+        client = BigQueryClient(args.project, args.dataset, args.bucket, args.region)
+    ingest(client, args.data, list(TABLE_SCHEMAS), args.workers, args.chunk_mb, args.retries,
+           not args.skip_transform)
+
+
+if __name__ == "__main__":
+    main()
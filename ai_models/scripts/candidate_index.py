@@ -0,0 +1,121 @@
+import argparse
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from rec_features import DISTANCE_BUCKETS, FeatureEngine, load_engine, utc_datetime
+
+
+# Candidate generation for recommendation pairs. Instead of every student x every
+# published class, a student only gets classes for one of their
+# subjects_of_interest, at (or near) their grade, in an area within a distance
+# bucket of theirs:
+#   (grade, subject_code) -> published class positions   (inverted index)
+#   area -> neighbouring areas within max_distance        (from the bucket matrix)
+# Students with the same (grade, area, interests) share one candidate list.
+
+# Buckets in increasing distance; "unknown" (no coordinates) is only kept with "any"
+DISTANCE_ORDER = ["same_area", "0_5km", "5_10km", "10_20km", "gt_20km"]
+
+
+class CandidateIndex:
+    def __init__(self, engine: FeatureEngine, max_distance: str = "10_20km", grade_slack: int = 0,
+                 any_subject: bool = False):
+        self.engine = engine
+        self.grade_slack = grade_slack
+        self.any_subject = any_subject
+
+        # (grade, subject) -> class positions; subject -1 collects every subject of a grade
+        self.by_grade_subject = {}
+        for c, (g, subj) in enumerate(zip(engine.class_grade, engine.class_subject)):
+            if np.isnan(g):
+                continue
+            self.by_grade_subject.setdefault((int(g), int(subj)), []).append(c)
+            self.by_grade_subject.setdefault((int(g), -1), []).append(c)
+        self.by_grade_subject = {k: np.array(v, dtype=np.int64) for k, v in self.by_grade_subject.items()}
+
+        # area -> areas whose distance bucket is within max_distance
+        if max_distance == "any":
+            self.near = np.ones(engine.distance.shape, dtype=bool)
+        else:
+            allowed = [i for i, b in enumerate(DISTANCE_BUCKETS) if b in DISTANCE_ORDER[:DISTANCE_ORDER.index(max_distance) + 1]]
+            self.near = np.isin(engine.distance, allowed)
+        self._cache = {}
+
+    def candidates(self, s: int) -> np.ndarray:
+        e = self.engine
+        if not e.student_grade_known[s]:
+            return np.empty(0, dtype=np.int64)
+        grade = int(e.student_grade[s])
+        subjects = (-1,) if self.any_subject else tuple(np.flatnonzero(e.interest[s]))
+        key = (grade, int(e.student_area[s]), subjects)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        lists = [
+            self.by_grade_subject.get((g, subj))
+            for g in range(grade - self.grade_slack, grade + self.grade_slack + 1)
+            for subj in subjects
+        ]
+        lists = [x for x in lists if x is not None]
+        c = np.sort(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+        c = c[self.near[e.student_area[s], e.class_area[c]]]
+        self._cache[key] = c
+        return c
+
+    def pairs(self, rows: np.ndarray, chunk_size: int):
+        # (student positions, class positions) in chunks of about chunk_size pairs
+        s_parts, c_parts, n = [], [], 0
+        for s in rows:
+            c = self.candidates(s)
+            if not len(c):
+                continue
+            s_parts.append(np.full(len(c), s, dtype=np.int64))
+            c_parts.append(c)
+            n += len(c)
+            if n >= chunk_size:
+                yield np.concatenate(s_parts), np.concatenate(c_parts)
+                s_parts, c_parts, n = [], [], 0
+        if s_parts:
+            yield np.concatenate(s_parts), np.concatenate(c_parts)
+
+    def pair_keys(self, rows: np.ndarray = None) -> np.ndarray:
+        rows = np.arange(len(self.engine.student_ids)) if rows is None else rows
+        n_classes = len(self.engine.class_ids)
+        keys = [s * n_classes + c for s, c in self.pairs(rows, 1_000_000)]
+        return np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+
+
+def evaluate(engine: FeatureEngine, index: CandidateIndex):
+    # (candidate pairs, share of the cross product, recall of clicked/enrolled pairs)
+    keys = index.pair_keys()
+    positives = engine.labelled_pairs()
+    recall = np.isin(positives, keys).mean() if len(positives) else float("nan")
+    return len(keys), len(keys) / max(1, engine.pair_count), recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candidate pruning: size vs. recall against the full cross product")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--as-of", type=utc_datetime, default=None)
+    parser.add_argument("--grade-slack", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--max-distance", nargs="+", choices=DISTANCE_ORDER + ["any"],
+                        default=["same_area", "5_10km", "10_20km", "any"])
+    args = parser.parse_args()
+
+    engine = load_engine(args.data, args.as_of or datetime.utcnow())
+    print(f"Cross product: {engine.pair_count:,} pairs, {len(engine.labelled_pairs()):,} labelled positives")
+    print(f"{'subjects':<10}{'grade':>6}  {'distance':<10}{'pairs':>14}{'share':>9}{'recall':>9}{'secs':>7}")
+    for any_subject in (False, True):
+        for slack in args.grade_slack:
+            for distance in args.max_distance:
+                started = perf_counter()
+                index = CandidateIndex(engine, distance, slack, any_subject)
+                pairs, share, recall = evaluate(engine, index)
+                print(f"{'any' if any_subject else 'interest':<10}{'±' + str(slack):>6}  {distance:<10}"
+                      f"{pairs:>14,}{share:>9.1%}{recall:>9.1%}{perf_counter() - started:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,172 @@
+from __future__ import annotations
+
 import os
 import uuid
 import json
 import math
+import sys
 import random
+import shutil
+import zlib
+import argparse
+from bisect import bisect_right
+from collections import defaultdict
 from datetime import datetime, timedelta, date, time
 from decimal import Decimal, ROUND_HALF_UP
-
-import numpy as np
-import pandas as pd
-from faker import Faker
-
+from functools import partial
+from time import perf_counter
+
+from demand_rollup import WeeklyDemand, merge_rollups, record_rollup, refresh_weekly_demand
+from lazy import lazy_import
+from schemas import PARTITION_COLUMNS, TABLE_COLUMNS, TABLE_SCHEMAS
+from table_cache import DEFAULT_MAX_MB, TableCache, cache_key, code_version
+from task_graph import Task, check_graph, run_graph, upstream
+from task_graph import report as report_graph
+from text_pool import TextPool
+from workload import PROFILES, Workload, profile_params
+from table_io import (
+    CHUNK_SIZE, FORMAT_EXT, PARTITION_STATS, DatasetWriter, chunked, clear_table, partition_table, prepare_path,
+    print_summary, read_dataset, read_table, routed, table_files, write_table,
+)
+
+# Loaded on first use (see lazy.py), so argument parsing starts without them
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+faker = lazy_import("faker")
+
+
+class LazyFaker:
+    # Faker() loads every provider up front; build it on the first call
+    def __init__(self):
+        self.instance = None
+
+    def __getattr__(self, name):
+        if self.instance is None:
+            self.instance = faker.Faker()
+        return getattr(self.instance, name)
+
+
+# Run as a script this module is __main__ (or __mp_main__ in a spawned
+# worker). Register it as data_gen too, so data_gen_np's `import data_gen` gets
+# this instance, with its seeded streams and run settings, not a second copy.
+if __name__ != "data_gen":
+    sys.modules.setdefault("data_gen", sys.modules[__name__])
 
 SEED = 42
-random.seed(SEED)
-np.random.seed(SEED)
-fake = Faker()
-Faker.seed(SEED)
-
-
-OUTPUT_DIR = os.path.join("data")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# The global streams are only seeded by seed_everything, once per run, task or shard
+fake = LazyFaker()
+
+
+OUTPUT_DIR = "data"
+
+# Anchor for all relative timestamps. Pinned per run (see set_as_of) so that a
+# given seed always produces the same rows, including inside worker processes.
+AS_OF = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+WINDOW = None
+# Skewed sampling for activity tables (see workload.py); None draws uniformly
+WORKLOAD = None
+# Pre-generated Faker text (see text_pool.py); None calls Faker per row
+TEXT = None
+
+# Row counts at scale 1.0
+DEFAULT_COUNTS = {
+    "students": 1000,
+    "tutors": 200,
+    "admins": 5,
+    "venues": 25,
+    "classes": 300,
+    "enrollments": 2000,
+    "announcements": 200,
+    "messages": 3000,
+    "notifications": 3000,
+    "events": 20000,
+}
+
+# Every shard needs at least one of these for foreign keys to resolve
+MIN_PER_SHARD = {"tutors": 1, "admins": 1, "venues": 1, "classes": 1}
 
 
 # -----------------------------
 # Helpers
 # -----------------------------
 
+def seed_everything(seed: int):
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    faker.Faker.seed(seed)
+
+
+def set_as_of(as_of: datetime):
+    global AS_OF
+    AS_OF = as_of
+
+
+def set_window(start: datetime = None, end: datetime = None):
+    # Incremental runs: every relative timestamp falls in [start, end) instead
+    global WINDOW
+    WINDOW = (start, end) if start else None
+
+
+def set_workload(params=None):
+    global WORKLOAD
+    WORKLOAD = Workload(params) if params else None
+
+
+def set_text_pool(spec=None):
+    # spec: TextPool.load kwargs (size, locale, seed, cache_dir)
+    global TEXT
+    TEXT = TextPool.load(**spec) if spec else None
+
+
 def new_uuid() -> str:
-    return str(uuid.uuid4())
+    # Drawn from the seeded RNG (uuid4 reads os.urandom and is never reproducible)
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
 
 
 def ts_between(days_back: int = 365, days_forward: int = 60) -> datetime:
-    start = datetime.utcnow() - timedelta(days=days_back)
-    end = datetime.utcnow() + timedelta(days=days_forward)
+    if WINDOW:
+        start, end = WINDOW
+    else:
+        start = AS_OF - timedelta(days=days_back)
+        end = AS_OF + timedelta(days=days_forward)
     delta = end - start
     rand_seconds = random.randrange(int(delta.total_seconds()))
     return start + timedelta(seconds=rand_seconds)
 
 
+def activity_ts(days_back: int = 120, days_forward: int = 0) -> datetime:
+    # ts_between, shaped by the workload's hour-of-day and exam-season weights
+    if WORKLOAD is None:
+        return ts_between(days_back, days_forward)
+    start, end = WINDOW or (AS_OF - timedelta(days=days_back), AS_OF + timedelta(days=days_forward))
+    return WORKLOAD.timestamp(start, end)
+
+
+def pick(kind: str, items):
+    # kind: "student" | "tutor" | "class"; popularity by position in items
+    return WORKLOAD.pick(kind, items) if WORKLOAD else random.choice(items)
+
+
+def fake_name() -> str:
+    return TEXT.draw("name") if TEXT else fake.name()
+
+
+def fake_company() -> str:
+    return TEXT.draw("company") if TEXT else fake.company()
+
+
+def fake_address() -> str:
+    return TEXT.draw("address") if TEXT else fake.address()
+
+
+def fake_sentence(nb_words: int) -> str:
+    return TEXT.draw(f"sentence{nb_words}") if TEXT else fake.sentence(nb_words=nb_words)
+
+
+def fake_paragraph(nb_sentences: int) -> str:
+    return TEXT.draw(f"paragraph{nb_sentences}") if TEXT else fake.paragraph(nb_sentences=nb_sentences)
+
+
 def dt_to_iso(dt: datetime) -> str:
     return dt.replace(microsecond=0).isoformat() + "Z"
 
@@ -109,7 +238,27 @@ SUBJECTS = [
 # Generators
 # -----------------------------
 
-def generate_users(num_students=1000, num_tutors=200, num_admins=5):
+# Sri Lanka mobile pattern approx: 07XYYYYYYY, i.e. 10 * 9,000,000 numbers
+PHONE_SPACE = 10 * 9_000_000
+
+
+def phone_range(offsets, num_users: int):
+    # Shards split the phone numbers in proportion to their users (offsets["users"]
+    # is the total over all shards), so phones never collide across shards
+    offsets = offsets or {}
+    start = sum(offsets.get(k, 0) for k in ("students", "tutors", "admins"))
+    total = offsets.get("users", num_users)
+    return start * PHONE_SPACE // total, (start + num_users) * PHONE_SPACE // total
+
+
+def phone_str(num: int) -> str:
+    return f"07{num // 9_000_000}{1_000_000 + num % 9_000_000}"
+
+
+def generate_users(num_students=1000, num_tutors=200, num_admins=5, offsets=None):
+    # offsets shift the numbering used in emails and the phone range so shards never collide
+    phone_lo, phone_hi = phone_range(offsets, num_students + num_tutors + num_admins)
+    offsets = offsets or {}
     users = []
     student_ids, tutor_ids, admin_ids = [], [], []
 
@@ -125,15 +274,15 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
         return email
 
     def unique_phone() -> str:
-        # Sri Lanka mobile pattern approx: 07XYYYYYYY
         while True:
-            phone = f"07{random.randint(0,9)}{random.randint(1000000,9999999)}"
+            num = random.randint(0, 9) * 9_000_000 + random.randint(1000000, 9999999) - 1_000_000
+            phone = phone_str(phone_lo + num % (phone_hi - phone_lo))
             if phone not in used_phones:
                 used_phones.add(phone)
                 return phone
 
     # Students
-    for i in range(1, num_students + 1):
+    for i in range(offsets.get("students", 0) + 1, offsets.get("students", 0) + num_students + 1):
         uid = new_uuid()
         student_ids.append(uid)
         created = ts_between(365, 0)
@@ -141,7 +290,7 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
             "user_id": uid,
             "email": unique_email("student", i),
             "phone": unique_phone() if random.random() < 0.95 else "",
-            "display_name": fake.name(),
+            "display_name": fake_name(),
             "role": "student",
             "is_active": bool_str(True),
             "created_at": dt_to_iso(created),
@@ -149,7 +298,7 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
         })
 
     # Tutors
-    for i in range(1, num_tutors + 1):
+    for i in range(offsets.get("tutors", 0) + 1, offsets.get("tutors", 0) + num_tutors + 1):
         uid = new_uuid()
         tutor_ids.append(uid)
         created = ts_between(365, 0)
@@ -157,7 +306,7 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
             "user_id": uid,
             "email": unique_email("tutor", i),
             "phone": unique_phone() if random.random() < 0.98 else "",
-            "display_name": fake.name(),
+            "display_name": fake_name(),
             "role": "tutor",
             "is_active": bool_str(True),
             "created_at": dt_to_iso(created),
@@ -165,7 +314,7 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
         })
 
     # Admins
-    for i in range(1, num_admins + 1):
+    for i in range(offsets.get("admins", 0) + 1, offsets.get("admins", 0) + num_admins + 1):
         uid = new_uuid()
         admin_ids.append(uid)
         created = ts_between(365, 0)
@@ -173,7 +322,7 @@ def generate_users(num_students=1000, num_tutors=200, num_admins=5):
             "user_id": uid,
             "email": unique_email("admin", i),
             "phone": unique_phone() if random.random() < 0.80 else "",
-            "display_name": fake.name(),
+            "display_name": fake_name(),
             "role": "admin",
             "is_active": bool_str(True),
             "created_at": dt_to_iso(created),
@@ -219,7 +368,7 @@ def generate_tutor_profiles(tutor_ids, admin_ids):
         subs = random.sample(SUBJECTS, k=random.randint(1, 3))
         profiles.append({
             "user_id": uid,
-            "bio": fake.paragraph(nb_sentences=3),
+            "bio": fake_paragraph(3),
             "qualifications": ", ".join(random.sample([
                 "BSc", "MSc", "PhD", "PGDip", "BEd", "MEd", "Chartered"], k=random.randint(1, 3))),
             "subjects_taught": json.dumps([s["subject_code"] for s in subs]),
@@ -257,8 +406,8 @@ def generate_venues(num=25):
         area = random.choice(AREAS)["area_code"]
         venues.append({
             "venue_id": new_uuid(),
-            "name": f"{fake.company()} Institute",
-            "address": fake.address().replace("\n", ", "),
+            "name": f"{fake_company()} Institute",
+            "address": fake_address().replace("\n", ", "),
             "area_code": area,
             "capacity": random.randint(30, 200),
         })
@@ -327,43 +476,82 @@ def overlaps(start_a: time, end_a: time, start_b: time, end_b: time) -> bool:
     return not (end_a <= start_b or end_b <= start_a)
 
 
+class IntervalIndex:
+    # Non-overlapping [start, end) intervals per key (e.g. tutor-day, venue-room-day),
+    # kept sorted by start so a conflict check is a bisect plus two neighbour compares
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+
+    def is_free(self, key, start, end) -> bool:
+        starts = self._starts.get(key)
+        if not starts:
+            return True
+        i = bisect_right(starts, start)
+        if i > 0 and self._ends[key][i - 1] > start:
+            return False
+        return i == len(starts) or starts[i] >= end
+
+    def add(self, key, start, end):
+        starts = self._starts.setdefault(key, [])
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        self._ends.setdefault(key, []).insert(i, end)
+
+
+def venue_rooms(capacity: int):
+    # Roughly one 20-seat room per 20 seats of venue capacity, up to 10 rooms
+    return [f"Room-{i}" for i in range(1, min(10, max(1, capacity // 20)) + 1)]
+
+
 def generate_class_sessions(classes, venues):
     sessions = []
-    tutor_day_schedules = {}
+    tutor_busy = IntervalIndex()  # (tutor_id, date)
+    room_busy = IntervalIndex()   # (venue_id, room, date)
+    rooms_by_venue = {v["venue_id"]: venue_rooms(v["capacity"]) for v in venues}
 
     # Predefined time slots (1.5h)
     slot_starts_weekday = [time(16, 0), time(18, 0), time(19, 30)]
     slot_starts_weekend = [time(8, 0), time(10, 0), time(13, 0), time(15, 0), time(17, 0)]
     duration_minutes = 90
 
-    start_date = (datetime.utcnow() - timedelta(days=45)).date()
-    end_date = (datetime.utcnow() + timedelta(days=60)).date()
+    start_date = (AS_OF - timedelta(days=45)).date()
+    end_date = (AS_OF + timedelta(days=60)).date()
 
     for c in classes:
         if c["status"] != "published":
             continue
         class_id = c["class_id"]
         tutor_id = c["tutor_id"]
-        is_physical = bool(c.get("venue_id"))
+        venue_id = c.get("venue_id") or ""
+        rooms = rooms_by_venue[venue_id] if venue_id else []
 
         # Choose a recurring weekday
         weekday = random.choice([0, 1, 2, 3, 4, 5, 6])  # Monday=0
         # First date on/after start_date matching weekday
         d = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+        target = random.randint(6, 12)
         occurrences = 0
-        while d <= end_date and occurrences < random.randint(6, 12):
+        while d <= end_date and occurrences < target:
             slots = slot_starts_weekend if d.weekday() >= 5 else slot_starts_weekday
             start_t = random.choice(slots)
             end_t = (datetime.combine(date.min, start_t) + timedelta(minutes=duration_minutes)).time()
 
-            day_key = (tutor_id, d)
-            day_list = tutor_day_schedules.setdefault(day_key, [])
-            conflict = any(overlaps(start_t, end_t, s, e) for (s, e, _, __) in day_list)
-            if conflict:
+            if not tutor_busy.is_free((tutor_id, d), start_t, end_t):
                 d += timedelta(days=7)
                 continue
 
-            room = "" if not is_physical else f"Room-{random.randint(1, 10)}"
+            # Physical sessions also need a room at the venue that is free for the slot
+            room = ""
+            if venue_id:
+                free = [r for r in rooms if room_busy.is_free((venue_id, r, d), start_t, end_t)]
+                if not free:
+                    d += timedelta(days=7)
+                    continue
+                room = random.choice(free)
+                room_busy.add((venue_id, room, d), start_t, end_t)
+
             is_cancelled = random.random() < 0.05
             cancel_reason = "Tutor unavailable" if is_cancelled and random.random() < 0.5 else ("Weather" if is_cancelled else "")
             sessions.append({
@@ -376,37 +564,113 @@ def generate_class_sessions(classes, venues):
                 "is_cancelled": bool_str(is_cancelled),
                 "cancel_reason": cancel_reason,
             })
-            day_list.append((start_t, end_t, c.get("venue_id", ""), room))
+            tutor_busy.add((tutor_id, d), start_t, end_t)
             occurrences += 1
             d += timedelta(days=7)
 
     return sessions
 
 
-def generate_enrollments(classes, student_ids, target_count=2000):
+class SeatSampler:
+    # Fenwick tree over free seats per class: draws a class with probability
+    # proportional to its free seats, and frees/takes a seat, in O(log n)
+
+    def __init__(self, seats):
+        self.n = len(seats)
+        self.free = list(seats)
+        self.total = sum(seats)
+        self.tree = [0] * (self.n + 1)
+        for i, v in enumerate(seats, 1):
+            self.tree[i] += v
+            parent = i + (i & -i)
+            if parent <= self.n:
+                self.tree[parent] += self.tree[i]
+        self.top = 1 << self.n.bit_length()
+
+    def sample(self) -> int:
+        r = random.randrange(self.total)
+        pos, step = 0, self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= r:
+                pos = nxt
+                r -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def take(self, i: int):
+        self.total -= 1
+        self.free[i] -= 1
+        i += 1
+        while i <= self.n:
+            self.tree[i] -= 1
+            i += i & -i
+
+
+class UniqueDraw:
+    # Sparse Fisher-Yates over range(n): each draw returns an index not drawn
+    # before, storing only the swapped positions
+    def __init__(self, n: int):
+        self.n = n
+        self.taken = 0
+        self.swaps = {}
+
+    def draw(self) -> int:
+        j = random.randrange(self.taken, self.n)
+        pick = self.swaps.get(j, j)
+        self.swaps[j] = self.swaps.get(self.taken, self.taken)
+        self.swaps.pop(self.taken, None)
+        self.taken += 1
+        return pick
+
+
+def generate_enrollments(classes, student_ids, target_count=2000, existing=()):
+    # existing: (class_id, student_id) pairs already enrolled (incremental runs)
     enrollments = []
-    used_pairs = set()
-    class_capacity_left = {c["class_id"]: c["capacity_seats"] for c in classes}
 
     published_classes = [c for c in classes if c["status"] == "published"]
-    if not published_classes:
+    if not published_classes or not student_ids:
         return enrollments
 
-    attempts = 0
-    while len(enrollments) < target_count and attempts < target_count * 10:
-        attempts += 1
-        c = random.choice(published_classes)
-        sid = random.choice(student_ids)
-        key = (sid, c["class_id"])
-        if key in used_pairs:
-            continue
-        if class_capacity_left[c["class_id"]] <= 0:
-            continue
-        used_pairs.add(key)
-        class_capacity_left[c["class_id"]] -= 1
+    enrolled = defaultdict(set)
+    for class_id, sid in existing:
+        enrolled[class_id].add(sid)
+
+    # A class can't hold more distinct students than exist
+    seats = SeatSampler([
+        max(0, min(int(c["capacity_seats"]), len(student_ids)) - len(enrolled[c["class_id"]]))
+        for c in published_classes
+    ])
+    if seats.total < target_count:
+        print(f"generate_enrollments: only {seats.total:,} free seats for {target_count:,} enrollments")
+    students_left = {}
+    # Workload profiles draw popular classes first; full or unpublished picks fall back to free seats
+    position = {j: i for i, j in enumerate(k for k, c in enumerate(classes) if c["status"] == "published")}
+
+    for _ in range(min(target_count, seats.total)):
+        i = None
+        if WORKLOAD:
+            for _ in range(4):
+                i = position.get(WORKLOAD.table("class", len(classes)).draw())
+                if i is not None and seats.free[i]:
+                    break
+                i = None
+        if i is None:
+            i = seats.sample()
+        seats.take(i)
+        c = published_classes[i]
+        sid = pick("student", student_ids) if WORKLOAD else None
+        if sid is None or sid in enrolled[c["class_id"]]:
+            draw = students_left.get(i)
+            if draw is None:
+                draw = students_left[i] = UniqueDraw(len(student_ids))
+            sid = student_ids[draw.draw()]
+            while sid in enrolled[c["class_id"]]:
+                sid = student_ids[draw.draw()]
+        enrolled[c["class_id"]].add(sid)
 
         status = choose_weighted(["active", "completed", "pending", "cancelled"], [0.45, 0.25, 0.2, 0.1])
-        enrolled_at = ts_between(150, 0)
+        enrolled_at = activity_ts(150, 0)
         cancelled_at = dt_to_iso(enrolled_at + timedelta(days=random.randint(1, 60))) if status == "cancelled" else ""
         cancel_reason = "Student request" if status == "cancelled" and random.random() < 0.7 else ("Payment issue" if status == "cancelled" else "")
 
@@ -422,11 +686,8 @@ def generate_enrollments(classes, student_ids, target_count=2000):
     return enrollments
 
 
-def generate_billing(enrollments, classes, admin_ids):
-    invoices = []
-    payments = []
-    refunds = []
-
+def iter_billing(enrollments, classes, admin_ids):
+    # Yields ("invoice" | "payment" | "refund", row) in generation order
     fee_by_class = {c["class_id"]: float(c["fee"]) for c in classes}
 
     for e in enrollments:
@@ -440,14 +701,14 @@ def generate_billing(enrollments, classes, admin_ids):
         )
 
         invoice_id = new_uuid()
-        invoices.append({
+        yield "invoice", {
             "invoice_id": invoice_id,
             "enrollment_id": e["enrollment_id"],
             "amount_due": money(amount),
             "due_date": due_date,
             "status": inv_status,
             "created_at": e["enrolled_at"],
-        })
+        }
 
         if inv_status in ("under_review", "verified", "rejected", "refunded"):
             pay_status = "verified" if inv_status in ("verified", "refunded") else ("rejected" if inv_status == "rejected" else "pending")
@@ -463,140 +724,155 @@ def generate_billing(enrollments, classes, admin_ids):
                 "verified_at": dt_to_iso(created_at + timedelta(days=random.randint(1, 15))) if pay_status == "verified" else "",
                 "verify_note": "OK" if pay_status == "verified" else ("Mismatch" if pay_status == "rejected" else ""),
             }
-            payments.append(pay)
+            yield "payment", pay
             if inv_status == "refunded":
-                refunds.append({
+                yield "refund", {
                     "refund_id": new_uuid(),
                     "payment_id": pay["payment_id"],
                     "refund_amount": money(float(pay["paid_amount"]) * random.uniform(0.5, 1.0)),
                     "refunded_at": dt_to_iso(datetime.fromisoformat(pay["paid_at"].replace("Z", "")) + timedelta(days=random.randint(1, 10))),
                     "reason": random.choice(["Class cancelled", "Tutor unavailable", "Student requested"]),
                     "processed_by": random.choice(admin_ids),
-                })
-    return invoices, payments, refunds
+                }
 
 
-def generate_materials(classes):
-    materials = []
+def generate_billing(enrollments, classes, admin_ids):
+    out = {"invoice": [], "payment": [], "refund": []}
+    for table, row in iter_billing(enrollments, classes, admin_ids):
+        out[table].append(row)
+    return out["invoice"], out["payment"], out["refund"]
+
+
+def iter_materials(classes):
     for c in classes:
         num = random.randint(0, 5)
         for _ in range(num):
-            materials.append({
+            yield {
                 "material_id": new_uuid(),
                 "class_id": c["class_id"],
-                "title": fake.sentence(nb_words=4),
+                "title": fake_sentence(4),
                 "file_url": f"https://storage.googleapis.com/materials/{new_uuid()}.pdf",
                 "allow_download": bool_str(random.random() < 0.85),
                 "uploaded_by": c["tutor_id"],
                 "uploaded_at": dt_to_iso(ts_between(120, 0)),
-            })
-    return materials
+            }
 
 
-def generate_announcements(classes):
-    announcements = []
-    for _ in range(200):
+def generate_materials(classes):
+    return list(iter_materials(classes))
+
+
+def iter_announcements(classes, target=200):
+    for _ in range(target):
         scope = choose_weighted(["class", "grade", "area", "all"], [0.5, 0.2, 0.2, 0.1])
         class_id = random.choice(classes)["class_id"] if scope == "class" else ""
         grade = random.randint(6, 13) if scope == "grade" else ""
         area_code = random.choice(AREAS)["area_code"] if scope == "area" else ""
-        announcements.append({
+        yield {
             "announcement_id": new_uuid(),
             "scope": scope,
             "class_id": class_id,
             "grade": grade,
             "area_code": area_code,
-            "title": fake.sentence(nb_words=6),
-            "body": fake.paragraph(nb_sentences=3),
+            "title": fake_sentence(6),
+            "body": fake_paragraph(3),
             "created_by": random.choice(classes)["tutor_id"],
             "created_at": dt_to_iso(ts_between(120, 0)),
-        })
-    return announcements
+        }
 
 
-def generate_messages(classes, student_ids, tutor_ids, target=3000):
-    messages = []
+def generate_announcements(classes, target=200):
+    return list(iter_announcements(classes, target))
+
+
+def iter_messages(classes, student_ids, tutor_ids, target=3000):
     for _ in range(target):
-        class_info = random.choice(classes)
-        tutor_id = class_info["tutor_id"] if random.random() < 0.7 else random.choice(tutor_ids)
-        student_id = random.choice(student_ids)
-        messages.append({
+        class_info = pick("class", classes)
+        tutor_id = class_info["tutor_id"] if random.random() < 0.7 else pick("tutor", tutor_ids)
+        student_id = pick("student", student_ids)
+        yield {
             "message_id": new_uuid(),
             "sender_id": tutor_id if random.random() < 0.5 else student_id,
             "recipient_id": student_id if random.random() < 0.5 else tutor_id,
             "class_id": class_info["class_id"] if random.random() < 0.7 else "",
-            "text": fake.sentence(nb_words=12),
-            "sent_at": dt_to_iso(ts_between(120, 0)),
+            "text": fake_sentence(12),
+            "sent_at": dt_to_iso(activity_ts(120, 0)),
             "is_deleted": bool_str(random.random() < 0.02),
-        })
-    return messages
+        }
 
 
-def generate_notifications(student_ids, tutor_ids):
+def generate_messages(classes, student_ids, tutor_ids, target=3000):
+    return list(iter_messages(classes, student_ids, tutor_ids, target))
+
+
+def iter_notifications(student_ids, tutor_ids, target=3000):
     notif_types = ["enrollment_status", "payment_status", "schedule_change", "announcement", "system"]
-    notifications = []
     recipients = student_ids + tutor_ids
-    for _ in range(3000):
-        rid = random.choice(recipients)
-        notifications.append({
+    for _ in range(target):
+        rid = WORKLOAD.pick_recipient(student_ids, tutor_ids) if WORKLOAD else random.choice(recipients)
+        yield {
             "notification_id": new_uuid(),
             "recipient_id": rid,
             "type": random.choice(notif_types),
-            "title": fake.sentence(nb_words=5),
-            "body": fake.sentence(nb_words=10),
+            "title": fake_sentence(5),
+            "body": fake_sentence(10),
             "is_read": bool_str(random.random() < 0.6),
-            "created_at": dt_to_iso(ts_between(120, 0)),
-        })
-    return notifications
+            "created_at": dt_to_iso(activity_ts(120, 0)),
+        }
 
 
-def generate_ratings(enrollments):
-    ratings = []
+def generate_notifications(student_ids, tutor_ids, target=3000):
+    return list(iter_notifications(student_ids, tutor_ids, target))
+
+
+def iter_ratings(enrollments):
     for e in enrollments:
         if e["status"] not in ("active", "completed"):
             continue
         if random.random() < 0.35:
-            ratings.append({
+            yield {
                 "rating_id": new_uuid(),
                 "student_id": e["student_id"],
                 "tutor_id": "",  # fill below when joining from class
                 "class_id": e["class_id"],
                 "stars": random.randint(3, 5) if e["status"] == "completed" else random.randint(1, 5),
-                "comment": fake.sentence(nb_words=10) if random.random() < 0.6 else "",
+                "comment": fake_sentence(10) if random.random() < 0.6 else "",
                 "created_at": e["enrolled_at"],
-            })
-    return ratings
+            }
+
+
+def generate_ratings(enrollments):
+    return list(iter_ratings(enrollments))
 
 
-def generate_events(enrollments, classes, student_ids):
+def iter_events(enrollments, classes, student_ids, target=20000):
     # Create impression/view/click/bookmark/search/enrol events
-    events = []
     event_types = ["search", "impression", "view_tutor", "view_class", "click", "bookmark", "enrol"]
     class_by_id = {c["class_id"]: c for c in classes}
 
     # Random browsing sessions
-    for _ in range(20000):
-        student = random.choice(student_ids) if random.random() < 0.9 else ""
-        c = random.choice(classes)
+    for _ in range(target):
+        student = pick("student", student_ids) if random.random() < 0.9 else ""
+        c = pick("class", classes)
         tutor_id = c["tutor_id"]
         cls_id = c["class_id"]
         et = choose_weighted(event_types, [0.15, 0.25, 0.10, 0.20, 0.20, 0.05, 0.05])
         q = "" if et != "search" else random.choice([
             "math grade 10", "physics al", "english colombo", "science ol", "tutor near me"])
-        events.append({
+        yield {
             "event_id": new_uuid(),
             "student_id": student,
             "tutor_id": tutor_id,
             "class_id": cls_id,
             "event_type": et,
             "query_text": q,
-            "ts": dt_to_iso(ts_between(120, 0)),
-        })
+            "ts": dt_to_iso(activity_ts(120, 0)),
+        }
 
     # Enrol events matching enrollments
     for e in enrollments:
         c = class_by_id.get(e["class_id"]) or {}
-        events.append({
+        yield {
             "event_id": new_uuid(),
             "student_id": e["student_id"],
             "tutor_id": c.get("tutor_id", ""),
@@ -604,190 +880,781 @@ def generate_events(enrollments, classes, student_ids):
             "event_type": "enrol",
             "query_text": "",
             "ts": e["enrolled_at"],
-        })
+        }
 
-    return events
 
+def generate_events(enrollments, classes, student_ids, target=20000):
+    return list(iter_events(enrollments, classes, student_ids, target))
 
-def generate_weekly_demand(events, classes):
-    # Aggregate by week_start (Monday), subject_code, area_code
-    from collections import defaultdict
 
-    class_meta = {c["class_id"]: (c["subject_code"], c["area_code"]) for c in classes}
-    agg = defaultdict(lambda: {"views": 0, "clicks": 0, "enrols": 0})
+# -----------------------------
+# Tables
+# -----------------------------
 
-    def monday_of(dt: datetime) -> date:
-        d = dt.date()
-        return d - timedelta(days=d.weekday())
+# Static lookups; identical in every shard so they are written once
+REFERENCE_TABLES = ("subject", "area")
 
-    for ev in events:
-        cls_id = ev.get("class_id")
-        meta = class_meta.get(cls_id)
-        if not meta:
-            continue
-        ts = datetime.fromisoformat(ev["ts"].replace("Z", ""))
-        wk = monday_of(ts)
-        subj, area = meta
-        key = (wk.isoformat(), subj, area)
-        if ev["event_type"] in ("view_class", "impression"):
-            agg[key]["views"] += 1
-        if ev["event_type"] == "click":
-            agg[key]["clicks"] += 1
-        if ev["event_type"] == "enrol":
-            agg[key]["enrols"] += 1
-
-    rows = []
-    for (week_start, subject_code, area_code), m in agg.items():
-        rows.append({
-            "week_start": week_start,
-            "subject_code": subject_code,
-            "area_code": area_code,
-            "views": m["views"],
-            "clicks": m["clicks"],
-            "enrols": m["enrols"],
-        })
-    return rows
 
+def with_rating_tutors(ratings, classes):
+    # Fill tutor_id in ratings from class mapping
+    class_by_id = {c["class_id"]: c for c in classes}
+    for r in ratings:
+        cls = class_by_id.get(r["class_id"]) or {}
+        r["tutor_id"] = cls.get("tutor_id", "")
+        yield r
 
-# -----------------------------
-# Main
-# -----------------------------
 
-def write_csv(rows, filename, columns=None):
-    df = pd.DataFrame(rows)
-    if columns:
-        missing = [c for c in columns if c not in df.columns]
-        for m in missing:
-            df[m] = ""
-        df = df[columns]
-    path = os.path.join(OUTPUT_DIR, filename)
-    df.to_csv(path, index=False)
-    print(f"Wrote {len(df):,} rows -> {path}")
+def funnel_events(student_profiles, classes, enrollments, target, seed, days=120):
+    # Session-based events from event_sim.py, in timestamp order
+    import event_sim
 
+    world = event_sim.world_from_tables(student_profiles, classes, enrollments, AREAS, SUBJECTS)
+    return event_sim.iter_events(world, target, seed, AS_OF, days)
 
-def main():
-    print("Generating synthetic data for AI ClassMate...")
 
-    users, student_ids, tutor_ids, admin_ids = generate_users()
+def stream_tables(counts, offsets=None, chunk_size=CHUNK_SIZE, events="random"):
+    # Yields (table, batch) in generation order. Entity tables are kept because
+    # later tables sample from them; fact tables only ever exist one chunk at a time.
+    users, student_ids, tutor_ids, admin_ids = generate_users(
+        counts["students"], counts["tutors"], counts["admins"], offsets)
+    yield from chunked("user", users, chunk_size)
+    del users
 
     student_profiles = generate_student_profiles(student_ids)
+    yield from chunked("student_profile", student_profiles, chunk_size)
     tutor_profiles = generate_tutor_profiles(tutor_ids, admin_ids)
-    admin_profiles = generate_admin_profiles(admin_ids)
+    yield from chunked("tutor_profile", tutor_profiles, chunk_size)
+    yield from chunked("admin_profile", generate_admin_profiles(admin_ids), chunk_size)
+
+    yield from chunked("subject", generate_subjects(), chunk_size)
+    yield from chunked("area", generate_areas(), chunk_size)
+    venues = generate_venues(counts["venues"])
+    yield from chunked("venue", venues, chunk_size)
+
+    classes = generate_classes(counts["classes"], tutor_profiles, venues)
+    yield from chunked("class", classes, chunk_size)
+    yield from chunked("class_session", generate_class_sessions(classes, venues), chunk_size)
+
+    enrollments = generate_enrollments(classes, student_ids, counts["enrollments"])
+    yield from chunked("enrollment", enrollments, chunk_size)
+    yield from routed(iter_billing(enrollments, classes, admin_ids), chunk_size)
+
+    yield from chunked("material", iter_materials(classes), chunk_size)
+    yield from chunked("announcement", iter_announcements(classes, counts["announcements"]), chunk_size)
+    yield from chunked("message", iter_messages(classes, student_ids, tutor_ids, counts["messages"]), chunk_size)
+    yield from chunked("notification", iter_notifications(student_ids, tutor_ids, counts["notifications"]), chunk_size)
+    yield from chunked("rating", with_rating_tutors(iter_ratings(enrollments), classes), chunk_size)
+
+    if events == "funnel":
+        event_rows = funnel_events(student_profiles, classes, enrollments, counts["events"], random.getrandbits(63))
+    else:
+        event_rows = iter_events(enrollments, classes, student_ids, counts["events"])
+    demand = WeeklyDemand(classes)
+    for table, batch in chunked("event_interaction", event_rows, chunk_size):
+        demand.add(batch)
+        yield table, batch
+    yield from chunked("weekly_demand", demand.rows(), chunk_size)
+
+
+def generate_all(counts, offsets=None):
+    tables = {table: [] for table in TABLE_COLUMNS}
+    for table, batch in stream_tables(counts, offsets):
+        tables[table].extend(batch)
+    return tables
 
-    subjects = generate_subjects()
-    areas = generate_areas()
-    venues = generate_venues()
 
-    classes = generate_classes(300, tutor_profiles, venues)
-    class_sessions = generate_class_sessions(classes, venues)
+# -----------------------------
+# Sharding
+# -----------------------------
 
-    enrollments = generate_enrollments(classes, student_ids, 2000)
-    invoices, payments, refunds = generate_billing(enrollments, classes, admin_ids)
+def scale_counts(scale: float, counts=None):
+    counts = counts or DEFAULT_COUNTS
+    return {k: max(MIN_PER_SHARD.get(k, 0), int(round(v * scale))) for k, v in counts.items()}
+
+
+def split_count(total: int, shards: int, shard: int) -> int:
+    base, extra = divmod(total, shards)
+    return base + (1 if shard < extra else 0)
+
+
+def shard_counts(counts, shards: int, shard: int):
+    return {
+        k: max(MIN_PER_SHARD.get(k, 0), split_count(v, shards, shard))
+        for k, v in counts.items()
+    }
+
+
+def shard_offsets(counts, shards: int, shard: int):
+    offsets = {
+        k: sum(shard_counts(counts, shards, s)[k] for s in range(shard))
+        for k in ("students", "tutors", "admins")
+    }
+    offsets["users"] = counts["students"] + counts["tutors"] + counts["admins"]
+    return offsets
+
+
+def shard_seed(seed: int, shard: int) -> int:
+    # Independent stream per shard, stable for a given (seed, shard)
+    return int(np.random.SeedSequence([seed, shard]).generate_state(1)[0])
+
+
+def part_path(out_dir: str, table: str, shard: int, fmt: str = "csv") -> str:
+    return os.path.join(out_dir, table, f"part-{shard:05d}{FORMAT_EXT[fmt]}")
+
+
+def table_path(out_dir: str, table: str, fmt: str = "csv") -> str:
+    return os.path.join(out_dir, f"{table}{FORMAT_EXT[fmt]}")
+
+
+def generate_tables(backend: str, seed: int, counts, offsets=None, chunk_size=CHUNK_SIZE, events="random",
+                    workload=None, text_pool=None):
+    # Returns an iterator of (table, batch). Imports come first: nothing may
+    # touch the global streams after seed_everything
+    if backend == "numpy":
+        import data_gen_np
+    seed_everything(seed)
+    set_workload(workload)
+    set_text_pool(text_pool)
+    if backend == "numpy":
+        return data_gen_np.iter_tables(counts, offsets, seed, AS_OF, events, workload, text_pool, chunk_size)
+    return stream_tables(counts, offsets, chunk_size, events)
+
+
+def run_single(seed: int, counts, backend: str = "python", chunk_size: int = CHUNK_SIZE, fmt: str = "csv",
+               events: str = "random", workload=None, text_pool=None, out_dir: str = OUTPUT_DIR, partition_by=None):
+    # Write tables (order and columns per schema), appending chunk by chunk
+    writer = DatasetWriter(TABLE_SCHEMAS, lambda t: table_path(out_dir, t, fmt), fmt, partition_by, chunk_size)
+    writer.write_all(generate_tables(backend, shard_seed(seed, 0), counts, chunk_size=chunk_size, events=events,
+                                     workload=workload, text_pool=text_pool))
+    return writer.close()
+
+
+def run_shard(shard: int, shards: int, seed: int, counts, as_of: datetime, out_dir: str,
+              backend: str = "python", chunk_size: int = CHUNK_SIZE, fmt: str = "csv", events: str = "random",
+              workload=None, text_pool=None):
+    set_as_of(as_of)
+    batches = generate_tables(
+        backend,
+        shard_seed(seed, shard),
+        shard_counts(counts, shards, shard),
+        shard_offsets(counts, shards, shard),
+        chunk_size,
+        events,
+        workload,
+        text_pool,
+    )
+    tables = {t: schema for t, schema in TABLE_SCHEMAS.items() if t not in REFERENCE_TABLES}
+    writer = DatasetWriter(tables, lambda t: part_path(out_dir, t, shard, fmt), fmt)
+    writer.write_all((t, b) for t, b in batches if t in tables)
+    return writer.close()
+
+
+def merge_parts(out_dir: str, table: str, shards: int) -> int:
+    # CSV part files share one header, so merging is a byte-level concat
+    path = table_path(out_dir, table)
+    prepare_path(path)
+    with open(path, "wb") as out:
+        for shard in range(shards):
+            with open(part_path(out_dir, table, shard), "rb") as part:
+                header = part.readline()
+                if shard == 0:
+                    out.write(header)
+                shutil.copyfileobj(part, out)
+    shutil.rmtree(os.path.join(out_dir, table))
+    return os.path.getsize(path)
+
+
+def merge_weekly_demand(out_dir: str, shards: int, keep_parts: bool, fmt: str = "csv"):
+    # Shard aggregates overlap on (week, subject, area) and must be summed
+    df = merge_rollups(read_table(os.path.join(out_dir, "weekly_demand")))
+    if not keep_parts:
+        shutil.rmtree(os.path.join(out_dir, "weekly_demand"))
+    return write_table(df, table_path(out_dir, "weekly_demand", fmt), TABLE_SCHEMAS["weekly_demand"], fmt)
+
+
+def run_sharded(seed: int, counts, shards: int, workers: int, keep_parts: bool = False,
+                backend: str = "python", chunk_size: int = CHUNK_SIZE, fmt: str = "csv", events: str = "random",
+                workload=None, text_pool=None, out_dir: str = OUTPUT_DIR, partition_by=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    print(f"Generating {shards} shards on {workers} workers...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_shard, shard, shards, seed, counts, AS_OF, out_dir, backend, chunk_size, fmt, events,
+                        workload, text_pool)
+            for shard in range(shards)
+        ]
+        results = [f.result() for f in futures]
+
+    summary = {}
+    reference = {"subject": generate_subjects(), "area": generate_areas()}
+    for table, rows in reference.items():
+        summary[table] = write_table(rows, table_path(out_dir, table, fmt), TABLE_SCHEMAS[table], fmt)
+
+    # Parquet/Arrow parts are left as a directory dataset; only CSV is cheap to concatenate
+    merge = fmt == "csv" and not keep_parts
+    for table in TABLE_COLUMNS:
+        if table in REFERENCE_TABLES or table == "weekly_demand":
+            continue
+        rows = sum(r[table][0] for r in results)
+        size = merge_parts(out_dir, table, shards) if merge else sum(r[table][1] for r in results)
+        summary[table] = (rows, size)
+    summary["weekly_demand"] = merge_weekly_demand(out_dir, shards, keep_parts, fmt)
+    # Shards overlap in time, so partitions are cut from the merged tables
+    for table, column in (partition_by or {}).items():
+        summary[table] = partition_table(out_dir, table, TABLE_SCHEMAS[table], column, fmt, chunk_size)
+    return {t: summary[t] for t in TABLE_COLUMNS}
 
-    materials = generate_materials(classes)
-    announcements = generate_announcements(classes)
-    messages = generate_messages(classes, student_ids, tutor_ids)
-    notifications = generate_notifications(student_ids, tutor_ids)
-    ratings = generate_ratings(enrollments)
 
-    # Fill tutor_id in ratings from class mapping
-    class_by_id = {c["class_id"]: c for c in classes}
-    for r in ratings:
-        cls = class_by_id.get(r["class_id"]) or {}
-        r["tutor_id"] = cls.get("tutor_id", "")
+# -----------------------------
+# Task graph (--dag)
+# -----------------------------
 
-    events = generate_events(enrollments, classes, student_ids)
-    weekly_demand = generate_weekly_demand(events, classes)
+# Each task draws from its own seeded stream (dag_seed), so the output depends
+# on the seed only, never on which tasks happened to run side by side.
 
-    # Write CSVs (order and columns per schema)
-    write_csv(users, "user.csv", [
-        "user_id", "email", "phone", "display_name", "role", "is_active", "created_at", "updated_at"
-    ])
+def dag_users(ctx, inp):
+    c = ctx["counts"]
+    users, student_ids, tutor_ids, admin_ids = generate_users(c["students"], c["tutors"], c["admins"])
+    return {"user": users, "student_ids": student_ids, "tutor_ids": tutor_ids, "admin_ids": admin_ids}
 
-    write_csv(student_profiles, "student_profile.csv", [
-        "user_id", "grade", "area_code", "subjects_of_interest"
-    ])
 
-    write_csv(tutor_profiles, "tutor_profile.csv", [
-        "user_id", "bio", "qualifications", "subjects_taught", "area_code", "mode", "base_price",
-        "rating_avg", "rating_count", "status", "reviewed_by", "reviewed_at"
-    ])
+def dag_reference(ctx, inp):
+    return {"subject": generate_subjects(), "area": generate_areas()}
 
-    write_csv(admin_profiles, "admin_profile.csv", [
-        "user_id", "role_type"
-    ])
 
-    write_csv(subjects, "subject.csv", [
-        "subject_code", "name", "level"
-    ])
+def dag_enrollments(ctx, inp):
+    return {"enrollment": generate_enrollments(inp["class"], inp["student_ids"], ctx["counts"]["enrollments"])}
 
-    write_csv(areas, "area.csv", [
-        "area_code", "area_name", "lat", "lng"
-    ])
 
-    write_csv(venues, "venue.csv", [
-        "venue_id", "name", "address", "area_code", "capacity"
-    ])
+def dag_billing(ctx, inp):
+    invoices, payments, refunds = generate_billing(inp["enrollment"], inp["class"], inp["admin_ids"])
+    return {"invoice": invoices, "payment": payments, "refund": refunds}
 
-    write_csv(classes, "class.csv", [
-        "class_id", "tutor_id", "subject_code", "grade", "mode", "area_code", "venue_id",
-        "fee", "price_band", "capacity_seats", "status", "created_at", "published_at"
-    ])
 
-    write_csv(class_sessions, "class_session.csv", [
-        "session_id", "class_id", "session_date", "start_time", "end_time", "room",
-        "is_cancelled", "cancel_reason"
-    ])
+def dag_messages(ctx, inp):
+    return {"message": generate_messages(inp["class"], inp["student_ids"], inp["tutor_ids"], ctx["counts"]["messages"])}
 
-    write_csv(enrollments, "enrollment.csv", [
-        "enrollment_id", "class_id", "student_id", "status", "enrolled_at", "cancelled_at", "cancel_reason"
-    ])
 
-    write_csv(invoices, "invoice.csv", [
-        "invoice_id", "enrollment_id", "amount_due", "due_date", "status", "created_at"
-    ])
+def dag_notifications(ctx, inp):
+    return {"notification": generate_notifications(inp["student_ids"], inp["tutor_ids"],
+                                                   ctx["counts"]["notifications"])}
 
-    write_csv(payments, "payment.csv", [
-        "payment_id", "invoice_id", "paid_amount", "paid_at", "method", "proof_url",
-        "verify_status", "verified_by", "verified_at", "verify_note"
-    ])
 
-    write_csv(refunds, "refund.csv", [
-        "refund_id", "payment_id", "refund_amount", "refunded_at", "reason", "processed_by"
-    ])
+def dag_events(ctx, inp):
+    # weekly_demand is folded in as the events are made, like stream_tables does
+    if ctx["events"] == "funnel":
+        rows = funnel_events(inp["student_profile"], inp["class"], inp["enrollment"], ctx["counts"]["events"],
+                             random.getrandbits(63))
+    else:
+        rows = iter_events(inp["enrollment"], inp["class"], inp["student_ids"], ctx["counts"]["events"])
+    demand = WeeklyDemand(inp["class"])
+    events = []
+    for _, batch in chunked("event_interaction", rows, ctx["chunk_size"]):
+        demand.add(batch)
+        events.extend(batch)
+    return {"event_interaction": events, "weekly_demand": demand.rows()}
 
-    write_csv(materials, "material.csv", [
-        "material_id", "class_id", "title", "file_url", "allow_download", "uploaded_by", "uploaded_at"
-    ])
 
-    write_csv(announcements, "announcement.csv", [
-        "announcement_id", "scope", "class_id", "grade", "area_code", "title", "body", "created_by", "created_at"
-    ])
+def dag_venues(ctx, inp):
+    return {"venue": generate_venues(ctx["counts"]["venues"])}
 
-    write_csv(messages, "message.csv", [
-        "message_id", "sender_id", "recipient_id", "class_id", "text", "sent_at", "is_deleted"
-    ])
 
-    write_csv(notifications, "notification.csv", [
-        "notification_id", "recipient_id", "type", "title", "body", "is_read", "created_at"
-    ])
+def dag_student_profiles(ctx, inp):
+    return {"student_profile": generate_student_profiles(inp["student_ids"])}
+
+
+def dag_tutor_profiles(ctx, inp):
+    return {"tutor_profile": generate_tutor_profiles(inp["tutor_ids"], inp["admin_ids"])}
+
+
+def dag_admin_profiles(ctx, inp):
+    return {"admin_profile": generate_admin_profiles(inp["admin_ids"])}
+
+
+def dag_classes(ctx, inp):
+    return {"class": generate_classes(ctx["counts"]["classes"], inp["tutor_profile"], inp["venue"])}
+
+
+def dag_class_sessions(ctx, inp):
+    return {"class_session": generate_class_sessions(inp["class"], inp["venue"])}
+
+
+def dag_materials(ctx, inp):
+    return {"material": generate_materials(inp["class"])}
+
+
+def dag_announcements(ctx, inp):
+    return {"announcement": generate_announcements(inp["class"], ctx["counts"]["announcements"])}
+
+
+def dag_ratings(ctx, inp):
+    return {"rating": list(with_rating_tutors(generate_ratings(inp["enrollment"]), inp["class"]))}
+
+
+def dag_tasks(events: str = "random"):
+    ids = ("student_ids", "tutor_ids", "admin_ids")
+    return [
+        Task("users", dag_users, (), ("user",) + ids),
+        Task("reference", dag_reference, (), ("subject", "area")),
+        Task("venues", dag_venues, (), ("venue",)),
+        Task("student_profiles", dag_student_profiles, ("student_ids",), ("student_profile",)),
+        Task("tutor_profiles", dag_tutor_profiles, ("tutor_ids", "admin_ids"), ("tutor_profile",)),
+        Task("admin_profiles", dag_admin_profiles, ("admin_ids",), ("admin_profile",)),
+        Task("classes", dag_classes, ("tutor_profile", "venue"), ("class",)),
+        Task("class_sessions", dag_class_sessions, ("class", "venue"), ("class_session",)),
+        Task("enrollments", dag_enrollments, ("class", "student_ids"), ("enrollment",)),
+        Task("billing", dag_billing, ("enrollment", "class", "admin_ids"), ("invoice", "payment", "refund")),
+        Task("materials", dag_materials, ("class",), ("material",)),
+        Task("announcements", dag_announcements, ("class",), ("announcement",)),
+        Task("messages", dag_messages, ("class", "student_ids", "tutor_ids"), ("message",)),
+        Task("notifications", dag_notifications, ("student_ids", "tutor_ids"), ("notification",)),
+        Task("ratings", dag_ratings, ("enrollment", "class"), ("rating",)),
+        Task("events", dag_events,
+             ("enrollment", "class", "student_ids") + (("student_profile",) if events == "funnel" else ()),
+             ("event_interaction", "weekly_demand")),
+    ]
+
+
+def dag_seed(seed: int, task: str) -> int:
+    return int(np.random.SeedSequence([seed, zlib.crc32(task.encode("utf-8"))]).generate_state(1)[0])
+
+
+def run_dag_task(ctx, name, fn, inputs):
+    # Worker side: processes may be fresh (spawn), so every global is set here
+    seed_everything(dag_seed(ctx["seed"], name))
+    set_as_of(ctx["as_of"])
+    set_workload(ctx["workload"])
+    set_text_pool(ctx["text_pool"])
+    return fn(ctx, inputs)
+
+
+def run_dag(seed: int, counts, workers: int, chunk_size: int = CHUNK_SIZE, fmt: str = "csv", events: str = "random",
+            workload=None, text_pool=None, tables=None, out_dir: str = OUTPUT_DIR, cache=None, partition_by=None):
+    # tables: write only these, running just the tasks they depend on. Every
+    # task keeps its own stream, so the rows match a full --dag run.
+    # cache: a TableCache; tasks whose entry exists are linked in, not run
+    tasks = dag_tasks(events)
+    if tables:
+        tasks = upstream(tasks, tables)
+    wanted = [t for t in TABLE_SCHEMAS if not tables or t in tables]
+    ctx = {"seed": seed, "counts": counts, "as_of": AS_OF, "events": events, "chunk_size": chunk_size,
+           "workload": workload, "text_pool": text_pool}
+    if cache:
+        config = cache_config(seed, counts, fmt, chunk_size, events, workload, text_pool, mode="dag",
+                              partition=bool(partition_by))
+        keys = dag_keys(tasks, config)
+        writes = [t for t in tasks if any(k in wanted for k in t.makes)]
+        hits = {t.name: m for t in writes if (m := cache.get(keys[t.name]))}
+        missing = [t for t in writes if t.name not in hits]
+        # A missing task's entry holds all of its tables, written to out_dir or not
+        staging = {t.name: cache.staging(keys[t.name]) for t in missing}
+        where = {k: staging[t.name] for t in missing for k in t.makes if k in TABLE_SCHEMAS}
+        print(f"Table cache: {len(hits)} of {len(writes)} generator tasks reused")
+        tasks = upstream(tasks, [k for t in missing for k in t.makes])
+    else:
+        where = {t: out_dir for t in wanted}
+    schemas = {t: schema for t, schema in TABLE_SCHEMAS.items() if t in where}
+    writer = DatasetWriter(schemas, lambda t: table_path(where[t], t, fmt), fmt,
+                           {t: c for t, c in (partition_by or {}).items() if t in schemas}, chunk_size)
+
+    def write(task, out):
+        # Tables go to disk as soon as their task finishes
+        for table, rows in out.items():
+            if table in schemas:
+                for _, batch in chunked(table, rows, chunk_size):
+                    writer.write(table, batch)
+
+    if tasks:
+        print(f"Running {len(tasks)} generator tasks on {workers} workers...")
+        started = perf_counter()
+        timings = run_graph(tasks, partial(run_dag_task, ctx), workers, write)
+        report_graph(tasks, timings, perf_counter() - started)
+    summary = writer.close()
+    if cache:
+        for t in missing:
+            hits[t.name] = cache.put(keys[t.name], staging[t.name], t.name, config,
+                                     {k: summary[k] for k in t.makes if k in schemas})
+        summary = {}
+        for manifest in hits.values():
+            summary.update(cache.link(manifest, out_dir, wanted))
+    return {t: summary[t] for t in wanted}
 
-    write_csv(ratings, "rating.csv", [
-        "rating_id", "student_id", "tutor_id", "class_id", "stars", "comment", "created_at"
-    ])
 
-    write_csv(events, "event_interaction.csv", [
-        "event_id", "student_id", "tutor_id", "class_id", "event_type", "query_text", "ts"
-    ])
+# -----------------------------
+# Table cache (--cache)
+# -----------------------------
 
-    write_csv(weekly_demand, "weekly_demand.csv", [
-        "week_start", "subject_code", "area_code", "views", "clicks", "enrols"
-    ])
+def cache_config(seed: int, counts, fmt: str, chunk_size: int, events: str, workload, text_pool, **extra):
+    # Everything that decides a cached table's bytes; where the text pool is cached doesn't
+    pool = {k: v for k, v in text_pool.items() if k != "cache_dir"} if text_pool else None
+    return dict(version=code_version(), seed=seed, counts=counts, as_of=AS_OF.isoformat(), format=fmt,
+                chunk_size=chunk_size, events=events, workload=workload, text_pool=pool, **extra)
+
+
+# Row counts each task reads; a task's key only covers these
+DAG_COUNTS = {
+    "users": ("students", "tutors", "admins"),
+    "venues": ("venues",),
+    "classes": ("classes",),
+    "enrollments": ("enrollments",),
+    "announcements": ("announcements",),
+    "messages": ("messages",),
+    "notifications": ("notifications",),
+    "events": ("events",),
+}
+
+
+def dag_keys(tasks, config):
+    # Task name -> key over the config, the task and the keys of the tasks it reads
+    producer = check_graph(tasks)
+    by_name = {t.name: t for t in tasks}
+    keys = {}
+
+    def key(name):
+        if name not in keys:
+            counts = {k: config["counts"][k] for k in DAG_COUNTS.get(name, ())}
+            deps = sorted({producer[k] for k in by_name[name].needs})
+            keys[name] = cache_key("task", name, dict(config, counts=counts), [key(d) for d in deps])
+        return keys[name]
+
+    for t in tasks:
+        key(t.name)
+    return keys
+
+
+def run_cached(cache, config, generate, out_dir: str):
+    # The sequential and sharded paths draw every table from one stream, so
+    # their tables are cached (and reused) as one entry. generate(dir) -> summary
+    key = cache_key("run", config)
+    manifest = cache.get(key)
+    print(f"Table cache: {'reusing' if manifest else 'storing'} run {key[:12]}")
+    if manifest is None:
+        staging = cache.staging(key)
+        manifest = cache.put(key, staging, "run", config, generate(staging))
+    return cache.link(manifest, out_dir)
 
-    print("Done. CSVs are in ./data/")
 
+# -----------------------------
+# Incremental runs
+# -----------------------------
 
-if __name__ == "__main__":
-    main()
+STATE_FILE = "_state.json"
+
+# Tables that grow with time; users, classes and venues are reused as they are
+INCREMENT_TABLES = ("enrollment", "invoice", "payment", "refund", "message", "notification", "rating", "event_interaction")
+
+# Days of history a full run spreads each count over (see the ts_between calls)
+HISTORY_DAYS = {"enrollments": 150, "messages": 120, "notifications": 120, "events": 120}
+
+
+def save_state(out_dir: str, seed: int, counts, fmt: str, watermark: datetime, increments=(), workload=None,
+               text_pool=None, generator=None):
+    # generator: how the full run made the rows (mode, backend, shards, events, as_of)
+    state = {
+        "seed": seed,
+        "format": fmt,
+        "counts": counts,
+        "watermark": watermark.isoformat(),
+        "increments": list(increments),
+        "workload": workload,
+        "text_pool": text_pool,
+        "generator": generator,
+    }
+    with open(os.path.join(out_dir, STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def read_state(out_dir: str):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_state(out_dir: str, seed: int, counts):
+    # Without a state file, the watermark is the day after the newest event
+    state = read_state(out_dir)
+    if state is not None:
+        return state
+    first = table_files(out_dir, "event_interaction")[0]
+    fmt = next(f for f, ext in FORMAT_EXT.items() if first.endswith(ext))
+    last = pd.to_datetime(read_dataset(out_dir, "event_interaction")["ts"], utc=True).max().tz_localize(None)
+    watermark = last.floor("D") + pd.Timedelta(days=1)
+    return {"seed": seed, "format": fmt, "counts": counts, "watermark": watermark.isoformat(), "increments": []}
+
+
+def clear_increments(out_dir: str, tables=INCREMENT_TABLES):
+    # A full run replaces the history, so previously appended windows go too
+    for table in tables:
+        part_dir = os.path.join(out_dir, table)
+        if os.path.isdir(part_dir):
+            for name in os.listdir(part_dir):
+                if name.startswith("inc-"):
+                    os.remove(os.path.join(part_dir, name))
+
+
+def increment_counts(counts, days: int):
+    return {k: int(round(counts[k] * days / HISTORY_DAYS[k])) for k in HISTORY_DAYS}
+
+
+def increment_seed(seed: int, start: datetime) -> int:
+    # Keyed on the window so re-running the same day reproduces it
+    return int(np.random.SeedSequence([seed, start.toordinal()]).generate_state(1)[0])
+
+
+def increment_path(out_dir: str, table: str, start: datetime, fmt: str = "csv") -> str:
+    return os.path.join(out_dir, table, f"inc-{start:%Y%m%d}{FORMAT_EXT[fmt]}")
+
+
+def stream_increment(classes, student_ids, tutor_ids, admin_ids, existing, counts,
+                     chunk_size=CHUNK_SIZE, events="random", student_profiles=None, days=1):
+    # Same generators as stream_tables, restricted to the time-based tables
+    enrollments = generate_enrollments(classes, student_ids, counts["enrollments"], existing)
+    yield from chunked("enrollment", enrollments, chunk_size)
+    yield from routed(iter_billing(enrollments, classes, admin_ids), chunk_size)
+    yield from chunked("message", iter_messages(classes, student_ids, tutor_ids, counts["messages"]), chunk_size)
+    yield from chunked("notification", iter_notifications(student_ids, tutor_ids, counts["notifications"]), chunk_size)
+    yield from chunked("rating", with_rating_tutors(iter_ratings(enrollments), classes), chunk_size)
+
+    if events == "funnel":
+        event_rows = funnel_events(student_profiles, classes, enrollments, counts["events"], random.getrandbits(63), days)
+    else:
+        event_rows = iter_events(enrollments, classes, student_ids, counts["events"])
+    yield from chunked("event_interaction", event_rows, chunk_size)
+
+
+def run_increment(out_dir: str, days: int, seed: int, counts, events: str = "random", chunk_size: int = CHUNK_SIZE,
+                  workload=None, text_pool=None):
+    # workload / text_pool: default to the ones the dataset was generated with
+    state = load_state(out_dir, seed, counts)
+    workload = workload or state.get("workload")
+    text_pool = text_pool or state.get("text_pool")
+    fmt = state["format"]
+    start = datetime.fromisoformat(state["watermark"])
+    end = start + timedelta(days=days)
+    print(f"Appending {start:%Y-%m-%d} .. {end:%Y-%m-%d} ({fmt}) to ./{out_dir}/")
+
+    users = read_dataset(out_dir, "user")
+    student_ids, tutor_ids, admin_ids = (
+        users.loc[users["role"] == role, "user_id"].tolist() for role in ("student", "tutor", "admin"))
+    classes = read_dataset(out_dir, "class").to_dict("records")
+    existing = read_dataset(out_dir, "enrollment")
+    student_profiles = read_dataset(out_dir, "student_profile") if events == "funnel" else None
+
+    seed_everything(increment_seed(state["seed"], start))
+    set_workload(workload)
+    set_text_pool(text_pool)
+    set_as_of(end)
+    set_window(start, end)
+    tables = {t: TABLE_SCHEMAS[t] for t in INCREMENT_TABLES}
+    # Tables written with --partition get the new days as dt= partitions too
+    partitioned = {t: c for t, c in PARTITION_COLUMNS.items()
+                   if t in tables and os.path.exists(os.path.join(out_dir, t, PARTITION_STATS))}
+    writer = DatasetWriter(
+        tables,
+        lambda t: table_path(out_dir, t, fmt) if t in partitioned else increment_path(out_dir, t, start, fmt),
+        fmt, partitioned, chunk_size, append=True,
+    )
+    writer.write_all(stream_increment(
+        classes, student_ids, tutor_ids, admin_ids,
+        zip(existing["class_id"], existing["student_id"]),
+        increment_counts(state["counts"], days), chunk_size, events, student_profiles, days,
+    ))
+    summary = writer.close()
+    set_window()
+
+    # Only the new increment files are read; only the weeks they cover change
+    summary["weekly_demand"] = refresh_weekly_demand(out_dir, chunk_size=chunk_size)[0]
+    save_state(out_dir, state["seed"], state["counts"], fmt, end, state["increments"] + [start.date().isoformat()],
+               workload, text_pool, state.get("generator"))
+    return summary
+
+
+# -----------------------------
+# Main
+# -----------------------------
 
+def partial_run_problems(state, seed: int, counts, fmt: str, events: str, workload, text_pool):
+    # --tables reruns the --dag streams of the listed tables, so its rows only
+    # line up (foreign keys, weekly_demand) with a dataset made by a full --dag
+    # run with the same options
+    if state is None:
+        return [f"no {STATE_FILE}; make the dataset with a full --dag run first"]
+
+    def plain(value):
+        # As stored in the state file; the text pool's cache location doesn't matter
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k != "cache_dir"}
+        return json.loads(json.dumps(value))
+
+    generator = state.get("generator") or {}
+    have = {"mode": generator.get("mode"), "seed": state["seed"], "counts": state["counts"],
+            "as_of": generator.get("as_of"), "events": generator.get("events"), "format": state["format"],
+            "workload": plain(state.get("workload")), "text_pool": plain(state.get("text_pool"))}
+    want = {"mode": "dag", "seed": seed, "counts": counts, "as_of": AS_OF.isoformat(), "events": events,
+            "format": fmt, "workload": plain(workload), "text_pool": plain(text_pool)}
+    problems = [f"{k}: dataset {have[k]}, this run {want[k]}" for k in want if have[k] != want[k]]
+    if state.get("increments"):
+        problems.append(f"dataset has --append-days increments ({', '.join(state['increments'])})")
+    return problems
+
+
+def count_override(text: str):
+    # "events=50000" -> ("events", 50000)
+    name, _, value = text.partition("=")
+    if name not in DEFAULT_COUNTS or not value.isdigit():
+        raise argparse.ArgumentTypeError(f"expected NAME=N with NAME one of {', '.join(DEFAULT_COUNTS)}")
+    return name, int(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic data for AI ClassMate")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Output directory")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLE_COLUMNS), default=None, metavar="TABLE",
+                        help="Write only these tables, running just the generators they depend on "
+                             "(task graph as with --dag; other files in --out are left alone). "
+                             f"One of: {', '.join(TABLE_COLUMNS)}")
+    parser.add_argument("--force", action="store_true",
+                        help="Write --tables output even if --out wasn't made by a full --dag run with the same options")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplier applied to every row count (e.g. 100 for 100k students)")
+    parser.add_argument("--count", nargs="+", type=count_override, default=[], metavar="NAME=N",
+                        help="Row count overrides applied after --scale, e.g. events=50000 classes=500 "
+                             f"(defaults: {', '.join(f'{k}={v}' for k, v in DEFAULT_COUNTS.items())})")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Independent shards; output is reproducible for a given (seed, shards)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dag", action="store_true",
+                        help="Run independent table generators concurrently on --workers processes "
+                             "(own RNG stream per table, so rows differ from the sequential run)")
+    parser.add_argument("--keep-parts", action="store_true",
+                        help="Leave sharded output as <table>/part-NNNNN.csv instead of merging")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python",
+                        help="numpy draws whole columns at once (see data_gen_np.py); much faster at scale")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXT), default="csv",
+                        help="parquet (zstd, one row group per chunk) or arrow (IPC file, memory-mappable)")
+    parser.add_argument("--partition", action="store_true",
+                        help=f"Write {', '.join(PARTITION_COLUMNS)} as <table>/dt=YYYY-MM-DD/part-NNNNN files, "
+                             "sorted by time, with per-day stats in <table>/_partitions.json")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Rows per batch; bounds memory for the event/message/billing streams")
+    parser.add_argument("--events", choices=["random", "funnel"], default="random",
+                        help="funnel simulates per-student browsing sessions ending in enrollments (see event_sim.py)")
+    parser.add_argument("--workload", choices=sorted(PROFILES), default="uniform",
+                        help="Skewed sampling for enrollments/events/messages/notifications (see workload.py)")
+    parser.add_argument("--zipf", type=float, default=None, help="Override the profile's Zipf exponent")
+    parser.add_argument("--hot-class-fraction", type=float, default=None,
+                        help="Override the profile's share of boosted hot classes")
+    parser.add_argument("--exam-boost", type=float, default=None,
+                        help="Override the profile's activity multiplier in exam months")
+    parser.add_argument("--text-pool", type=int, default=0, metavar="SIZE",
+                        help="Draw names/sentences/paragraphs from pools of SIZE pre-generated Faker values "
+                             "instead of calling Faker per row (see text_pool.py); 0 = off")
+    parser.add_argument("--text-locale", default="en_US", help="Faker locale for --text-pool")
+    parser.add_argument("--text-pool-cache", default=None,
+                        help="Where built pools are cached (default: <out>/_cache)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse tables from a content-addressed cache keyed by generator code, seed and options; "
+                             "store the ones that had to be generated (see table_cache.py)")
+    parser.add_argument("--cache-dir", default=None, help="Table cache location (default: <out>/_cache/tables)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB,
+                        help="Evict least recently used cache entries past this size")
+    parser.add_argument("--append-days", type=int, default=0,
+                        help="Extend the dataset in --out by this many days instead of regenerating it")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                        help="Anchor date for relative timestamps (default: today, UTC)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if (args.dag or args.tables) and (args.shards > 1 or args.backend != "python"):
+        raise SystemExit("--dag/--tables run the python backend as one shard; drop --shards/--backend")
+    if args.tables and args.append_days:
+        raise SystemExit("--tables regenerates tables; it can't be combined with --append-days")
+    print("Generating synthetic data for AI ClassMate...")
 
+    out = args.out
+    os.makedirs(out, exist_ok=True)
+    state = read_state(out) if args.tables else None
+    if args.as_of:
+        set_as_of(datetime.combine(args.as_of, time()))
+    elif state and (state.get("generator") or {}).get("as_of"):
+        # A partial run belongs to the dataset's day, not today
+        set_as_of(datetime.fromisoformat(state["generator"]["as_of"]))
+    counts = scale_counts(args.scale)
+    counts.update({name: max(MIN_PER_SHARD.get(name, 0), n) for name, n in args.count})
+    workload = profile_params(args.workload, zipf=args.zipf, hot_class_fraction=args.hot_class_fraction,
+                              exam_boost=args.exam_boost)
+    text_pool = None
+    if args.text_pool:
+        text_pool = {"size": args.text_pool, "locale": args.text_locale, "seed": args.seed,
+                     "cache_dir": args.text_pool_cache or os.path.join(out, "_cache")}
+        # Built (or loaded) once here, so shard workers only read the cache file
+        TextPool.load(**text_pool)
+
+    if args.tables:
+        problems = partial_run_problems(state, args.seed, counts, args.format, args.events, workload, text_pool)
+        if problems:
+            message = f"{out} doesn't match this --tables run:\n  " + "\n  ".join(problems)
+            if not args.force:
+                raise SystemExit(message + "\nIts foreign keys would not resolve; regenerate with --dag, or pass --force")
+            print(message + "\n--force: writing anyway")
+
+    if args.append_days:
+        print_summary(run_increment(out, args.append_days, args.seed, counts, args.events, args.chunk_size,
+                                    workload, text_pool))
+        print(f"Done. New rows are in {out}/<table>/inc-* (dt= partitions for --partition tables)")
+        return
+
+    # weekly_demand is folded from the events, so it is rewritten with them
+    tables = args.tables and list(args.tables) + (["weekly_demand"] if "event_interaction" in args.tables else [])
+    clear_increments(out, [t for t in INCREMENT_TABLES if not tables or t in tables])
+    # Either layout replaces the other, so a table is never read twice
+    for table in PARTITION_COLUMNS:
+        if not tables or table in tables:
+            clear_table(out, table)
+    partition_by = PARTITION_COLUMNS if args.partition else None
+    cache = None
+    if args.cache:
+        cache = TableCache(args.cache_dir or os.path.join(out, "_cache", "tables"), args.cache_max_mb << 20)
+    if args.dag or tables:
+        summary = run_dag(args.seed, counts, args.workers, args.chunk_size, args.format, args.events, workload,
+                          text_pool, tables, out, cache, partition_by)
+    else:
+        if args.shards > 1:
+            generate = partial(run_sharded, args.seed, counts, args.shards, min(args.workers, args.shards),
+                               args.keep_parts, args.backend, args.chunk_size, args.format, args.events, workload,
+                               text_pool, partition_by=partition_by)
+        else:
+            generate = partial(run_single, args.seed, counts, args.backend, args.chunk_size, args.format,
+                               args.events, workload, text_pool, partition_by=partition_by)
+        if cache:
+            config = cache_config(args.seed, counts, args.format, args.chunk_size, args.events, workload, text_pool,
+                                  backend=args.backend, shards=args.shards,
+                                  keep_parts=args.keep_parts and args.shards > 1, partition=args.partition)
+            summary = run_cached(cache, config, generate, out)
+        else:
+            summary = generate(out)
+    if cache:
+        removed, total = cache.evict()
+        print(f"Table cache: {total / 1e6:,.1f} MB in {cache.root}" + (f"; {removed} old entries evicted" if removed else ""))
+    # A partial run leaves the dataset's state (seed, counts, watermark) as it was
+    if not tables:
+        mode = "dag" if args.dag else "sharded" if args.shards > 1 else "sequential"
+        generator = {"mode": mode, "backend": args.backend, "shards": args.shards, "events": args.events,
+                     "as_of": AS_OF.isoformat()}
+        save_state(out, args.seed, counts, args.format, AS_OF, workload=workload, text_pool=text_pool,
+                   generator=generator)
+    if not tables or "event_interaction" in tables:
+        record_rollup(out, args.format)
+
+    print_summary(summary, workers=args.dag or args.shards > 1)
+    print(f"Done. Tables are in {out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import data_gen as dg
+from demand_rollup import WeeklyDemand
+from ids import COLUMN_SPACE, TEMPLATES, IdSpace
+from table_io import CHUNK_SIZE, chunked
+from workload import AliasTable
+
+
+# Columnar backend for data_gen.py: every column is drawn in one call on an
+# np.random.Generator and tables come back as DataFrames with the same columns
+# as the row generators. Tables that are small or Faker-bound (profiles text,
+# venues, sessions, materials, messages, ...) still go through data_gen.
+# Entity ids are int64 keys into an IdSpace (ids.py) until the rows are written.
+
+DAY = 86400
+
+
+# -----------------------------
+# Vectorized helpers
+# -----------------------------
+
+def epoch(dt: datetime) -> int:
+    return int((dt - datetime(1970, 1, 1)).total_seconds())
+
+
+def ts_between(rng: np.random.Generator, n: int, as_of: datetime, days_back=365, days_forward=60) -> np.ndarray:
+    start = epoch(as_of) - days_back * DAY
+    return start + rng.integers(0, (days_back + days_forward) * DAY, size=n)
+
+
+def iso(seconds: np.ndarray) -> np.ndarray:
+    return np.char.add(np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s"), "Z")
+
+
+def iso_date(seconds: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(seconds.astype("datetime64[s]").astype("datetime64[D]"), unit="D")
+
+
+def money(amount: np.ndarray) -> np.ndarray:
+    return np.char.mod("%.2f", np.round(amount, 2))
+
+
+def bool_str(mask: np.ndarray) -> np.ndarray:
+    return np.where(mask, "true", "false")
+
+
+def choose_weighted(rng: np.random.Generator, items, weights, n: int) -> np.ndarray:
+    p = np.asarray(weights, dtype=float)
+    return np.asarray(items)[rng.choice(len(items), size=n, p=p / p.sum())]
+
+
+def blank_unless(mask: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return np.where(mask, values, "")
+
+
+def name_pool(size: int = 2000) -> np.ndarray:
+    # Faker is far too slow per row at scale; sample display names from a pool
+    return np.array([dg.fake.name() for _ in range(size)])
+
+
+# -----------------------------
+# Generators
+# -----------------------------
+
+def generate_users(rng, ids: IdSpace, as_of, num_students, num_tutors, num_admins, offsets=None):
+    offsets = offsets or {}
+    roles = [("student", num_students, 0.95, "students"), ("tutor", num_tutors, 0.98, "tutors"), ("admin", num_admins, 0.80, "admins")]
+    n = num_students + num_tutors + num_admins
+
+    user_id = ids.new("user", rng, n)
+    email = np.concatenate([
+        np.char.add(np.char.add(role, np.arange(offsets.get(key, 0) + 1, offsets.get(key, 0) + count + 1).astype(str)), "@example.com")
+        for role, count, _, key in roles
+    ])
+    role = np.repeat([r for r, _, _, _ in roles], [c for _, c, _, _ in roles])
+    has_phone = rng.random(n) < np.repeat([p for _, _, p, _ in roles], [c for _, c, _, _ in roles])
+
+    # 07XYYYYYYY drawn without replacement from this shard's range so phones are unique
+    phone_lo, phone_hi = dg.phone_range(offsets, n)
+    phone_num = phone_lo + rng.choice(phone_hi - phone_lo, size=n, replace=False)
+    phone = np.char.add(np.char.add("07", (phone_num // 9_000_000).astype(str)), (1_000_000 + phone_num % 9_000_000).astype(str))
+
+    created = ts_between(rng, n, as_of, 365, 0)
+    updated = created + rng.integers(0, 121, size=n) * DAY
+
+    users = pd.DataFrame({
+        "user_id": user_id,
+        "email": email,
+        "phone": blank_unless(has_phone, phone),
+        "display_name": dg.TEXT.sample("name", rng, n) if dg.TEXT else name_pool()[rng.integers(0, 2000, size=n)],
+        "role": role,
+        "is_active": "true",
+        "created_at": iso(created),
+        "updated_at": iso(updated),
+    })
+    student_ids = user_id[:num_students]
+    tutor_ids = user_id[num_students:num_students + num_tutors]
+    admin_ids = user_id[num_students + num_tutors:]
+    return users, student_ids, tutor_ids, admin_ids
+
+
+def subject_lists(rng, codes: np.ndarray, n: int, k_min: int, k_max: int) -> np.ndarray:
+    # k distinct codes per row, rendered exactly like json.dumps(list)
+    picks = np.argsort(rng.random((n, len(codes))), axis=1)[:, :k_max]
+    k = rng.integers(k_min, k_max + 1, size=n)
+    out = np.char.add('["', codes[picks[:, 0]])
+    for j in range(1, k_max):
+        out = np.where(k > j, np.char.add(np.char.add(out, '", "'), codes[picks[:, j]]), out)
+    return np.char.add(out, '"]')
+
+
+def generate_student_profiles(rng, student_ids):
+    n = len(student_ids)
+    grade = rng.integers(6, 14, size=n)
+    area_codes = np.array([a["area_code"] for a in dg.AREAS])
+    subjects = np.empty(n, dtype=object)
+    for level, mask in (("OL", grade <= 11), ("AL", grade >= 12)):
+        codes = np.array([s["subject_code"] for s in dg.SUBJECTS if s["level"] == level])
+        subjects[mask] = subject_lists(rng, codes, int(mask.sum()), 2, min(4, len(codes)))
+    return pd.DataFrame({
+        "user_id": student_ids,
+        "grade": grade,
+        "area_code": area_codes[rng.integers(0, len(area_codes), size=n)],
+        "subjects_of_interest": subjects,
+    })
+
+
+def generate_classes(rng, ids: IdSpace, as_of, num_classes, tutor_profiles, venues):
+    approved = [tp for tp in tutor_profiles if tp["status"] == "approved"]
+    tutor_ids = np.array([tp["user_id"] for tp in approved], dtype=np.int64)
+    tutor_mode = np.array([tp["mode"] for tp in approved])
+    tutor_area = np.array([tp["area_code"] for tp in approved])
+    tutor_price = np.array([float(tp["base_price"]) for tp in approved])
+    taught = [json.loads(tp["subjects_taught"]) for tp in approved]
+    taught_n = np.array([len(t) for t in taught])
+    taught_pad = np.array([t + [t[0]] * (3 - len(t)) for t in taught])
+
+    n = num_classes
+    t = rng.integers(0, len(approved), size=n)
+    mode = tutor_mode[t]
+    area_code = tutor_area[t]
+    subject_code = taught_pad[t, (rng.random(n) * taught_n[t]).astype(int)]
+
+    level = {s["subject_code"]: s["level"] for s in dg.SUBJECTS}
+    is_ol = np.array([level[s] == "OL" for s in subject_code], dtype=bool)
+    grade = np.where(is_ol, rng.integers(10, 12, size=n), rng.integers(12, 14, size=n))
+
+    u = rng.random(n)
+    is_physical = ((mode == "physical") & (u < 0.85)) | ((mode == "hybrid") & (u < 0.5))
+    venue_id = np.full(n, "", dtype=object)
+    all_venues = np.array([v["venue_id"] for v in venues])
+    for area in np.unique(area_code[is_physical]):
+        mask = is_physical & (area_code == area)
+        local = np.array([v["venue_id"] for v in venues if v["area_code"] == area])
+        if len(local) == 0:
+            local = all_venues
+        venue_id[mask] = local[rng.integers(0, len(local), size=int(mask.sum()))]
+
+    fee = tutor_price[t] * rng.uniform(0.9, 1.3, size=n)
+    status = choose_weighted(rng, ["published", "draft", "archived"], [0.75, 0.2, 0.05], n)
+    created = ts_between(rng, n, as_of, 200, 0)
+    published = created + rng.integers(0, 31, size=n) * DAY
+
+    return pd.DataFrame({
+        "class_id": ids.new("class", rng, n),
+        "tutor_id": tutor_ids[t],
+        "subject_code": subject_code,
+        "grade": grade,
+        "mode": np.where(is_physical, "physical", "online"),
+        "area_code": area_code,
+        "venue_id": venue_id,
+        "fee": money(fee),
+        "price_band": np.select([fee < 2500, fee <= 5500], ["low", "mid"], "high"),
+        "capacity_seats": rng.integers(20, 121, size=n),
+        "status": status,
+        "created_at": iso(created),
+        "published_at": blank_unless(status == "published", iso(published)),
+    })
+
+
+def sample_enrollment_pairs(rng, capacity: np.ndarray, num_students: int, target: int, rounds: int = 20,
+                            workload=None):
+    # Draw (class, student) pairs in bulk; drop duplicates and over-capacity seats, redraw the gap
+    classes = np.flatnonzero(capacity > 0)
+    keys = np.empty(0, dtype=np.int64)
+    for _ in range(rounds):
+        need = target - len(keys)
+        if need <= 0 or len(classes) == 0:
+            break
+        draw = int(need * 1.25) + 16
+        if workload:
+            # Popular classes first; classes filled in earlier rounds drop out of the table
+            taken = np.bincount(keys // num_students, minlength=len(capacity))
+            weights = workload.weights("class", len(capacity)) * (taken < capacity)
+            if not weights.any():
+                break
+            cls = AliasTable(weights).draws(rng, draw)
+            stu = workload.table("student", num_students).draws(rng, draw)
+        else:
+            cls = classes[rng.integers(0, len(classes), size=draw)]
+            stu = rng.integers(0, num_students, size=draw)
+        new = cls.astype(np.int64) * num_students + stu
+        keys = np.concatenate([keys, new])
+        _, first = np.unique(keys, return_index=True)
+        keys = keys[np.sort(first)]
+        cls = keys // num_students
+        order = np.argsort(cls, kind="stable")
+        sorted_cls = cls[order]
+        group_start = np.searchsorted(sorted_cls, sorted_cls, side="left")
+        rank = np.empty(len(keys), dtype=np.int64)
+        rank[order] = np.arange(len(keys)) - group_start
+        keys = keys[rank < capacity[cls]][:target]
+    if len(keys) < target:
+        print(f"sample_enrollment_pairs: only {len(keys):,} of {target:,} enrollments placed")
+    return keys // num_students, keys % num_students
+
+
+def activity_ts(rng, n: int, as_of: datetime, days_back: int, workload=None) -> np.ndarray:
+    # ts_between up to as_of, shaped by the workload profile when there is one
+    if workload is None:
+        return ts_between(rng, n, as_of, days_back, 0)
+    return workload.timestamps(rng, n, as_of - timedelta(days=days_back), as_of)
+
+
+def generate_enrollments(rng, ids: IdSpace, as_of, classes: pd.DataFrame, student_ids, target_count, workload=None):
+    published = (classes["status"] == "published").to_numpy()
+    capacity = np.where(published, classes["capacity_seats"].to_numpy(), 0)
+    cls, stu = sample_enrollment_pairs(rng, capacity, len(student_ids), target_count, workload=workload)
+    n = len(cls)
+
+    status = choose_weighted(rng, ["active", "completed", "pending", "cancelled"], [0.45, 0.25, 0.2, 0.1], n)
+    enrolled = activity_ts(rng, n, as_of, 150, workload)
+    cancelled = status == "cancelled"
+    cancelled_at = enrolled + rng.integers(1, 61, size=n) * DAY
+    reason = np.where(rng.random(n) < 0.7, "Student request", "Payment issue")
+
+    enrollments = pd.DataFrame({
+        "enrollment_id": ids.new("enrollment", rng, n),
+        "class_id": classes["class_id"].to_numpy()[cls],
+        "student_id": np.asarray(student_ids)[stu],
+        "status": status,
+        "enrolled_at": iso(enrolled),
+        "cancelled_at": blank_unless(cancelled, iso(cancelled_at)),
+        "cancel_reason": blank_unless(cancelled, reason),
+    })
+    return enrollments, cls, enrolled
+
+
+def generate_billing(rng, ids: IdSpace, enrollments: pd.DataFrame, enrolled: np.ndarray, class_idx: np.ndarray, classes: pd.DataFrame, admin_ids):
+    n = len(enrollments)
+    admin_ids = np.asarray(admin_ids)
+    amount = classes["fee"].to_numpy(dtype=float)[class_idx]
+    inv_status = choose_weighted(
+        rng,
+        ["awaiting_proof", "under_review", "verified", "rejected", "refunded"],
+        [0.30, 0.20, 0.40, 0.05, 0.05],
+        n,
+    )
+    invoice_id = ids.new("invoice", rng, n)
+    invoices = pd.DataFrame({
+        "invoice_id": invoice_id,
+        "enrollment_id": enrollments["enrollment_id"].to_numpy(),
+        "amount_due": money(amount),
+        "due_date": iso_date(enrolled + rng.integers(3, 21, size=n) * DAY),
+        "status": inv_status,
+        "created_at": enrollments["enrolled_at"].to_numpy(),
+    })
+
+    paid = inv_status != "awaiting_proof"
+    p_status = inv_status[paid]
+    p_created = enrolled[paid]
+    p_invoice = invoice_id[paid]
+    m = len(p_status)
+    pay_status = np.select(
+        [np.isin(p_status, ["verified", "refunded"]), p_status == "rejected"],
+        ["verified", "rejected"],
+        "pending",
+    )
+    verified = pay_status == "verified"
+    paid_amount = np.round(amount[paid] * rng.uniform(0.9, 1.0, size=m), 2)
+    paid_at = p_created + rng.integers(0, 11, size=m) * DAY
+    payment_id = ids.new("payment", rng, m)
+    payments = pd.DataFrame({
+        "payment_id": payment_id,
+        "invoice_id": p_invoice,
+        "paid_amount": money(paid_amount),
+        "paid_at": iso(paid_at),
+        "method": np.array(["bank_transfer", "card", "cash", "online"])[rng.integers(0, 4, size=m)],
+        "proof_url": p_invoice,  # rendered from the invoice key (ids.TEMPLATES)
+        "verify_status": pay_status,
+        "verified_by": np.where(verified, admin_ids[rng.integers(0, len(admin_ids), size=m)], -1),
+        "verified_at": blank_unless(verified, iso(p_created + rng.integers(1, 16, size=m) * DAY)),
+        "verify_note": np.select([verified, pay_status == "rejected"], ["OK", "Mismatch"], ""),
+    })
+
+    refunded = p_status == "refunded"
+    r = int(refunded.sum())
+    refunds = pd.DataFrame({
+        "refund_id": ids.new("refund", rng, r),
+        "payment_id": payment_id[refunded],
+        "refund_amount": money(paid_amount[refunded] * rng.uniform(0.5, 1.0, size=r)),
+        "refunded_at": iso(paid_at[refunded] + rng.integers(1, 11, size=r) * DAY),
+        "reason": np.array(["Class cancelled", "Tutor unavailable", "Student requested"])[rng.integers(0, 3, size=r)],
+        "processed_by": admin_ids[rng.integers(0, len(admin_ids), size=r)],
+    })
+    return invoices, payments, refunds
+
+
+EVENT_TYPES = ["search", "impression", "view_tutor", "view_class", "click", "bookmark", "enrol"]
+EVENT_WEIGHTS = [0.15, 0.25, 0.10, 0.20, 0.20, 0.05, 0.05]
+SEARCH_QUERIES = ["math grade 10", "physics al", "english colombo", "science ol", "tutor near me"]
+
+
+def generate_events(rng, ids: IdSpace, as_of, enrollments: pd.DataFrame, enrol_class_idx, classes: pd.DataFrame, student_ids, target=20000,
+                    workload=None):
+    n = target
+    class_ids = classes["class_id"].to_numpy()
+    tutor_ids = classes["tutor_id"].to_numpy()
+    if workload:
+        c = workload.table("class", len(class_ids)).draws(rng, n)
+    else:
+        c = rng.integers(0, len(class_ids), size=n)
+    has_student = rng.random(n) < 0.9
+    if workload:
+        s = workload.table("student", len(student_ids)).draws(rng, n)
+    else:
+        s = rng.integers(0, len(student_ids), size=n)
+    student = np.where(has_student, np.asarray(student_ids)[s], -1)
+    et = choose_weighted(rng, EVENT_TYPES, EVENT_WEIGHTS, n)
+    query = blank_unless(et == "search", np.array(SEARCH_QUERIES)[rng.integers(0, len(SEARCH_QUERIES), size=n)])
+    ts = activity_ts(rng, n, as_of, 120, workload)
+
+    e = len(enrollments)
+    events = pd.DataFrame({
+        "event_id": ids.new("event", rng, n + e),
+        "student_id": np.concatenate([student, enrollments["student_id"].to_numpy()]),
+        "tutor_id": np.concatenate([tutor_ids[c], tutor_ids[enrol_class_idx]]),
+        "class_id": np.concatenate([class_ids[c], class_ids[enrol_class_idx]]),
+        "event_type": np.concatenate([et, np.full(e, "enrol")]),
+        "query_text": np.concatenate([query, np.full(e, "")]),
+        "ts": np.concatenate([iso(ts), enrollments["enrolled_at"].to_numpy()]),
+    })
+    class_idx = np.concatenate([c, enrol_class_idx])
+    return events, class_idx
+
+
+def generate_weekly_demand(events: pd.DataFrame, class_idx: np.ndarray, classes: pd.DataFrame):
+    # Class keys are row positions here, so the rollup joins on those
+    demand = WeeklyDemand(pd.DataFrame({
+        "class_id": np.arange(len(classes)),
+        "subject_code": classes["subject_code"].to_numpy(),
+        "area_code": classes["area_code"].to_numpy(),
+    }))
+    demand.add(pd.DataFrame({"class_id": class_idx, "ts": events["ts"].to_numpy(),
+                             "event_type": events["event_type"].to_numpy()}))
+    return demand.frame()
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+
+def generate_funnel_events(rng, ids: IdSpace, as_of, student_profiles, classes, enrollments, target):
+    # event_sim works on id text, so its (small) entity tables are rendered first
+    import event_sim
+
+    classes = ids.render_frame(classes)
+    world = event_sim.world_from_tables(ids.render_frame(student_profiles), classes, ids.render_frame(enrollments),
+                                        dg.AREAS, dg.SUBJECTS)
+    seed = int(rng.integers(0, 2**63))
+    events = pd.DataFrame(list(event_sim.iter_events(world, target, seed, as_of)), columns=dg.TABLE_COLUMNS["event_interaction"])
+    return events, pd.Index(classes["class_id"]).get_indexer(events["class_id"])
+
+
+def generate_all(counts, offsets=None, seed=dg.SEED, as_of=None, events="random", workload=None, text_pool=None,
+                 ids: IdSpace = None):
+    # Without an IdSpace the tables come back with ids rendered; with one, key
+    # columns stay int64 and the caller renders them (see iter_tables)
+    render = ids is None
+    ids = ids or IdSpace()
+    # Also usable without data_gen.generate_tables, so the clock, workload and text pool are set here
+    as_of = as_of or dg.AS_OF
+    dg.set_as_of(as_of)
+    dg.set_workload(workload)
+    dg.set_text_pool(text_pool)
+    workload = dg.WORKLOAD
+    rng = np.random.default_rng(seed)
+
+    users, student_ids, tutor_ids, admin_ids = generate_users(
+        rng, ids, as_of, counts["students"], counts["tutors"], counts["admins"], offsets)
+    student_profiles = generate_student_profiles(rng, student_ids)
+    # The row generators get plain ints: they hash faster than numpy scalars
+    tutor_profiles = dg.generate_tutor_profiles(tutor_ids.tolist(), admin_ids.tolist())
+    admin_profiles = dg.generate_admin_profiles(admin_ids.tolist())
+    venues = dg.generate_venues(counts["venues"])
+
+    classes = generate_classes(rng, ids, as_of, counts["classes"], tutor_profiles, venues)
+    class_records = classes.to_dict("records")
+    class_sessions = dg.generate_class_sessions(class_records, venues)
+
+    enrollments, enrol_class_idx, enrolled = generate_enrollments(rng, ids, as_of, classes, student_ids, counts["enrollments"], workload)
+    invoices, payments, refunds = generate_billing(rng, ids, enrollments, enrolled, enrol_class_idx, classes, admin_ids)
+
+    student_list = student_ids.tolist()
+    materials = dg.generate_materials(class_records)
+    announcements = dg.generate_announcements(class_records, counts["announcements"])
+    messages = dg.generate_messages(class_records, student_list, tutor_ids.tolist(), counts["messages"])
+    notifications = dg.generate_notifications(student_list, tutor_ids.tolist(), counts["notifications"])
+    ratings = pd.DataFrame(dg.generate_ratings(enrollments.to_dict("records")), columns=dg.TABLE_COLUMNS["rating"])
+    # Class keys are row positions, so the class -> tutor join is an array lookup
+    ratings["tutor_id"] = classes["tutor_id"].to_numpy()[ratings["class_id"].to_numpy(dtype=np.int64)]
+
+    if events == "funnel":
+        events, event_class_idx = generate_funnel_events(
+            rng, ids, as_of, student_profiles, classes, enrollments, counts["events"])
+    else:
+        events, event_class_idx = generate_events(
+            rng, ids, as_of, enrollments, enrol_class_idx, classes, student_ids, counts["events"], workload)
+    weekly_demand = generate_weekly_demand(events, event_class_idx, classes)
+
+    tables = {
+        "user": users,
+        "student_profile": student_profiles,
+        "tutor_profile": tutor_profiles,
+        "admin_profile": admin_profiles,
+        "subject": dg.generate_subjects(),
+        "area": dg.generate_areas(),
+        "venue": venues,
+        "class": classes,
+        "class_session": class_sessions,
+        "enrollment": enrollments,
+        "invoice": invoices,
+        "payment": payments,
+        "refund": refunds,
+        "material": materials,
+        "announcement": announcements,
+        "message": messages,
+        "notification": notifications,
+        "rating": ratings,
+        "event_interaction": events,
+        "weekly_demand": weekly_demand,
+    }
+    if render:
+        tables = {table: render_batch(ids, table, rows) for table, rows in tables.items()}
+    return tables
+
+
+def render_batch(ids: IdSpace, table: str, batch):
+    if not any(c in COLUMN_SPACE or c in TEMPLATES for c in dg.TABLE_COLUMNS[table]):
+        return batch
+    if not isinstance(batch, pd.DataFrame):
+        batch = pd.DataFrame(batch, columns=dg.TABLE_COLUMNS[table])
+    return ids.render_frame(batch)
+
+
+def iter_tables(counts, offsets=None, seed=dg.SEED, as_of=None, events="random", workload=None, text_pool=None,
+                chunk_size=CHUNK_SIZE):
+    # (table, batch) pairs; ids are rendered to text one chunk at a time
+    ids = IdSpace()
+    tables = generate_all(counts, offsets, seed, as_of, events, workload, text_pool, ids)
+    for table in list(tables):
+        rows = tables.pop(table)
+        for _, batch in chunked(table, rows, chunk_size):
+            yield table, render_batch(ids, table, batch)
@@ -0,0 +1,293 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from demand_rollup import load_rollup_state, rollup_format
+from schemas import FORECAST_SCHEMAS
+from table_io import FORMAT_EXT, read_dataset, write_table
+
+
+# Local stand-in for the BQML ARIMA_PLUS forecasts (sql/forecast_*.sql,
+# sql/subject_forecast.sql) over weekly_demand. Every series is fitted with
+# damped-trend additive Holt-Winters; all series and a grid of smoothing
+# parameters run through the recursion together as [grid, series] arrays, and
+# each series keeps the parameters with the lowest one-step-ahead SSE. Blocks of
+# series are fitted in a process pool.
+#
+# The final states are saved (_forecast_<name>.npz), so when new weeks arrive
+# only those weeks are run through the recursion with the stored parameters;
+# --full re-selects parameters from scratch.
+
+SEASON = 4  # weeks; disabled for series shorter than two seasons
+HORIZON = 8
+Z_95 = 1.959964  # ML.FORECAST default confidence_level 0.95
+BLOCK = 256  # series per task; keeps the [grid, series] arrays cache-sized
+
+GRID = {
+    "alpha": [0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9],
+    "beta": [0.0, 0.05, 0.1, 0.2],
+    "gamma": [0.0, 0.1, 0.3],
+    "phi": [0.8, 0.9, 0.98],
+}
+PARAMS = list(GRID)
+STATE_FIELDS = ["level", "trend", "season", "sse", "n"] + PARAMS
+
+
+def week_index(as_of: date) -> np.datetime64:
+    # Monday of the week containing as_of
+    day = np.datetime64(as_of, "D")
+    return day - (day.astype(np.int64) + 3) % 7
+
+
+def smooth(y: np.ndarray, level, trend, season, t0: int, alpha, beta, gamma, phi, sse, n):
+    # Runs y [series, weeks] through the recursion. State arrays are [G, S]
+    # (season [G, S, m]); parameters broadcast against them.
+    m = season.shape[-1]
+    shape = np.broadcast_shapes(level.shape, np.shape(alpha))
+    level = np.array(np.broadcast_to(level, shape))
+    trend = np.array(np.broadcast_to(trend, shape))
+    sse = np.array(np.broadcast_to(sse, shape))
+    # Season first so each step touches one contiguous slice
+    season = np.array(np.moveaxis(np.broadcast_to(season, shape + (m,)), -1, 0))
+    damped_beta = alpha * beta
+    e = np.empty(shape)
+    for j in range(y.shape[1]):
+        s_k = season[(t0 + j) % m]
+        trend *= phi
+        np.subtract(y[:, j], level, out=e)
+        e -= trend
+        e -= s_k
+        sse += e * e
+        level += trend
+        level += alpha * e
+        trend += damped_beta * e
+        s_k += gamma * e
+    return level, trend, np.moveaxis(season, 0, -1), sse, n + y.shape[1]
+
+
+def initial_state(y: np.ndarray, m: int):
+    if m > 1:
+        first = y[:, :m].mean(axis=1)
+        trend = (y[:, m:2 * m].mean(axis=1) - first) / m
+        season = y[:, :m] - first[:, None]
+        return first, trend, season
+    return y[:, 0].copy(), np.zeros(len(y)), np.zeros((len(y), 1))
+
+
+def fit_block(y: np.ndarray, m: int):
+    # Grid search over all parameter combinations at once; returns per-series state
+    grid = [g for g in product(*GRID.values()) if m > 1 or g[2] == 0.0]
+    params = {p: np.array([g[i] for g in grid])[:, None] for i, p in enumerate(PARAMS)}
+    level0, trend0, season0 = initial_state(y, m)
+    G, S = len(grid), len(y)
+    level, trend, season, sse, n = smooth(
+        y, np.broadcast_to(level0, (G, S)), np.broadcast_to(trend0, (G, S)),
+        np.broadcast_to(season0, (G, S, m)), 0, **params, sse=np.zeros((G, S)), n=0)
+    best = sse.argmin(axis=0)
+    cols = np.arange(S)
+    state = {
+        "level": level[best, cols],
+        "trend": trend[best, cols],
+        "season": season[best, cols],
+        "sse": sse[best, cols],
+        "n": np.full(S, n, dtype=np.int64),
+    }
+    for p in PARAMS:
+        state[p] = params[p][best, 0]
+    return state
+
+
+def update_state(state, y: np.ndarray, t0: int):
+    # New weeks for already-fitted series, with their stored parameters
+    level, trend, season, sse, n = smooth(
+        y, state["level"], state["trend"], state["season"], t0,
+        state["alpha"], state["beta"], state["gamma"], state["phi"], state["sse"], state["n"])
+    return dict(state, level=level, trend=trend, season=season, sse=sse, n=n)
+
+
+def fit(y: np.ndarray, m: int, workers: int = 1):
+    blocks = [y[i:i + BLOCK] for i in range(0, len(y), BLOCK)]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(fit_block, blocks, [m] * len(blocks)))
+    else:
+        parts = [fit_block(b, m) for b in blocks]
+    return {f: np.concatenate([p[f] for p in parts]) for f in STATE_FIELDS}
+
+
+def forecast(state, t0: int, horizon: int):
+    # Point forecasts and 95% intervals, [series, horizon]
+    m = state["season"].shape[1]
+    phi = state["phi"][:, None]
+    h = np.arange(1, horizon + 1)
+    damp = np.cumsum(phi ** h, axis=1)
+    seasonal = state["season"][:, (t0 + h - 1) % m]
+    point = state["level"][:, None] + damp * state["trend"][:, None] + seasonal
+    # ETS(A,Ad,A) variance: sigma^2 * (1 + sum_{j<h} c_j^2)
+    c = state["alpha"][:, None] * (1 + state["beta"][:, None] * damp)
+    if m > 1:
+        c = c + state["gamma"][:, None] * (h % m == 0)
+    var = np.concatenate([np.zeros((len(c), 1)), np.cumsum(c[:, :-1] ** 2, axis=1)], axis=1) + 1
+    sigma = np.sqrt(state["sse"] / np.maximum(state["n"], 1))[:, None]
+    width = Z_95 * sigma * np.sqrt(var)
+    # Demand is a count
+    return np.maximum(point, 0), np.maximum(point - width, 0), point + width
+
+
+# -----------------------------
+# Panels + persisted state
+# -----------------------------
+
+def panel(df: pd.DataFrame, keys, metric: str, end: np.datetime64):
+    # Dense [series, weeks] matrix of complete weeks before `end`; missing weeks are 0
+    weeks = df["week_start"].astype(str).to_numpy().astype("datetime64[D]")
+    keep = weeks < end
+    df, weeks = df[keep], weeks[keep]
+    ids = df[keys].astype(str).agg("|".join, axis=1) if len(keys) > 1 else df[keys[0]].astype(str)
+    series = pd.Index(np.sort(ids.unique()))
+    start = weeks.min() if len(weeks) else end
+    columns = np.arange(start, end, np.timedelta64(7, "D"))
+    y = np.zeros((len(series), len(columns)))
+    np.add.at(y, (series.get_indexer(ids), (weeks - start).astype(np.int64) // 7),
+              pd.to_numeric(df[metric]).to_numpy(dtype=float))
+    return series, columns, y
+
+
+def state_path(data_dir: str, name: str) -> str:
+    return os.path.join(data_dir, f"_forecast_{name}.npz")
+
+
+def save_state(path: str, series: pd.Index, state, weeks: np.ndarray, y: np.ndarray):
+    # Per-series totals let the next run spot history that changed under it
+    np.savez(path, series=series.to_numpy(dtype=str), first_week=str(weeks[0]), last_week=str(weeks[-1]),
+             total=y.sum(axis=1), **state)
+
+
+def load_state(path: str, m: int):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        saved = {k: f[k] for k in f.files}
+    if saved["season"].shape[1] != m:
+        return None
+    return saved
+
+
+def fit_series(series: pd.Index, weeks: np.ndarray, y: np.ndarray, season: int, path: str = None,
+               full: bool = False, workers: int = 1):
+    # (state, series fitted from scratch, weeks applied to saved state), reusing saved state when possible
+    m = season if y.shape[1] >= 2 * season else 1
+    saved = None if full or path is None else load_state(path, m)
+    last = np.datetime64(str(saved["last_week"])) if saved is not None else None
+    if saved is None or str(weeks[0]) != str(saved["first_week"]) or last not in weeks:
+        state = fit(y, m, workers)
+        if path:
+            save_state(path, series, state, weeks, y)
+        return state, len(series), 0
+
+    new = weeks > last
+    pos = pd.Index(saved["series"]).get_indexer(series)
+    # Series seen before whose fitted weeks are unchanged continue from their state
+    old = pos >= 0
+    old[old] = np.isclose(saved["total"][pos[old]], y[old][:, ~new].sum(axis=1))
+    state = {f: saved[f][pos[old]] for f in STATE_FIELDS}
+    if new.any():
+        state = update_state(state, y[old][:, new], int((~new).sum()))
+    merged = {f: np.zeros((len(series),) + state[f].shape[1:], dtype=state[f].dtype) for f in STATE_FIELDS}
+    for f in STATE_FIELDS:
+        merged[f][old] = state[f]
+    if (~old).any():
+        fresh = fit(y[~old], m, workers)
+        for f in STATE_FIELDS:
+            merged[f][~old] = fresh[f]
+    if path:
+        save_state(path, series, merged, weeks, y)
+    return merged, int((~old).sum()), int(new.sum())
+
+
+def forecast_frame(series: pd.Index, weeks: np.ndarray, state, horizon: int, value: str) -> pd.DataFrame:
+    point, lo, hi = forecast(state, len(weeks), horizon)
+    future = weeks[-1] + np.arange(1, horizon + 1) * np.timedelta64(7, "D")
+    return pd.DataFrame({
+        "ts_id": np.repeat(series.to_numpy(dtype=object), horizon),
+        "week_start": np.datetime_as_string(np.tile(future, len(series))),
+        value: point.ravel(),
+        "pred_lo": lo.ravel(),
+        "pred_hi": hi.ravel(),
+    })
+
+
+def wape(actual: np.ndarray, predicted: np.ndarray) -> float:
+    total = actual.sum()
+    return float(np.abs(actual - predicted).sum() / total) if total else float("nan")
+
+
+# -----------------------------
+# Forecast tables
+# -----------------------------
+
+# name -> (grouping keys, metric, output value column)
+MODELS = {
+    "weekly_demand_forecast": (["subject_code", "area_code"], "enrols", "enrols_pred"),
+    "subject_clicks_forecast": (["subject_code"], "clicks", "clicks_pred"),
+}
+
+
+def run_forecasts(data_dir: str, as_of: date, horizon: int = HORIZON, season: int = SEASON, full: bool = False,
+                  workers: int = 1, holdout: int = 0):
+    demand = read_dataset(data_dir, "weekly_demand")
+    end = week_index(as_of)
+    fmt = rollup_format(data_dir, load_rollup_state(data_dir))
+    for name, (keys, metric, value) in MODELS.items():
+        started = perf_counter()
+        series, weeks, y = panel(demand, keys, metric, end)
+        if not len(series) or y.shape[1] < 3:
+            print(f"{name}: not enough weeks of weekly_demand before {end}")
+            continue
+        if holdout:
+            # Same split as sql/forecast_eval.sql: fit without the last weeks, score them
+            state, _, _ = fit_series(series, weeks[:-holdout], y[:, :-holdout], season, workers=workers)
+            point, _, _ = forecast(state, y.shape[1] - holdout, holdout)
+            print(f"{name}: {len(series):,} series, WAPE over the last {holdout} week(s) "
+                  f"{wape(y[:, -holdout:], point):.3f} (last value: {wape(y[:, -holdout:], y[:, [-holdout - 1]]):.3f}) "
+                  f"in {perf_counter() - started:.2f}s")
+            continue
+
+        state, refitted, appended = fit_series(series, weeks, y, season, state_path(data_dir, name), full, workers)
+        df = forecast_frame(series, weeks, state, horizon, value)
+        if len(keys) > 1:
+            parts = df["ts_id"].str.split("|", n=1, expand=True)
+            df["subject_code"], df["area_code"] = parts[0], parts[1]
+        else:
+            df["subject_code"] = df["ts_id"]
+        path = os.path.join(data_dir, f"{name}{FORMAT_EXT[fmt]}")
+        rows, size = write_table(df, path, FORECAST_SCHEMAS[name], fmt)
+        secs = perf_counter() - started
+        print(f"{name}: {len(series):,} series x {y.shape[1]} weeks, {refitted:,} fitted, {appended} new week(s) "
+              f"applied to saved state; {rows:,} rows ({size / 1e6:.2f} MB) in {secs:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast weekly_demand locally (stand-in for ARIMA_PLUS)")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                        help="Weeks from the one containing this date on are incomplete and ignored (default: today)")
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--season", type=int, default=SEASON)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--full", action="store_true", help="Ignore saved state and re-select every series' parameters")
+    parser.add_argument("--holdout", type=int, default=0, help="Only report WAPE on the last N complete weeks")
+    args = parser.parse_args()
+
+    run_forecasts(args.data, args.as_of or datetime.utcnow().date(), args.horizon, args.season, args.full,
+                  args.workers, args.holdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import json
+import argparse
+from time import perf_counter
+
+from lazy import lazy_import
+from schemas import TABLE_COLUMNS, TABLE_SCHEMAS
+from table_io import CHUNK_SIZE, FORMAT_EXT, iter_table_batches, read_dataset, read_table, table_files, write_table
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+# Vectorized weekly_demand: events are aggregated a batch at a time by
+# (week_start, subject_code, area_code) with pandas instead of row by row, and
+# a small state file remembers which event files are already in the rollup so a
+# refresh only reads new files and only changes the weeks they touch.
+
+ROLLUP_STATE = "_rollup.json"
+KEYS = TABLE_COLUMNS["weekly_demand"][:3]
+METRICS = TABLE_COLUMNS["weekly_demand"][3:]
+EVENT_FIELDS = ["class_id", "ts", "event_type"]
+
+
+def week_start(ts: pd.Series) -> np.ndarray:
+    # Monday of each timestamp as days since the epoch (1970-01-01 was a Thursday)
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        days = pd.to_datetime(ts, utc=True).dt.tz_localize(None).to_numpy().astype("datetime64[D]")
+    else:
+        # ISO strings: the date is the first 10 characters
+        days = ts.astype(str).str.slice(0, 10).to_numpy().astype("datetime64[D]")
+    days = days.astype(np.int64)
+    return days - (days + 3) % 7
+
+
+def empty_rollup() -> pd.DataFrame:
+    return pd.DataFrame({c: pd.Series(dtype=str if c in KEYS else np.int64) for c in KEYS + METRICS})
+
+
+def merge_rollups(*frames) -> pd.DataFrame:
+    # Sums rollups on the key; keys keep their first-seen order
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return empty_rollup()
+    df = pd.concat(frames, ignore_index=True)
+    df["week_start"] = df["week_start"].astype(str)
+    return df.groupby(KEYS, sort=False, as_index=False)[METRICS].sum()
+
+
+class WeeklyDemand:
+    # Running aggregate fed one event batch (list of dicts or DataFrame) at a time
+
+    def __init__(self, classes):
+        classes = classes if isinstance(classes, pd.DataFrame) else pd.DataFrame(list(classes))
+        self.class_index = pd.Index(classes["class_id"].astype(str)) if len(classes) else pd.Index([])
+        self.subject = classes["subject_code"].to_numpy(dtype=object) if len(classes) else np.empty(0, dtype=object)
+        self.area = classes["area_code"].to_numpy(dtype=object) if len(classes) else np.empty(0, dtype=object)
+        self.parts = []
+        self.rollup = empty_rollup()
+
+    def aggregate(self, events) -> pd.DataFrame:
+        events = events if isinstance(events, pd.DataFrame) else pd.DataFrame(list(events), columns=EVENT_FIELDS)
+        if events.empty:
+            return empty_rollup()
+        et = events["event_type"].to_numpy(dtype=object)
+        views = (et == "view_class") | (et == "impression")
+        clicks = et == "click"
+        enrols = et == "enrol"
+        idx = self.class_index.get_indexer(events["class_id"].astype(str))
+        # Only counted events for known classes create a key, as in the original
+        # row loop (its defaultdict entry appeared on the first += 1), so there
+        # are never all-zero rows
+        keep = (idx >= 0) & (views | clicks | enrols)
+        idx = idx[keep]
+        df = pd.DataFrame({
+            "week_start": week_start(events["ts"][keep]),
+            "subject_code": self.subject[idx],
+            "area_code": self.area[idx],
+            "views": views[keep].astype(np.int64),
+            "clicks": clicks[keep].astype(np.int64),
+            "enrols": enrols[keep].astype(np.int64),
+        })
+        df = df.groupby(KEYS, sort=False, as_index=False)[METRICS].sum()
+        df["week_start"] = np.datetime_as_string(df["week_start"].to_numpy().astype("datetime64[D]"))
+        return df
+
+    def add(self, events):
+        self.parts.append(self.aggregate(events))
+        # Bound the pending list; rollups are tiny next to the events
+        if len(self.parts) >= 16:
+            self.rollup = merge_rollups(self.rollup, *self.parts)
+            self.parts = []
+
+    def frame(self) -> pd.DataFrame:
+        if self.parts:
+            self.rollup = merge_rollups(self.rollup, *self.parts)
+            self.parts = []
+        return self.rollup
+
+    def rows(self):
+        return self.frame().to_dict("records")
+
+
+def generate_weekly_demand(events, classes):
+    demand = WeeklyDemand(classes)
+    demand.add(events)
+    return demand.rows()
+
+
+# -----------------------------
+# Persisted rollup
+# -----------------------------
+
+def file_signature(path: str):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_rollup_state(data_dir: str):
+    path = os.path.join(data_dir, ROLLUP_STATE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_rollup(data_dir: str, fmt: str):
+    # Marks every current event file as included in weekly_demand (after a full write)
+    files = table_files(data_dir, "event_interaction")
+    state = {"format": fmt, "files": {os.path.relpath(f, data_dir): file_signature(f) for f in files}}
+    with open(os.path.join(data_dir, ROLLUP_STATE), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def rollup_format(data_dir: str, state) -> str:
+    if state:
+        return state["format"]
+    for fmt, ext in FORMAT_EXT.items():
+        if os.path.exists(os.path.join(data_dir, f"weekly_demand{ext}")):
+            return fmt
+    first = table_files(data_dir, "event_interaction")[0]
+    return next(f for f, ext in FORMAT_EXT.items() if first.endswith(ext))
+
+
+def refresh_weekly_demand(data_dir: str, full: bool = False, chunk_size: int = CHUNK_SIZE):
+    # Folds event files that are not yet in the rollup into weekly_demand. If a
+    # file already rolled up changed or disappeared, everything is recomputed.
+    state = None if full else load_rollup_state(data_dir)
+    fmt = rollup_format(data_dir, state)
+    path = os.path.join(data_dir, f"weekly_demand{FORMAT_EXT[fmt]}")
+    files = {os.path.relpath(f, data_dir): f for f in table_files(data_dir, "event_interaction")}
+    done = state["files"] if state else {}
+    valid = os.path.exists(path) and all(
+        rel in files and file_signature(files[rel]) == sig for rel, sig in done.items())
+    if not valid:
+        done = {}
+    pending = [rel for rel in files if rel not in done]
+
+    demand = WeeklyDemand(read_dataset(data_dir, "class"))
+    for rel in pending:
+        for batch in iter_table_batches(files[rel], EVENT_FIELDS, chunk_size):
+            demand.add(batch)
+    partial = demand.frame()
+
+    base = read_table(path, memory_map=False) if done else empty_rollup()
+    result = merge_rollups(base, partial)
+    summary = write_table(result, path, TABLE_SCHEMAS["weekly_demand"], fmt)
+    record_rollup(data_dir, fmt)
+    return summary, len(pending), partial["week_start"].nunique()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh weekly_demand from event_interaction")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--full", action="store_true", help="Ignore the rollup state and recompute every week")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    started = perf_counter()
+    (rows, size), files, weeks = refresh_weekly_demand(args.data, args.full, args.chunk_size)
+    print(f"weekly_demand: {rows:,} rows ({size / 1e6:.2f} MB); "
+          f"{files} new event file(s), {weeks} week(s) touched in {perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import os
+import json
+import heapq
+import random
+import argparse
+import csv
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from time import gmtime, strftime
+
+import numpy as np
+import pandas as pd
+
+from demand_rollup import WeeklyDemand, record_rollup
+from schemas import TABLE_COLUMNS, TABLE_SCHEMAS
+from table_io import CHUNK_SIZE, FORMAT_EXT, DatasetWriter, chunked, print_summary, read_dataset
+
+
+# Session simulator for event_interaction. Instead of i.i.d. events, each
+# browsing session walks a funnel (search -> impression -> view -> click ->
+# bookmark) over classes drawn from the student's grade, area and
+# subjects_of_interest, with step probabilities driven by that affinity. Every
+# enrollment also gets a short funnel session that ends in its "enrol" event.
+# Events come out in timestamp order, per partition and after the k-way merge.
+
+EVENT_COLUMNS = TABLE_COLUMNS["event_interaction"]
+
+P_ANONYMOUS = 0.10
+P_SEARCH = 0.35
+P_EXPLORE = 0.25        # impression drawn from all classes instead of the student's interests
+P_SAME_AREA = 0.5       # ... and from the student's own area when possible
+P_VIEW_TUTOR = 0.30
+P_BOOKMARK = 0.15
+MEAN_GAP_SECONDS = 30
+MAX_IMPRESSIONS = 6
+NEAR_KM = 5.0
+
+# Relative session starts by hour of day (UTC+5:30 local evenings dominate)
+HOURLY = np.array([
+    1, 1, 1, 2, 3, 4, 5, 5, 4, 4, 4, 5,
+    7, 9, 10, 10, 8, 5, 3, 2, 1, 1, 1, 1,
+], dtype=float)
+
+
+def iso(ts: int) -> str:
+    return strftime("%Y-%m-%dT%H:%M:%SZ", gmtime(ts))
+
+
+def parse_list(value):
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return list(value) if value is not None else []
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(lng2 - lng1)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+
+# -----------------------------
+# World
+# -----------------------------
+
+class World:
+    # Everything a session needs, as flat arrays and bucket lists
+
+    def __init__(self, students: pd.DataFrame, classes: pd.DataFrame, enrollments: pd.DataFrame, areas, subjects):
+        area_codes = [a["area_code"] for a in areas]
+        self.area_codes = area_codes
+        area_idx = {a: i for i, a in enumerate(area_codes)}
+        lat = np.array([a["lat"] for a in areas])
+        lng = np.array([a["lng"] for a in areas])
+        self.near = haversine_km(lat[:, None], lng[:, None], lat[None, :], lng[None, :]) < NEAR_KM
+        self.area_names = [a["area_name"].split(" - ")[-1].lower() for a in areas]
+        self.subject_names = {s["subject_code"]: s["name"].lower() for s in subjects}
+
+        self.student_ids = students["user_id"].astype(str).tolist()
+        self.student_grade = students["grade"].astype(int).tolist()
+        self.student_area = [area_idx.get(a, 0) for a in students["area_code"]]
+        self.student_interests = [parse_list(v) for v in students["subjects_of_interest"]]
+        student_pos = {sid: i for i, sid in enumerate(self.student_ids)}
+
+        published = classes[classes["status"] == "published"]
+        if published.empty:
+            published = classes
+        self.class_ids = published["class_id"].astype(str).tolist()
+        self.class_tutor = published["tutor_id"].astype(str).tolist()
+        self.class_subject = published["subject_code"].astype(str).tolist()
+        self.class_grade = published["grade"].astype(int).tolist()
+        self.class_area = [area_idx.get(a, 0) for a in published["area_code"]]
+
+        # Buckets for interest-driven candidates
+        self.by_subject, self.by_subject_grade, self.by_subject_grade_area = {}, {}, {}
+        for i, (s, g, a) in enumerate(zip(self.class_subject, self.class_grade, self.class_area)):
+            self.by_subject.setdefault(s, []).append(i)
+            self.by_subject_grade.setdefault((s, g), []).append(i)
+            self.by_subject_grade_area.setdefault((s, g, a), []).append(i)
+
+        # Enrollment funnels can end on any class, published or not
+        self.classes = classes[["class_id", "subject_code", "area_code"]]
+        all_pos = {cid: i for i, cid in enumerate(classes["class_id"].astype(str))}
+        self.all_class_ids = classes["class_id"].astype(str).tolist()
+        self.all_class_tutor = classes["tutor_id"].astype(str).tolist()
+        self.enrol_student = np.array([student_pos.get(s, -1) for s in enrollments["student_id"].astype(str)], dtype=np.int64)
+        self.enrol_class = np.array([all_pos.get(c, -1) for c in enrollments["class_id"].astype(str)], dtype=np.int64)
+        ts = pd.to_datetime(enrollments["enrolled_at"], utc=True).dt.tz_localize(None)
+        self.enrol_ts = (ts.to_numpy().astype("datetime64[s]").astype(np.int64)
+                         if len(enrollments) else np.empty(0, dtype=np.int64))
+
+    def affinity(self, s: int, c: int) -> float:
+        if s < 0:
+            return 0.2
+        score = 0.0
+        if self.class_subject[c] in self.student_interests[s]:
+            score += 0.45
+        if self.class_grade[c] == self.student_grade[s]:
+            score += 0.25
+        if self.class_area[c] == self.student_area[s]:
+            score += 0.3
+        elif self.near[self.class_area[c], self.student_area[s]]:
+            score += 0.15
+        return score
+
+    def candidate(self, rnd: random.Random, s: int) -> int:
+        interests = self.student_interests[s] if s >= 0 else ()
+        if not interests or rnd.random() < P_EXPLORE:
+            return rnd.randrange(len(self.class_ids))
+        subject = rnd.choice(interests)
+        grade, area = self.student_grade[s], self.student_area[s]
+        bucket = None
+        if rnd.random() < P_SAME_AREA:
+            bucket = self.by_subject_grade_area.get((subject, grade, area))
+        bucket = bucket or self.by_subject_grade.get((subject, grade)) or self.by_subject.get(subject)
+        return rnd.choice(bucket) if bucket else rnd.randrange(len(self.class_ids))
+
+    def query(self, rnd: random.Random, s: int, c: int) -> str:
+        if s < 0 or rnd.random() < 0.15:
+            return "tutor near me"
+        subject = self.subject_names.get(self.class_subject[c], "tuition")
+        if rnd.random() < 0.5:
+            return f"{subject} grade {self.student_grade[s]}"
+        return f"{subject} {self.area_names[self.student_area[s]]}"
+
+
+def world_from_tables(student_profiles, classes, enrollments, areas, subjects) -> World:
+    def frame(rows, table):
+        return rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows), columns=TABLE_COLUMNS[table])
+    return World(frame(student_profiles, "student_profile"), frame(classes, "class"),
+                 frame(enrollments, "enrollment"), areas, subjects)
+
+
+# -----------------------------
+# Sessions
+# -----------------------------
+
+def browse_session(world: World, rnd: random.Random, s: int, t: int):
+    # Yields (ts, student_id, tutor_id, class_id, event_type, query_text)
+    sid = world.student_ids[s] if s >= 0 else ""
+    first = world.candidate(rnd, s)
+    if rnd.random() < P_SEARCH:
+        yield t, sid, world.class_tutor[first], world.class_ids[first], "search", world.query(rnd, s, first)
+    for k in range(rnd.randint(1, MAX_IMPRESSIONS)):
+        c = first if k == 0 else world.candidate(rnd, s)
+        tutor, cid = world.class_tutor[c], world.class_ids[c]
+        t += 1 + int(rnd.expovariate(1 / MEAN_GAP_SECONDS))
+        yield t, sid, tutor, cid, "impression", ""
+        a = world.affinity(s, c)
+        if rnd.random() >= 0.15 + 0.5 * a:
+            continue
+        t += 1 + int(rnd.expovariate(1 / MEAN_GAP_SECONDS))
+        yield t, sid, tutor, cid, "view_class", ""
+        if rnd.random() < P_VIEW_TUTOR:
+            t += 1 + int(rnd.expovariate(1 / MEAN_GAP_SECONDS))
+            yield t, sid, tutor, cid, "view_tutor", ""
+        if rnd.random() >= 0.2 + 0.5 * a:
+            continue
+        t += 1 + int(rnd.expovariate(1 / MEAN_GAP_SECONDS))
+        yield t, sid, tutor, cid, "click", ""
+        if rnd.random() < P_BOOKMARK:
+            t += 1 + int(rnd.expovariate(1 / MEAN_GAP_SECONDS))
+            yield t, sid, tutor, cid, "bookmark", ""
+
+
+def enrol_session(world: World, rnd: random.Random, e: int, start: int, steps: int):
+    # impression -> view_class -> click (-> bookmark) spread over [start, enrolled_at], then enrol
+    s, c, end = int(world.enrol_student[e]), int(world.enrol_class[e]), int(world.enrol_ts[e])
+    sid = world.student_ids[s] if s >= 0 else ""
+    tutor, cid = world.all_class_tutor[c], world.all_class_ids[c]
+    offsets = sorted(rnd.randint(start, end) for _ in range(steps))
+    for ts, et in zip(offsets, ("impression", "view_class", "click", "bookmark")):
+        yield ts, sid, tutor, cid, et, ""
+    yield end, sid, tutor, cid, "enrol", ""
+
+
+def mean_session_events(world: World, seed: int, pilot: int = 2000) -> float:
+    rnd = random.Random(seed)
+    n = sum(
+        sum(1 for _ in browse_session(world, rnd, rnd.randrange(len(world.student_ids)) if world.student_ids else -1, 0))
+        for _ in range(pilot)
+    )
+    return max(1.0, n / pilot)
+
+
+def plan_sessions(world: World, target: int, seed: int, as_of: datetime, days: int, part: int, parts: int):
+    # Session starts for this partition, sorted. kind 0 = browse (ref = student or -1), 1 = enrol (ref = enrollment)
+    rng = np.random.default_rng([seed, part])
+    n_students = len(world.student_ids)
+    mine = np.arange(part, n_students, parts)
+
+    n_browse = int(round(target / mean_session_events(world, seed) * (len(mine) / max(1, n_students))))
+    # Lognormal activity gives a long tail of very active students
+    activity = rng.lognormal(0.0, 1.0, size=len(mine))
+    refs = mine[rng.choice(len(mine), size=n_browse, p=activity / activity.sum())] if len(mine) else np.full(n_browse, -1)
+    refs = np.where(rng.random(n_browse) < P_ANONYMOUS, -1, refs)
+    end = int((as_of - datetime(1970, 1, 1)).total_seconds())
+    day = rng.integers(0, days, size=n_browse)
+    hour = rng.choice(24, size=n_browse, p=HOURLY / HOURLY.sum())
+    starts = end - days * 86400 + day * 86400 + hour * 3600 + rng.integers(0, 3600, size=n_browse)
+
+    enrol = np.flatnonzero((world.enrol_student % parts == part) & (world.enrol_class >= 0))
+    steps = rng.integers(3, 5, size=len(enrol))
+    enrol_start = world.enrol_ts[enrol] - rng.gamma(steps, 3 * MEAN_GAP_SECONDS).astype(np.int64) - steps
+
+    starts = np.concatenate([starts, enrol_start])
+    kinds = np.concatenate([np.zeros(n_browse, dtype=np.int8), np.ones(len(enrol), dtype=np.int8)])
+    refs = np.concatenate([refs, enrol])
+    extra = np.concatenate([np.zeros(n_browse, dtype=np.int64), steps])
+    order = np.argsort(starts, kind="stable")
+    return starts[order], kinds[order], refs[order], extra[order]
+
+
+def iter_events(world: World, target: int, seed: int, as_of: datetime, days: int = 120, part: int = 0, parts: int = 1):
+    # Yields event_interaction rows for one partition in timestamp order. Sessions
+    # are started in order and buffered in a heap until no later session can precede them.
+    starts, kinds, refs, extra = plan_sessions(world, target, seed, as_of, days, part, parts)
+    rnd = random.Random(int(np.random.SeedSequence([seed, part, 1]).generate_state(1)[0]))
+    pending = []
+    seq = 0
+
+    def row(ev):
+        ts, sid, tutor, cid, et, q = ev
+        return {
+            "event_id": str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+            "student_id": sid,
+            "tutor_id": tutor,
+            "class_id": cid,
+            "event_type": et,
+            "query_text": q,
+            "ts": iso(ts),
+        }
+
+    for start, kind, ref, steps in zip(starts.tolist(), kinds.tolist(), refs.tolist(), extra.tolist()):
+        while pending and pending[0][0] <= start:
+            yield row(heapq.heappop(pending)[2])
+        session = enrol_session(world, rnd, ref, start, steps) if kind else browse_session(world, rnd, ref, start)
+        for ev in session:
+            heapq.heappush(pending, (ev[0], seq, ev))
+            seq += 1
+    while pending:
+        yield row(heapq.heappop(pending)[2])
+
+
+# -----------------------------
+# Parallel runs
+# -----------------------------
+
+def simulate_partition(world: World, target: int, seed: int, as_of: datetime, days: int,
+                       part: int, parts: int, path: str, chunk_size: int = CHUNK_SIZE):
+    writer = DatasetWriter({"event_interaction": TABLE_SCHEMAS["event_interaction"]}, lambda _: path)
+    writer.write_all(chunked("event_interaction", iter_events(world, target, seed, as_of, days, part, parts), chunk_size))
+    return writer.close()["event_interaction"]
+
+
+def merge_sorted_parts(paths, chunk_size: int = CHUNK_SIZE):
+    # k-way merge of time-sorted CSV parts; ISO timestamps sort lexicographically
+    files = [open(p, newline="", encoding="utf-8") for p in paths]
+    try:
+        readers = [csv.reader(f) for f in files]
+        for r in readers:
+            next(r)
+        ts_col = EVENT_COLUMNS.index("ts")
+        yield from chunked("event_interaction", heapq.merge(*readers, key=lambda r: r[ts_col]), chunk_size)
+    finally:
+        for f in files:
+            f.close()
+
+
+def simulate(world: World, target: int, seed: int, as_of: datetime, out_dir: str, workers: int,
+             days: int = 120, fmt: str = "csv", keep_parts: bool = False, chunk_size: int = CHUNK_SIZE):
+    part_dir = os.path.join(out_dir, "event_interaction")
+    paths = [os.path.join(part_dir, f"part-{p:05d}.csv") for p in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(simulate_partition, world, target, seed, as_of, days, p, workers, paths[p], chunk_size)
+            for p in range(workers)
+        ]
+        for f in futures:
+            f.result()
+
+    # Parts are always CSV; the merged table is written in the requested format
+    demand = WeeklyDemand(world.classes)
+    path = os.path.join(out_dir, f"event_interaction{FORMAT_EXT[fmt]}")
+    writer = DatasetWriter({"event_interaction": TABLE_SCHEMAS["event_interaction"]}, lambda _: path, fmt)
+    for table, batch in merge_sorted_parts(paths, chunk_size):
+        demand.add(pd.DataFrame(batch, columns=EVENT_COLUMNS))
+        writer.write(table, batch)
+    summary = writer.close()
+    if not keep_parts:
+        for p in paths:
+            os.remove(p)
+        os.rmdir(part_dir)
+    weekly = os.path.join(out_dir, f"weekly_demand{FORMAT_EXT[fmt]}")
+    dw = DatasetWriter({"weekly_demand": TABLE_SCHEMAS["weekly_demand"]}, lambda _: weekly, fmt)
+    dw.write("weekly_demand", demand.rows())
+    summary.update(dw.close())
+    record_rollup(out_dir, fmt)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace event_interaction with simulated funnel sessions")
+    parser.add_argument("--data", default="data", help="Directory with student_profile, class, enrollment, area, subject")
+    parser.add_argument("--target", type=int, default=20000, help="Approximate number of browsing events")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", type=datetime.fromisoformat, default=None,
+                        help="End of the simulated window (default: today, UTC)")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXT), default="csv")
+    parser.add_argument("--keep-parts", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    def load(table):
+        return read_dataset(args.data, table)
+
+    world = World(
+        load("student_profile"), load("class"), load("enrollment"),
+        load("area").to_dict("records"), load("subject").to_dict("records"),
+    )
+    as_of = args.as_of or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    summary = simulate(world, args.target, args.seed, as_of, args.data, args.workers,
+                       args.days, args.format, args.keep_parts, args.chunk_size)
+    print_summary(summary, workers=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import os
+import json
+import random
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from time import perf_counter, sleep
+
+import numpy as np
+import pandas as pd
+
+from schemas import TABLE_SCHEMAS
+from table_io import iter_table_batches, table_files
+
+
+# Loads a generated dataset into the Firestore emulator with the document
+# layout the Cloud Functions read (backend/functions/src): camelCase fields on
+# classes/enrollments/billing, snake_case profiles, sessions under
+# classes/{id}/sessions, and messages/notifications under users/{uid}/...
+# Documents go out in batched writes (<= 500 per commit) from a thread pool;
+# at most 2 x workers batches are in flight, so reading the tables waits for the
+# writers (backpressure). Failed commits are retried with exponential backoff.
+#
+#   firebase emulators:start --only firestore     (from backend/)
+#   python scripts\firestore_load.py --data data
+
+DEFAULT_PROJECT = "ai-classmate-dev"
+MAX_BATCH = 500  # Firestore limit per commit
+COLOMBO = timezone(timedelta(hours=5, minutes=30))  # class_session times are local
+
+# Analytics-only tables (BigQuery); load them with --tables if needed
+SKIP_BY_DEFAULT = ("event_interaction", "weekly_demand")
+
+CAMEL = {}
+
+
+def camel(name: str) -> str:
+    if name not in CAMEL:
+        head, *rest = name.split("_")
+        CAMEL[name] = head + "".join(p.title() for p in rest)
+    return CAMEL[name]
+
+
+def typed(value, logical: str):
+    # CSV-shaped strings (or typed Parquet values) -> Firestore values; "" is null
+    if isinstance(value, (list, np.ndarray)):
+        return [str(v) for v in value]
+    if value is None or value is pd.NaT or value == "" or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if logical == "INT64":
+        return int(float(value))
+    if logical in ("FLOAT64", "NUMERIC"):
+        return float(value)
+    if logical == "BOOL":
+        return value if isinstance(value, (bool, np.bool_)) else str(value).lower() == "true"
+    if logical == "ARRAY<STRING>":
+        return json.loads(value)
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    if isinstance(value, np.generic):
+        return value.item()
+    return value if isinstance(value, str) else str(value)
+
+
+def fields(row, schema, case: str = "snake"):
+    name = camel if case == "camel" else (lambda c: c)
+    return {name(c): typed(row[c], logical) for c, logical in schema}
+
+
+def session_time(day, clock) -> datetime:
+    return datetime.fromisoformat(f"{day}T{clock}").replace(tzinfo=COLOMBO)
+
+
+# -----------------------------
+# Layout: table row -> [(document path, data)]
+# -----------------------------
+
+def user_docs(row, schema):
+    return [(f"users/{row['user_id']}", fields(row, schema))]
+
+
+def session_docs(row, schema):
+    data = fields(row, schema)
+    # Functions query and compare start_time/end_time as timestamps
+    data["start_time"] = session_time(row["session_date"], row["start_time"])
+    data["end_time"] = session_time(row["session_date"], row["end_time"])
+    return [(f"classes/{row['class_id']}/sessions/{row['session_id']}", data)]
+
+
+def message_docs(row, schema):
+    # messaging.ts keeps a copy per participant under users/{uid}/messages
+    sender, recipient = row["sender_id"], row["recipient_id"]
+    base = {
+        "messageId": row["message_id"],
+        "from": sender,
+        "to": recipient,
+        "text": typed(row["text"], "STRING"),
+        "sentAt": typed(row["sent_at"], "TIMESTAMP"),
+        "classId": typed(row["class_id"], "STRING"),
+        "isDeleted": typed(row["is_deleted"], "BOOL"),
+    }
+    docs = [(f"users/{recipient}/messages/{row['message_id']}", dict(base, peerId=sender, read=False))]
+    if sender != recipient:
+        docs.append((f"users/{sender}/messages/{row['message_id']}", dict(base, peerId=recipient, read=True)))
+    return docs
+
+
+def notification_docs(row, schema):
+    data = fields(row, schema, "camel")
+    data["read"] = data.pop("isRead")
+    return [(f"users/{row['recipient_id']}/notifications/{row['notification_id']}", data)]
+
+
+def keyed(collection: str, key: str, case: str = "camel"):
+    def docs(row, schema):
+        return [(f"{collection}/{row[key]}", fields(row, schema, case))]
+    return docs
+
+
+def nested(parent: str, parent_key: str, collection: str, key: str, case: str = "camel"):
+    def docs(row, schema):
+        return [(f"{parent}/{row[parent_key]}/{collection}/{row[key]}", fields(row, schema, case))]
+    return docs
+
+
+LAYOUT = {
+    "user": user_docs,
+    "student_profile": keyed("student_profiles", "user_id", "snake"),
+    "tutor_profile": keyed("tutor_profiles", "user_id", "snake"),
+    "admin_profile": keyed("admin_profiles", "user_id", "snake"),
+    "subject": keyed("subjects", "subject_code", "snake"),
+    "area": keyed("areas", "area_code", "snake"),
+    "venue": keyed("venues", "venue_id", "snake"),
+    "class": keyed("classes", "class_id"),
+    "class_session": session_docs,
+    "enrollment": keyed("enrollments", "enrollment_id"),
+    "invoice": keyed("invoices", "invoice_id"),
+    "payment": keyed("payments", "payment_id"),
+    "refund": keyed("refunds", "refund_id"),
+    "material": nested("classes", "class_id", "materials", "material_id"),
+    "announcement": keyed("announcements", "announcement_id"),
+    "message": message_docs,
+    "notification": notification_docs,
+    "rating": keyed("ratings", "rating_id"),
+    "event_interaction": keyed("events", "event_id"),
+    "weekly_demand": lambda row, schema: [(
+        f"weekly_demand/{row['week_start']}_{row['subject_code']}_{row['area_code']}", fields(row, schema))],
+}
+
+
+def iter_docs(data_dir: str, tables, chunk_size: int = 10_000):
+    # (table, path, data), table by table in dependency order
+    for table in tables:
+        schema, layout = TABLE_SCHEMAS[table], LAYOUT[table]
+        for path in table_files(data_dir, table):
+            for batch in iter_table_batches(path, chunk_size=chunk_size):
+                for row in batch.to_dict("records"):
+                    for doc_path, data in layout(row, schema):
+                        yield table, doc_path, data
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+
+class FirestoreSink:
+    def __init__(self, project: str, emulator_host: str):
+        if not emulator_host:
+            raise SystemExit("Set FIRESTORE_EMULATOR_HOST or --emulator-host; this loader never writes to a real project")
+        os.environ["FIRESTORE_EMULATOR_HOST"] = emulator_host
+        try:
+            from google.cloud import firestore
+        except ImportError:
+            raise SystemExit("Loading into the emulator needs google-cloud-firestore: pip install google-cloud-firestore")
+        self.client = firestore.Client(project=project)
+
+    def commit(self, writes):
+        batch = self.client.batch()
+        for path, data in writes:
+            batch.set(self.client.document(path), data)
+        batch.commit()
+
+
+class DryRunSink:
+    # Serializes each batch like a commit would and sleeps for a simulated round trip
+    def __init__(self, latency_ms: float = 20.0, fail_rate: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+
+    def commit(self, writes):
+        json.dumps([(p, d) for p, d in writes], default=str)
+        sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.fail_rate:
+            raise RuntimeError("simulated ABORTED")
+
+
+def commit_with_retry(sink, writes, retries: int):
+    # (seconds, attempts); backoff 0.1s, 0.2s, 0.4s, ... with jitter
+    started = perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            sink.commit(writes)
+            return perf_counter() - started, attempt + 1
+        except Exception:
+            if attempt == retries:
+                raise
+            sleep(0.1 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def load(sink, data_dir: str, tables, workers: int = 8, batch_size: int = MAX_BATCH, retries: int = 5):
+    batch_size = min(batch_size, MAX_BATCH)
+    started = perf_counter()
+    docs, latencies, attempts = Counter(), [], 0
+    in_flight = deque()
+
+    def collect(item):
+        nonlocal attempts
+        future, table, n = item
+        secs, tries = future.result()
+        latencies.append(secs)
+        attempts += tries - 1
+        docs[table] += n
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        writes, current = [], None
+        for table, path, data in iter_docs(data_dir, tables):
+            # Batches never mix tables, so per-table counts stay exact
+            if writes and (len(writes) >= batch_size or table != current):
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft())
+                in_flight.append((pool.submit(commit_with_retry, sink, writes, retries), current, len(writes)))
+                writes = []
+            current = table
+            writes.append((path, data))
+        if writes:
+            in_flight.append((pool.submit(commit_with_retry, sink, writes, retries), current, len(writes)))
+        while in_flight:
+            collect(in_flight.popleft())
+
+    elapsed = perf_counter() - started
+    total = sum(docs.values())
+    width = max([len(t) for t in docs] + [5])
+    print(f"{'table':<{width}}  {'docs':>10}")
+    for table, n in docs.items():
+        print(f"{table:<{width}}  {n:>10,}")
+    lat = np.array(latencies or [0.0]) * 1000
+    print(f"{total:,} docs in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} docs/s) on {workers} workers; "
+          f"{len(latencies):,} commits, p50 {np.percentile(lat, 50):.0f} ms, p99 {np.percentile(lat, 99):.0f} ms, "
+          f"{attempts} retries")
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load generated tables into the Firestore emulator")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--tables", nargs="+", choices=sorted(LAYOUT), default=None,
+                        help=f"Default: every table except {', '.join(SKIP_BY_DEFAULT)}")
+    parser.add_argument("--project", default=os.environ.get("GCLOUD_PROJECT", DEFAULT_PROJECT))
+    parser.add_argument("--emulator-host", default=os.environ.get("FIRESTORE_EMULATOR_HOST", "127.0.0.1:8080"))
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--dry-run", action="store_true", help="Build every batch but only simulate the commit")
+    parser.add_argument("--dry-run-latency-ms", type=float, default=20.0)
+    parser.add_argument("--dry-run-fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    tables = args.tables or [t for t in TABLE_SCHEMAS if t not in SKIP_BY_DEFAULT]
+    sink = DryRunSink(args.dry_run_latency_ms, args.dry_run_fail_rate) if args.dry_run else FirestoreSink(args.project, args.emulator_host)
+    load(sink, args.data, tables, args.workers, args.batch_size, args.retries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+
+# Compact entity ids for the numpy backend (data_gen_np.py). While tables are
+# generated, users, classes, enrollments, billing rows and events are dense
+# int64 keys (row positions in their id space), so foreign keys cost 8 bytes
+# and joins are array indexing. Each key's UUID is kept as its 16 random bytes,
+# drawn exactly like a text UUID would have been (same output for a seed), and
+# rendered to text one chunk at a time when the table is written. -1 is NULL.
+
+HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+UUID_DASHES = (8, 13, 18, 23)
+UUID_HEX_POS = np.array([i for i in range(36) if i not in UUID_DASHES])
+
+# Column -> id space its keys live in
+COLUMN_SPACE = {
+    "user_id": "user",
+    "student_id": "user",
+    "tutor_id": "user",
+    "sender_id": "user",
+    "recipient_id": "user",
+    "reviewed_by": "user",
+    "verified_by": "user",
+    "processed_by": "user",
+    "uploaded_by": "user",
+    "created_by": "user",
+    "class_id": "class",
+    "enrollment_id": "enrollment",
+    "invoice_id": "invoice",
+    "payment_id": "payment",
+    "refund_id": "refund",
+    "event_id": "event",
+}
+
+# Templated columns: (space, prefix, suffix) around the rendered UUID
+TEMPLATES = {
+    "proof_url": ("invoice", "https://storage.googleapis.com/proofs/", ".jpg"),
+}
+
+
+def random_uuid_bytes(rng: np.random.Generator, n: int) -> np.ndarray:
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    return raw
+
+
+def format_uuids(raw: np.ndarray) -> np.ndarray:
+    n = len(raw)
+    out = np.full((n, 36), ord("-"), dtype=np.uint8)
+    digits = np.empty((n, 32), dtype=np.uint8)
+    digits[:, 0::2] = HEX[raw >> 4]
+    digits[:, 1::2] = HEX[raw & 0x0F]
+    out[:, UUID_HEX_POS] = digits
+    return out.view("S36").ravel().astype(str)
+
+
+class IdSpace:
+    def __init__(self):
+        self.raw = {}  # space -> (n, 16) uint8
+
+    def new(self, space: str, rng: np.random.Generator, n: int) -> np.ndarray:
+        # n fresh keys, continuing after the ones already in the space
+        raw = random_uuid_bytes(rng, n)
+        start = len(self.raw[space]) if space in self.raw else 0
+        self.raw[space] = np.concatenate([self.raw[space], raw]) if start else raw
+        return np.arange(start, start + n, dtype=np.int64)
+
+    def render(self, space: str, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.full(len(keys), "", dtype=object)
+        known = keys >= 0
+        if known.any():
+            out[known] = format_uuids(self.raw[space][keys[known]])
+        return out
+
+    def render_frame(self, batch: pd.DataFrame) -> pd.DataFrame:
+        # Key columns to UUID text; columns the row generators filled with
+        # strings (their own new_uuid() ids, "" for NULL) are left as they are
+        rendered = {}
+        for col in batch.columns:
+            space = COLUMN_SPACE.get(col) or TEMPLATES.get(col, (None,))[0]
+            if space not in self.raw:
+                continue
+            values = batch[col].to_numpy()
+            if values.dtype.kind in "iu":
+                keys = values
+            else:
+                is_key = np.fromiter((not isinstance(v, str) for v in values), dtype=bool, count=len(values))
+                if not is_key.any():
+                    continue
+                keys = np.where(is_key, values, -1).astype(np.int64)
+            text = self.render(space, keys)
+            if col in TEMPLATES:
+                _, prefix, suffix = TEMPLATES[col]
+                text[keys >= 0] = prefix + text[keys >= 0].astype(object) + suffix
+            if values.dtype.kind not in "iu":
+                text = np.where(is_key, text, values)
+            rendered[col] = text
+        return batch.assign(**rendered) if rendered else batch
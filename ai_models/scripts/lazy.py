@@ -0,0 +1,29 @@
+import sys
+import importlib.util
+
+
+# Deferred imports for the data_gen.py import chain. numpy, pandas and Faker
+# take most of a second to import; a lazy module only loads on its first
+# attribute access, so --help or a run that fails argument checks returns at
+# once and each run pays only for what it uses.
+#
+#   np = lazy_import("numpy")     # nothing loaded yet
+#   np.zeros(3)                   # numpy loads here
+#
+# Modules using it need `from __future__ import annotations` so that
+# annotations like `pd.Series` don't load the module when the file is imported.
+
+
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
@@ -0,0 +1,310 @@
+import os
+import json
+import pickle
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from schemas import FEATURE_SCHEMAS
+from table_io import CHUNK_SIZE, FORMAT_EXT, DatasetWriter, iter_table_batches, print_summary
+
+
+# Offline stand-in for the Vertex AI batch prediction job: streams
+# recs_scoring_input in chunks, scores them in a process pool and keeps the
+# top-K classes per student.
+#
+# Models:
+#   *.json  ML.WEIGHTS export of a BQML logistic_reg model (sql/bqml_train.sql), e.g.
+#           bq query --format=prettyjson "SELECT * FROM ML.WEIGHTS(MODEL ai_classmate.bqml_rec_lr)"
+#           `local_predict.py train` writes the same format
+#   *.pkl / *.joblib   anything with predict_proba (sklearn, xgboost.XGBClassifier), fed encode()
+#   *.ubj / *.xgb      xgboost Booster, fed encode()
+
+NUMERIC_FEATURES = [
+    "subject_match", "grade_match", "time_overlap", "price_band_fit",
+    "tutor_popularity", "past_clicks_30d", "past_enrols_90d",
+]
+DISTANCE_BUCKETS = ["same_area", "0_5km", "5_10km", "10_20km", "gt_20km", "unknown"]
+ENCODED_COLUMNS = NUMERIC_FEATURES + [f"distance_bucket_{b}" for b in DISTANCE_BUCKETS]
+LABEL = "label_clicked_or_enrolled"
+
+
+def numeric(series: pd.Series) -> np.ndarray:
+    # Booleans may arrive typed or as "true"/"false" strings (CSV)
+    if series.dtype == object:
+        lowered = series.astype(str).str.lower()
+        if lowered.isin(["true", "false", ""]).all():
+            return (lowered == "true").to_numpy(dtype=np.float64)
+    return pd.to_numeric(series, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+def encode(df: pd.DataFrame) -> np.ndarray:
+    # Fixed column order (ENCODED_COLUMNS) for pickled/XGBoost models
+    x = np.zeros((len(df), len(ENCODED_COLUMNS)))
+    for j, name in enumerate(NUMERIC_FEATURES):
+        x[:, j] = numeric(df[name])
+    bucket = pd.Index(DISTANCE_BUCKETS).get_indexer(df["distance_bucket"].astype(str))
+    hit = bucket >= 0
+    x[np.flatnonzero(hit), len(NUMERIC_FEATURES) + bucket[hit]] = 1.0
+    return x
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -60, 60)))
+
+
+# -----------------------------
+# Models
+# -----------------------------
+
+class LogisticModel:
+    # Weights as returned by ML.WEIGHTS: numeric inputs have "weight", categorical
+    # inputs "category_weights"; the bias is the __INTERCEPT__ row
+
+    def __init__(self, rows):
+        self.intercept = 0.0
+        self.weights = {}
+        self.categories = {}
+        for r in rows:
+            name = r["processed_input"]
+            if name == "__INTERCEPT__":
+                self.intercept = float(r["weight"])
+            elif r.get("category_weights"):
+                self.categories[name] = {c["category"]: float(c["weight"]) for c in r["category_weights"]}
+            else:
+                self.weights[name] = float(r["weight"] or 0.0)
+
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        z = np.full(len(df), self.intercept)
+        for name, w in self.weights.items():
+            z += w * numeric(df[name])
+        for name, table in self.categories.items():
+            z += df[name].astype(str).map(table).fillna(0.0).to_numpy()
+        return sigmoid(z)
+
+    def encoded_weights(self) -> np.ndarray:
+        # Same weights as a vector over ENCODED_COLUMNS
+        buckets = self.categories.get("distance_bucket", {})
+        return np.array([self.weights.get(n, 0.0) for n in NUMERIC_FEATURES]
+                        + [buckets.get(b, 0.0) for b in DISTANCE_BUCKETS])
+
+    def to_rows(self):
+        rows = [{"processed_input": name, "weight": w, "category_weights": []} for name, w in self.weights.items()]
+        rows += [
+            {"processed_input": name, "weight": None,
+             "category_weights": [{"category": c, "weight": w} for c, w in table.items()]}
+            for name, table in self.categories.items()
+        ]
+        rows.append({"processed_input": "__INTERCEPT__", "weight": self.intercept, "category_weights": []})
+        return rows
+
+
+class ProbaModel:
+    def __init__(self, model):
+        self.model = model
+
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        return self.model.predict_proba(encode(df))[:, 1]
+
+
+class BoosterModel:
+    def __init__(self, booster):
+        self.booster = booster
+
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        import xgboost
+
+        return self.booster.predict(xgboost.DMatrix(encode(df), feature_names=ENCODED_COLUMNS))
+
+
+def load_model(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            return LogisticModel(json.load(f))
+    if ext in (".pkl", ".pickle"):
+        with open(path, "rb") as f:
+            return ProbaModel(pickle.load(f))
+    if ext == ".joblib":
+        try:
+            import joblib
+        except ImportError as exc:
+            raise SystemExit("Loading .joblib models needs joblib (pip install joblib)") from exc
+        return ProbaModel(joblib.load(path))
+    if ext in (".ubj", ".xgb"):
+        try:
+            import xgboost
+        except ImportError as exc:
+            raise SystemExit("Loading XGBoost models needs xgboost (pip install xgboost)") from exc
+        booster = xgboost.Booster()
+        booster.load_model(path)
+        return BoosterModel(booster)
+    raise SystemExit(f"Unsupported model file: {path}")
+
+
+# -----------------------------
+# Scoring
+# -----------------------------
+
+def source_files(path: str):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if not f.startswith("."))
+    return [path]
+
+
+def top_k(df: pd.DataFrame, k: int) -> pd.DataFrame:
+    df = df.sort_values(["student_id", "score"], ascending=[True, False], kind="stable")
+    return df.groupby("student_id", sort=False).head(k)
+
+
+_model = None
+
+
+def init_worker(model_path: str):
+    global _model
+    _model = load_model(model_path)
+
+
+def score_chunk(chunk: pd.DataFrame, k: int):
+    # Runs in a worker: returns this chunk's top-K per student and the scoring latency
+    started = perf_counter()
+    out = pd.DataFrame({
+        "student_id": chunk["student_id"].astype(str).to_numpy(),
+        "class_id": chunk["class_id"].astype(str).to_numpy(),
+        "score": _model.score(chunk),
+    })
+    return top_k(out, k), len(chunk), perf_counter() - started
+
+
+def run_local(model_path: str, source: str, destination: str, k: int = 10, workers: int = None,
+              chunk_size: int = CHUNK_SIZE):
+    workers = workers or os.cpu_count() or 1
+    ext = os.path.splitext(destination)[1]
+    fmt = next((f for f, e in FORMAT_EXT.items() if e == ext), None)
+    if fmt is None:
+        raise SystemExit(f"Destination must end in one of {sorted(FORMAT_EXT.values())}")
+
+    started = perf_counter()
+    rows, latencies, tops, pending_rows, merged_rows = 0, [], [], 0, 0
+    in_flight = deque()
+
+    def collect(future):
+        nonlocal rows, pending_rows, merged_rows
+        top, n, secs = future.result()
+        rows += n
+        latencies.append(secs)
+        tops.append(top)
+        pending_rows += len(top)
+        # Fold partial top-Ks once they have doubled; a student may span several chunks
+        if pending_rows >= max(1_000_000, 2 * merged_rows):
+            merged = top_k(pd.concat(tops, ignore_index=True), k)
+            tops[:] = [merged]
+            pending_rows = merged_rows = len(merged)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path,)) as pool:
+        for path in source_files(source):
+            for chunk in iter_table_batches(path, chunk_size=chunk_size):
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft())
+                in_flight.append(pool.submit(score_chunk, chunk, k))
+        while in_flight:
+            collect(in_flight.popleft())
+
+    if not tops:
+        raise SystemExit(f"No rows to score in {source}")
+    best = top_k(pd.concat(tops, ignore_index=True), k)
+    best["rank"] = best.groupby("student_id", sort=False).cumcount() + 1
+    writer = DatasetWriter({"recs_predictions": FEATURE_SCHEMAS["recs_predictions"]}, lambda _: destination, fmt)
+    writer.write("recs_predictions", best)
+    summary = writer.close()
+
+    elapsed = perf_counter() - started
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    print_summary(summary, workers=True)
+    print(f"Scored {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s) on {workers} workers; "
+          f"chunk latency p50 {np.percentile(lat, 50):.1f} ms, p99 {np.percentile(lat, 99):.1f} ms "
+          f"({len(latencies)} chunks of <= {chunk_size:,})")
+    return summary
+
+
+# -----------------------------
+# Training (simple logistic model)
+# -----------------------------
+
+def train_logistic(x: np.ndarray, y: np.ndarray, epochs: int = 300, lr: float = 0.5, l2: float = 1e-4) -> LogisticModel:
+    # Full-batch gradient descent on standardized inputs with balanced class
+    # weights (auto_class_weights); weights are returned on the raw scale
+    mean, std = x.mean(axis=0), x.std(axis=0)
+    std[std == 0] = 1.0
+    z = (x - mean) / std
+    pos = y.mean() if len(y) else 0.5
+    sample_w = np.where(y > 0, 0.5 / max(pos, 1e-9), 0.5 / max(1 - pos, 1e-9))
+    w, b = np.zeros(x.shape[1]), 0.0
+    for _ in range(epochs):
+        p = sigmoid(z @ w + b)
+        g = sample_w * (p - y)
+        w -= lr * (z.T @ g / len(y) + l2 * w)
+        b -= lr * g.mean()
+    raw = w / std
+    intercept = b - float((mean / std) @ w)
+
+    model = LogisticModel([])
+    model.intercept = intercept
+    n = len(NUMERIC_FEATURES)
+    model.weights = dict(zip(NUMERIC_FEATURES, raw[:n].tolist()))
+    model.categories = {"distance_bucket": dict(zip(DISTANCE_BUCKETS, raw[n:].tolist()))}
+    return model
+
+
+def training_sample(source: str, negative_rate: float, seed: int = 0, chunk_size: int = CHUNK_SIZE):
+    # All positives plus a fraction of negatives
+    rng = np.random.default_rng(seed)
+    xs, ys = [], []
+    for path in source_files(source):
+        for chunk in iter_table_batches(path, chunk_size=chunk_size):
+            y = numeric(chunk[LABEL])
+            keep = (y > 0) | (rng.random(len(chunk)) < negative_rate)
+            xs.append(encode(chunk[keep]))
+            ys.append(y[keep])
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local batch scoring for recommendation pairs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="Score recs_scoring_input and write ranked top-K per student")
+    score.add_argument("--model", required=True)
+    score.add_argument("--source", default=os.path.join("data", "recs_scoring_input.parquet"))
+    score.add_argument("--destination", default=os.path.join("data", "recs_predictions.parquet"))
+    score.add_argument("--top-k", type=int, default=10)
+    score.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    score.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    train = sub.add_parser("train", help="Fit a logistic model on recs_training_pairs (ML.WEIGHTS JSON)")
+    train.add_argument("--source", default=os.path.join("data", "recs_training_pairs.parquet"))
+    train.add_argument("--out", default=os.path.join("models", "recs_logistic.json"))
+    train.add_argument("--negative-rate", type=float, default=0.05, help="Share of negative pairs sampled")
+    train.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.command == "score":
+        run_local(args.model, args.source, args.destination, args.top_k, args.workers, args.chunk_size)
+        return
+
+    x, y = training_sample(args.source, args.negative_rate)
+    model = train_logistic(x, y, args.epochs)
+    p = sigmoid(x @ model.encoded_weights() + model.intercept)
+    accuracy = ((p >= 0.5) == (y > 0)).mean()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(model.to_rows(), f, indent=2)
+    print(f"Trained on {len(y):,} rows ({int(y.sum()):,} positive); sample accuracy {accuracy:.3f} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import os
+import gzip
+import json
+import hashlib
+import argparse
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from time import monotonic, perf_counter, time
+
+import numpy as np
+import pandas as pd
+
+from rec_features import as_bool, subject_list
+from schemas import FEATURE_COLUMNS
+from table_io import iter_table_batches, read_dataset, read_table
+
+
+# Serving cache for recommendations: batch-prediction output (recs_predictions)
+# is materialised into one compact per-student top-K document, and TopKCache
+# keeps hot students in an LRU with a TTL in front of it, so they get
+# recommendations without a model call.
+#
+# Materialised format (JSON, gzipped when the name ends in .gz), loadable as is
+# by the functions:
+#   {"version": "20261018T120000Z-1a2b3c4d", "generated_at": ..., "expires_at": ..., "k": 10,
+#    "students": {"<student_id>": {"profile": "<profile hash>",
+#                                  "items": [["<class_id>", score, "<features hash>"], ...]}}}
+# profile = first 16 hex of sha1('[grade, "area_code", ["SUBJ", ...]]'), subjects sorted;
+# an entry whose profile differs from the student's current one is stale.
+
+CACHE_FILE = "recs_topk.json.gz"
+
+
+def profile_hash(grade, area_code, subjects) -> str:
+    grade = None if grade is None or pd.isna(grade) or grade == "" else int(float(grade))
+    area_code = None if area_code is None or pd.isna(area_code) or area_code == "" else str(area_code)
+    key = json.dumps([grade, area_code, sorted(subject_list(subjects))], separators=(",", ":"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def features_hash(df: pd.DataFrame) -> np.ndarray:
+    # Hash of the normalised feature values, so CSV and Parquet inputs agree
+    norm = {}
+    for col, logical in FEATURE_COLUMNS:
+        if logical == "BOOL":
+            norm[col] = as_bool(df[col]).astype(np.int8)
+        elif logical == "FLOAT64":
+            norm[col] = pd.to_numeric(df[col], errors="coerce").round(6).to_numpy()
+        elif logical == "INT64":
+            norm[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+        else:
+            norm[col] = df[col].astype(str).to_numpy()
+    hashed = pd.util.hash_pandas_object(pd.DataFrame(norm), index=False).to_numpy()
+    return np.char.mod("%016x", hashed)
+
+
+# -----------------------------
+# Materialiser
+# -----------------------------
+
+def read_json(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(doc, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    opener = gzip.open if path.endswith(".gz") else open
+    tmp = path + ".tmp"
+    with opener(tmp, "wt", encoding="utf-8") as f:
+        json.dump(doc, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def attach_features_hash(top: pd.DataFrame, scoring_input: str, chunk_size: int = 500_000) -> pd.DataFrame:
+    # One pass over the scoring input, keeping only the rows that made the top-K
+    keys = top[["student_id", "class_id"]]
+    parts = []
+    for batch in iter_table_batches(scoring_input, chunk_size=chunk_size):
+        batch["student_id"] = batch["student_id"].astype(str)
+        batch["class_id"] = batch["class_id"].astype(str)
+        hit = batch.merge(keys, on=["student_id", "class_id"])
+        if len(hit):
+            parts.append(pd.DataFrame({
+                "student_id": hit["student_id"].to_numpy(),
+                "class_id": hit["class_id"].to_numpy(),
+                "features_hash": features_hash(hit),
+            }))
+    found = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["student_id", "class_id", "features_hash"])
+    return top.merge(found, on=["student_id", "class_id"], how="left")
+
+
+def materialize(predictions: str, data_dir: str, out: str, k: int = 10, scoring_input: str = None,
+                ttl_hours: float = 24.0, now: datetime = None):
+    top = read_table(predictions, memory_map=False)
+    top["student_id"] = top["student_id"].astype(str)
+    top["class_id"] = top["class_id"].astype(str)
+    top["score"] = pd.to_numeric(top["score"])
+
+    # Classes that stopped being published since scoring never make it in; dropped
+    # before the cut so the next-best classes fill each student's k slots
+    classes = read_dataset(data_dir, "class")
+    published = set(classes.loc[classes["status"].astype(str) == "published", "class_id"].astype(str))
+    top = top[top["class_id"].isin(published)]
+    top = top.sort_values(["student_id", "score"], ascending=[True, False], kind="stable")
+    top = top.groupby("student_id", sort=False).head(k)
+
+    if scoring_input:
+        top = attach_features_hash(top, scoring_input)
+    else:
+        top["features_hash"] = None
+
+    students = read_dataset(data_dir, "student_profile")
+    profiles = {
+        str(sid): profile_hash(g, a, s)
+        for sid, g, a, s in zip(students["user_id"], students["grade"], students["area_code"],
+                                students["subjects_of_interest"])
+    }
+
+    docs = {}
+    for sid, group in top.groupby("student_id", sort=False):
+        docs[sid] = {
+            "profile": profiles.get(sid),
+            "items": [[c, round(float(sc), 6), h if isinstance(h, str) else None]
+                      for c, sc, h in zip(group["class_id"], group["score"], group["features_hash"])],
+        }
+
+    now = now or datetime.now(timezone.utc)
+    digest = hashlib.sha1(json.dumps(docs, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    doc = {
+        "version": f"{now:%Y%m%dT%H%M%SZ}-{digest}",
+        "generated_at": now.isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "expires_at": (now + timedelta(hours=ttl_hours)).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "k": k,
+        "students": docs,
+    }
+    write_json(doc, out)
+    return doc
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+
+class MaterializedTopK:
+    # Loader over a materialised document; returns None for unknown students and,
+    # once the document's expires_at has passed, for every student
+    def __init__(self, path: str, clock=time):
+        self.path = path
+        self.clock = clock  # wall clock, as expires_at is
+        self.reload()
+
+    def reload(self) -> str:
+        doc = read_json(self.path)
+        self.version = doc["version"]
+        self.students = doc["students"]
+        expires = doc.get("expires_at")
+        self.expires = datetime.fromisoformat(expires.replace("Z", "+00:00")).timestamp() if expires else None
+        return self.version
+
+    def remaining(self):
+        # Seconds until the document expires (None: never)
+        return None if self.expires is None else self.expires - self.clock()
+
+    def __call__(self, student_id: str):
+        if self.expires is not None and self.clock() >= self.expires:
+            return None
+        return self.students.get(student_id)
+
+
+class TopKCache:
+    # LRU of per-student entries with a TTL, in front of a loader
+    # (student_id -> {"profile", "items"} or None). An entry never outlives the
+    # loader's document (its remaining(), if it has one). Entries carry the
+    # loader version: bumping it (a new materialisation) retires every cached entry.
+    # Classes that leave "published" are filtered out at read time and cached
+    # entries holding them are dropped.
+
+    def __init__(self, loader, capacity: int = 10_000, ttl: float = 3600.0, clock=monotonic):
+        self.loader = loader
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.version = getattr(loader, "version", None)
+        self.entries = OrderedDict()  # student_id -> (expires, version, profile, items)
+        self.by_class = {}  # class_id -> cached student_ids holding it
+        self.blocked = {}  # class_id -> status, for classes no longer published
+        self.stats = Counter()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, student_id: str):
+        entry = self.entries.pop(student_id, None)
+        if entry is not None:
+            for item in entry[3]:
+                holders = self.by_class.get(item[0])
+                if holders is not None:
+                    holders.discard(student_id)
+                    if not holders:
+                        del self.by_class[item[0]]
+
+    def _visible(self, items):
+        if not self.blocked:
+            return items
+        return [item for item in items if item[0] not in self.blocked]
+
+    def put(self, student_id: str, profile, items):
+        self._drop(student_id)
+        ttl = self.ttl
+        remaining = getattr(self.loader, "remaining", None)
+        if remaining is not None and remaining() is not None:
+            ttl = min(ttl, remaining())
+        self.entries[student_id] = (self.clock() + ttl, self.version, profile, items)
+        for item in items:
+            self.by_class.setdefault(item[0], set()).add(student_id)
+        while len(self.entries) > self.capacity:
+            self._drop(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    def get(self, student_id: str, profile: str = None):
+        # Top-K items, or None when the caller has to score the student itself
+        entry = self.entries.get(student_id)
+        if entry is not None:
+            expires, version, cached_profile, items = entry
+            if expires <= self.clock() or version != self.version:
+                self._drop(student_id)
+                self.stats["expired"] += 1
+            elif profile is not None and cached_profile != profile:
+                self._drop(student_id)
+                self.stats["stale"] += 1
+            else:
+                self.entries.move_to_end(student_id)
+                self.stats["hits"] += 1
+                return self._visible(items)
+
+        self.stats["misses"] += 1
+        loaded = self.loader(student_id)
+        if loaded is None:
+            return None
+        if profile is not None and loaded["profile"] != profile:
+            # Materialised before the profile changed
+            self.stats["stale"] += 1
+            return None
+        self.put(student_id, loaded["profile"], loaded["items"])
+        return self._visible(loaded["items"])
+
+    def invalidate_student(self, student_id: str):
+        # Profile changed: forget the cached entry (the next get passes the new profile hash)
+        self._drop(student_id)
+        self.stats["invalidated"] += 1
+
+    def set_class_status(self, class_id: str, status: str):
+        if status == "published":
+            self.blocked.pop(class_id, None)
+            return
+        self.blocked[class_id] = status
+        for student_id in list(self.by_class.get(class_id, ())):
+            self._drop(student_id)
+            self.stats["invalidated"] += 1
+
+    def set_version(self, version: str = None):
+        # New materialisation: a loader with reload() reads it first, so misses
+        # never cache the old document's items under the new version. Old
+        # entries expire lazily on their next get. Blocked classes stay blocked:
+        # the document may predate the status change, so only
+        # set_class_status(..., "published") lifts a block.
+        if hasattr(self.loader, "reload"):
+            loaded = self.loader.reload()
+            if version is not None and version != loaded:
+                raise ValueError(f"Loader has version {loaded}, not {version}")
+            version = loaded
+        self.version = version
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+
+def simulate(path: str, requests: int, capacity: int, ttl: float, zipf: float, seed: int = 0):
+    # Zipf-distributed lookups against the cache; reports hit rate and lookup cost
+    loader = MaterializedTopK(path)
+    cache = TopKCache(loader, capacity, ttl)
+    ids = np.array(list(loader.students))
+    rng = np.random.default_rng(seed)
+    ranks = rng.zipf(zipf, requests)
+    picks = ids[(ranks - 1) % len(ids)]
+    started = perf_counter()
+    served = sum(cache.get(sid) is not None for sid in picks)
+    elapsed = perf_counter() - started
+    stats = cache.stats
+    print(f"{requests:,} lookups over {len(ids):,} students (zipf {zipf}), capacity {capacity:,}: "
+          f"hit rate {stats['hits'] / requests:.1%}, served {served / requests:.1%}, "
+          f"{stats['evicted']:,} evictions, {elapsed / requests * 1e6:.2f} us/lookup")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialise per-student top-K recommendations for serving")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    mat = sub.add_parser("materialize", help="recs_predictions -> compact top-K document")
+    mat.add_argument("--data", default="data")
+    mat.add_argument("--predictions", default=os.path.join("data", "recs_predictions.parquet"))
+    mat.add_argument("--scoring-input", default=None, help="Adds a features hash per item (one pass over the file)")
+    mat.add_argument("--out", default=os.path.join("data", CACHE_FILE))
+    mat.add_argument("--k", type=int, default=10)
+    mat.add_argument("--ttl-hours", type=float, default=24.0)
+
+    sim = sub.add_parser("simulate", help="Replay Zipf-distributed lookups against a TopKCache")
+    sim.add_argument("--cache", default=os.path.join("data", CACHE_FILE))
+    sim.add_argument("--requests", type=int, default=200_000)
+    sim.add_argument("--capacity", type=int, default=2_000)
+    sim.add_argument("--ttl", type=float, default=3600.0)
+    sim.add_argument("--zipf", type=float, default=1.2)
+    args = parser.parse_args()
+
+    if args.command == "materialize":
+        started = perf_counter()
+        doc = materialize(args.predictions, args.data, args.out, args.k, args.scoring_input, args.ttl_hours)
+        items = sum(len(s["items"]) for s in doc["students"].values())
+        print(f"{args.out}: version {doc['version']}, {len(doc['students']):,} students, {items:,} items, "
+              f"{os.path.getsize(args.out) / 1e6:.2f} MB in {perf_counter() - started:.1f}s")
+    else:
+        simulate(args.cache, args.requests, args.capacity, args.ttl, args.zipf)
+
+
+if __name__ == "__main__":
+    main()
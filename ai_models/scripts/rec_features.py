@@ -0,0 +1,412 @@
+import os
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from schemas import FEATURE_SCHEMAS
+from table_io import (
+    CHUNK_SIZE, FORMAT_EXT, DatasetWriter, iter_table_batches, print_summary, read_dataset, table_files,
+)
+
+
+# Local version of sql/rec_features.sql: every (active student, published class)
+# pair with the same features and label, computed from data_gen.py output.
+# Pairwise lookups are precomputed (area x area distance buckets, per-class
+# tutor popularity, sparse per-pair event counts) and the cross product is
+# materialised a block of students at a time.
+
+EVENT_WEIGHTS = {"enrol": 3.0, "click": 1.0, "view_class": 0.2, "impression": 0.1}
+DISTANCE_BUCKETS = np.array(["same_area", "0_5km", "5_10km", "10_20km", "gt_20km", "unknown"], dtype=object)
+SAME_AREA, UNKNOWN = 0, 5
+EARTH_RADIUS_M = 6371008.8  # BigQuery ST_DISTANCE (spherical)
+EVENT_FIELDS = ["student_id", "class_id", "event_type", "ts"]
+
+
+def as_bool(series: pd.Series) -> np.ndarray:
+    if series.dtype == bool:
+        return series.to_numpy()
+    return series.astype(str).str.lower().to_numpy() == "true"
+
+
+def subject_list(value):
+    # JSON string in CSV, list/array in Parquet and Arrow
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return [] if value is None or (isinstance(value, float) and np.isnan(value)) else list(value)
+
+
+def epoch_seconds(ts: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return pd.to_datetime(ts, utc=True).dt.tz_localize(None).to_numpy().astype("datetime64[s]").astype(np.int64)
+    return ts.astype(str).str.slice(0, 19).to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(lng2 - lng1)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def distance_bucket_matrix(areas: pd.DataFrame):
+    # (n + 1) x (n + 1) bucket codes; index n stands for any area_code without coordinates
+    lat = areas["lat"].to_numpy(dtype=float)
+    lng = areas["lng"].to_numpy(dtype=float)
+    meters = haversine_m(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+    codes = np.select([meters < 5000, meters < 10000, meters < 20000], [1, 2, 3], default=4)
+    np.fill_diagonal(codes, SAME_AREA)
+    n = len(areas)
+    matrix = np.full((n + 1, n + 1), UNKNOWN, dtype=np.int8)
+    matrix[:n, :n] = codes
+    return pd.Index(areas["area_code"].astype(str)), matrix
+
+
+def area_positions(area_index: pd.Index, codes: pd.Series) -> np.ndarray:
+    # Unknown area codes map to the extra "unknown" row/column of the bucket matrix
+    pos = area_index.get_indexer(codes.astype(str))
+    return np.where(pos >= 0, pos, len(area_index))
+
+
+def price_band_fit(grade: np.ndarray, band: np.ndarray) -> np.ndarray:
+    # Broadcasts student grades (column) against class price bands (row); NULL grade never fits
+    low, mid, high = band == "low", band == "mid", band == "high"
+    return (
+        ((grade <= 9) & (low | mid))
+        | ((grade >= 10) & (grade <= 11) & mid)
+        | ((grade >= 12) & (mid | high))
+    )
+
+
+# -----------------------------
+# Engine
+# -----------------------------
+
+class FeatureEngine:
+    def __init__(self, users, student_profiles, classes, class_sessions, areas, tutor_profiles, as_of: datetime):
+        self.as_of = int((as_of - datetime(1970, 1, 1)).total_seconds())
+
+        # Students: active users with a profile
+        active = users[(users["role"] == "student") & as_bool(users["is_active"])]
+        students = student_profiles[student_profiles["user_id"].isin(active["user_id"])]
+        self.student_ids = students["user_id"].astype(str).to_numpy(dtype=object)
+        self.student_index = pd.Index(self.student_ids)
+        grade = pd.to_numeric(students["grade"], errors="coerce").to_numpy(dtype=float)
+        self.student_grade = grade
+        self.student_grade_known = ~np.isnan(grade)
+
+        # Published classes, plus all classes for tutor popularity
+        self.all_class_index = pd.Index(classes["class_id"].astype(str))
+        published = classes[classes["status"] == "published"]
+        self.class_ids = published["class_id"].astype(str).to_numpy(dtype=object)
+        self.class_index = pd.Index(self.class_ids)
+        self.class_grade = pd.to_numeric(published["grade"], errors="coerce").to_numpy(dtype=float)
+        # price_band_fit only depends on the grade range, so it is a 4 x classes table
+        band = published["price_band"].astype(str).to_numpy(dtype=object)
+        self.price_fit = price_band_fit(np.array([9, 10, 12, np.nan])[:, None], band[None, :])
+        self.student_price_group = np.select([grade <= 9, grade <= 11, grade >= 12], [0, 1, 2], default=3)
+
+        # Subjects as small integers; interests as a students x subjects matrix
+        subjects = sorted(set(published["subject_code"].astype(str)))
+        subject_pos = {s: i for i, s in enumerate(subjects)}
+        self.class_subject = np.array([subject_pos[s] for s in published["subject_code"].astype(str)], dtype=np.int64)
+        self.interest = np.zeros((len(students), len(subjects)), dtype=bool)
+        for i, value in enumerate(students["subjects_of_interest"]):
+            for s in subject_list(value):
+                if s in subject_pos:
+                    self.interest[i, subject_pos[s]] = True
+
+        # Distance buckets by area index
+        area_index, self.distance = distance_bucket_matrix(areas)
+        self.student_area = area_positions(area_index, students["area_code"])
+        self.class_area = area_positions(area_index, published["area_code"])
+
+        # Weekend (DAYOFWEEK 1 or 7) or evening (>= 16:00) sessions
+        if len(class_sessions):
+            dow = pd.to_datetime(class_sessions["session_date"].astype(str)).dt.dayofweek.to_numpy()
+            start = class_sessions["start_time"].astype(str).to_numpy(dtype=object)
+            flagged = class_sessions["class_id"].astype(str)[(dow >= 5) | (start >= "16:00:00")]
+            self.class_time = self.class_index.isin(flagged)
+        else:
+            self.class_time = np.zeros(len(self.class_ids), dtype=bool)
+
+        # Tutor popularity: 90-day weighted events (added later) + 0.01 per rating
+        tutor_ids = pd.Index(pd.unique(np.concatenate([
+            classes["tutor_id"].astype(str).to_numpy(dtype=object),
+            tutor_profiles["user_id"].astype(str).to_numpy(dtype=object),
+        ])))
+        self.tutor_of_class = tutor_ids.get_indexer(classes["tutor_id"].astype(str))
+        self.tutor_score = np.zeros(len(tutor_ids))
+        rating_count = pd.to_numeric(tutor_profiles["rating_count"], errors="coerce").fillna(0).to_numpy()
+        np.add.at(self.tutor_score, tutor_ids.get_indexer(tutor_profiles["user_id"].astype(str)), rating_count * 0.01)
+        self.published_tutor = tutor_ids.get_indexer(published["tutor_id"].astype(str))
+
+        # Sparse per-pair counts, keyed student * n_classes + class
+        self._pairs = {"clicks30": [], "enrols90": [], "label": []}
+
+    @property
+    def pair_count(self) -> int:
+        return len(self.student_ids) * len(self.class_ids)
+
+    def add_events(self, events: pd.DataFrame):
+        ts = epoch_seconds(events["ts"])
+        et = events["event_type"].to_numpy(dtype=object)
+        recent90 = ts >= self.as_of - 90 * 86400
+        recent30 = ts >= self.as_of - 30 * 86400
+
+        # Popularity joins on any class, published or not
+        cls = self.all_class_index.get_indexer(events["class_id"].astype(str))
+        weight = pd.Series(et).map(EVENT_WEIGHTS).fillna(0.0).to_numpy()
+        ok = (cls >= 0) & recent90
+        np.add.at(self.tutor_score, self.tutor_of_class[cls[ok]], weight[ok])
+
+        s = self.student_index.get_indexer(events["student_id"].astype(str))
+        c = self.class_index.get_indexer(events["class_id"].astype(str))
+        pair = (s >= 0) & (c >= 0)
+        key = s.astype(np.int64) * len(self.class_ids) + c
+        click, enrol = et == "click", et == "enrol"
+        for name, mask in (("clicks30", click & recent30), ("enrols90", enrol & recent90), ("label", click | enrol)):
+            self._pairs[name].append(np.unique(key[pair & mask], return_counts=True))
+
+    def _finish_pairs(self):
+        for name, parts in self._pairs.items():
+            if isinstance(parts, tuple):
+                continue
+            keys = np.concatenate([k for k, _ in parts] or [np.empty(0, dtype=np.int64)])
+            counts = np.concatenate([n for _, n in parts] or [np.empty(0, dtype=np.int64)])
+            uniq, inv = np.unique(keys, return_inverse=True)
+            self._pairs[name] = (uniq, np.bincount(inv, weights=counts, minlength=len(uniq)).astype(np.int64))
+
+    def _lookup(self, name: str, keys: np.ndarray) -> np.ndarray:
+        known, counts = self._pairs[name]
+        # Most blocks only touch a few known pairs; search within their key range
+        i, j = np.searchsorted(known, [keys.min(), keys.max() + 1]) if len(keys) else (0, 0)
+        if i == j:
+            return np.zeros(len(keys), dtype=np.int64)
+        known, counts = known[i:j], counts[i:j]
+        pos = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+        return np.where(known[pos] == keys, counts[pos], 0)
+
+    def frame(self, s: np.ndarray, c: np.ndarray) -> pd.DataFrame:
+        # recs_training_pairs rows for student positions s and published class positions c
+        self._finish_pairs()
+        keys = s.astype(np.int64) * len(self.class_ids) + c
+        grade, class_grade = self.student_grade[s], self.class_grade[c]
+        known = self.student_grade_known[s] & ~np.isnan(class_grade)
+        tutor = self.published_tutor[c]
+        return pd.DataFrame({
+            # Categoricals keep the id columns as codes until the writer needs strings
+            "student_id": pd.Categorical.from_codes(s, self.student_index),
+            "class_id": pd.Categorical.from_codes(c, self.class_index),
+            "label_clicked_or_enrolled": self._lookup("label", keys) > 0,
+            "subject_match": self.interest[s, self.class_subject[c]],
+            "grade_match": pd.arrays.BooleanArray(grade == class_grade, ~known),
+            "time_overlap": self.class_time[c],
+            "distance_bucket": pd.Categorical.from_codes(
+                self.distance[self.student_area[s], self.class_area[c]], DISTANCE_BUCKETS),
+            "price_band_fit": self.price_fit[self.student_price_group[s], c],
+            "tutor_popularity": np.where(tutor >= 0, self.tutor_score[tutor], 0.0),
+            "past_clicks_30d": self._lookup("clicks30", keys),
+            "past_enrols_90d": self._lookup("enrols90", keys),
+        })
+
+    def cross_pairs(self, rows: np.ndarray, chunk_size: int = CHUNK_SIZE):
+        # Full cross product, a block of students at a time
+        n_classes = len(self.class_ids)
+        step = max(1, chunk_size // max(1, n_classes))
+        for start in range(0, len(rows), step):
+            s = rows[start:start + step]
+            yield np.repeat(s, n_classes), np.tile(np.arange(n_classes), len(s))
+
+    def blocks(self, chunk_size: int = CHUNK_SIZE, students=None, candidates=None):
+        # Yields recs_training_pairs DataFrames of about chunk_size rows; with a
+        # CandidateIndex (candidate_index.py) only its candidate pairs are built
+        if len(self.class_ids) == 0:
+            return
+        rows = np.arange(len(self.student_ids)) if students is None else self.student_index.get_indexer(students)
+        rows = rows[rows >= 0]
+        pairs = candidates.pairs(rows, chunk_size) if candidates else self.cross_pairs(rows, chunk_size)
+        for s, c in pairs:
+            yield self.frame(s, c)
+
+    def labelled_pairs(self) -> np.ndarray:
+        # Keys (student * n_classes + class) of every positive pair
+        self._finish_pairs()
+        return self._pairs["label"][0]
+
+
+def utc_datetime(text: str) -> datetime:
+    # --as-of may carry an offset ("2026-10-18T00:00:00Z"); the engine works in naive UTC
+    value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def load_engine(data_dir: str, as_of: datetime, chunk_size: int = CHUNK_SIZE) -> FeatureEngine:
+    engine = FeatureEngine(
+        read_dataset(data_dir, "user"),
+        read_dataset(data_dir, "student_profile"),
+        read_dataset(data_dir, "class"),
+        read_dataset(data_dir, "class_session"),
+        read_dataset(data_dir, "area"),
+        read_dataset(data_dir, "tutor_profile"),
+        as_of,
+    )
+    for path in table_files(data_dir, "event_interaction"):
+        for batch in iter_table_batches(path, EVENT_FIELDS, chunk_size):
+            engine.add_events(batch)
+    return engine
+
+
+# -----------------------------
+# SQL reference (parity check)
+# -----------------------------
+
+def reference_pairs(data_dir: str, as_of: datetime, student_ids) -> pd.DataFrame:
+    # Straight transcription of rec_features.sql with pandas joins, for a few students
+    users = read_dataset(data_dir, "user")
+    sp = read_dataset(data_dir, "student_profile")
+    classes = read_dataset(data_dir, "class")
+    cs = read_dataset(data_dir, "class_session")
+    area = read_dataset(data_dir, "area")
+    tp = read_dataset(data_dir, "tutor_profile")
+    ev = read_dataset(data_dir, "event_interaction")
+    for df, col in ((users, "user_id"), (sp, "user_id"), (classes, "class_id"), (classes, "tutor_id"),
+                    (cs, "class_id"), (tp, "user_id"), (ev, "student_id"), (ev, "class_id")):
+        df[col] = df[col].astype(str)
+    ev["t"] = pd.to_datetime(ev["ts"], utc=True).dt.tz_localize(None)
+    now = pd.Timestamp(as_of)
+
+    pc = classes[classes["status"] == "published"]
+    students = users[(users["role"] == "student") & as_bool(users["is_active"])][["user_id"]].merge(sp, on="user_id")
+    students = students[students["user_id"].isin(student_ids)].rename(columns={"user_id": "student_id"})
+
+    cs_dow = pd.to_datetime(cs["session_date"].astype(str)).dt.dayofweek
+    cs = cs.assign(w=cs_dow >= 5, e=cs["start_time"].astype(str) >= "16:00:00")
+    ct = cs.groupby("class_id").agg(has_weekend=("w", "any"), has_evening=("e", "any")).reset_index()
+
+    recent = ev.loc[ev["t"] >= now - timedelta(days=90), ["class_id", "event_type"]]
+    recent = recent.merge(classes[["class_id", "tutor_id"]], on="class_id")
+    recent = recent.assign(w=recent["event_type"].map(EVENT_WEIGHTS).fillna(0.0))
+    tutor_pop = recent.groupby("tutor_id")["w"].sum().rename("ev_score").reset_index()
+    pop = tutor_pop.merge(tp[["user_id", "rating_count"]].rename(columns={"user_id": "tutor_id"}), on="tutor_id", how="outer")
+    pop["tutor_popularity"] = pop["ev_score"].fillna(0.0) + pop["rating_count"].fillna(0) * 0.01
+
+    def pair_count(df, name):
+        return df.groupby(["student_id", "class_id"]).size().rename(name).reset_index()
+
+    c30 = pair_count(ev[(ev["t"] >= now - timedelta(days=30)) & (ev["event_type"] == "click")], "past_clicks_30d")
+    e90 = pair_count(ev[(ev["t"] >= now - timedelta(days=90)) & (ev["event_type"] == "enrol")], "past_enrols_90d")
+    lab = pair_count(ev[ev["event_type"].isin(["click", "enrol"])], "n")
+
+    geo = area.set_index("area_code")[["lat", "lng"]]
+    df = students.merge(pc, how="cross", suffixes=("_s", ""))
+    df = df.merge(ct, on="class_id", how="left").merge(pop[["tutor_id", "tutor_popularity"]], on="tutor_id", how="left")
+    df = df.merge(c30, on=["student_id", "class_id"], how="left").merge(e90, on=["student_id", "class_id"], how="left")
+    df = df.merge(lab, on=["student_id", "class_id"], how="left")
+
+    def bucket(r):
+        if r["area_code_s"] not in geo.index or r["area_code"] not in geo.index:
+            return "unknown"
+        if r["area_code_s"] == r["area_code"]:
+            return "same_area"
+        a, b = geo.loc[r["area_code_s"]], geo.loc[r["area_code"]]
+        d = haversine_m(a["lat"], a["lng"], b["lat"], b["lng"])
+        return "0_5km" if d < 5000 else "5_10km" if d < 10000 else "10_20km" if d < 20000 else "gt_20km"
+
+    def fit(r):
+        g, band = r["grade_s"], r["price_band"]
+        return bool((g <= 9 and band in ("low", "mid")) or (10 <= g <= 11 and band == "mid")
+                    or (g >= 12 and band in ("mid", "high")))
+
+    return pd.DataFrame({
+        "student_id": df["student_id"],
+        "class_id": df["class_id"],
+        "label_clicked_or_enrolled": df["n"].fillna(0) > 0,
+        "subject_match": [c in subject_list(s) for c, s in zip(df["subject_code"], df["subjects_of_interest"])],
+        "grade_match": df["grade_s"].astype(float) == df["grade"].astype(float),
+        "time_overlap": df["has_weekend"].fillna(False).astype(bool) | df["has_evening"].fillna(False).astype(bool),
+        "distance_bucket": df.apply(bucket, axis=1),
+        "price_band_fit": df.apply(fit, axis=1),
+        "tutor_popularity": df["tutor_popularity"].fillna(0.0),
+        "past_clicks_30d": df["past_clicks_30d"].fillna(0).astype(np.int64),
+        "past_enrols_90d": df["past_enrols_90d"].fillna(0).astype(np.int64),
+    })
+
+
+def check_parity(engine: FeatureEngine, data_dir: str, as_of: datetime, sample: int, seed: int = 0) -> bool:
+    rng = np.random.default_rng(seed)
+    students = rng.choice(engine.student_ids, size=min(sample, len(engine.student_ids)), replace=False)
+    local = pd.concat(list(engine.blocks(students=students)), ignore_index=True)
+    ref = reference_pairs(data_dir, as_of, set(students))
+    key = ["student_id", "class_id"]
+    local[key] = local[key].astype(str)
+    local = local.sort_values(key).reset_index(drop=True)
+    ref = ref.sort_values(key).reset_index(drop=True)
+    ok = len(local) == len(ref)
+    for name, _ in FEATURE_SCHEMAS["recs_training_pairs"]:
+        if not ok:
+            break
+        a, b = local[name], ref[name]
+        if name == "tutor_popularity":
+            same = np.allclose(a.to_numpy(), b.to_numpy())
+        else:
+            same = (a.astype(str).to_numpy() == b.astype(str).to_numpy()).all()
+        if not same:
+            print(f"parity: column {name} differs")
+            ok = False
+    print(f"parity: {len(local):,} pairs for {len(students)} students -> {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Build recs_training_pairs locally (see sql/rec_features.sql)")
+    parser.add_argument("--data", default="data", help="data_gen.py output directory")
+    parser.add_argument("--out", default=None, help="Output directory (default: --data)")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXT), default="parquet")
+    parser.add_argument("--as-of", type=utc_datetime, default=None,
+                        help="Stands in for CURRENT_TIMESTAMP(); an offset is converted to UTC (default: now, UTC)")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="Pairs per block")
+    parser.add_argument("--scoring-input", action="store_true", help="Also write recs_scoring_input (no label)")
+    parser.add_argument("--max-distance", default=None,
+                        choices=["same_area", "0_5km", "5_10km", "10_20km", "gt_20km", "any"],
+                        help="Only build candidate pairs (candidate_index.py): interest subjects, nearby areas")
+    parser.add_argument("--grade-slack", type=int, default=0, help="With --max-distance: allow class grade +/- N")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="Compare N sampled students against a direct transcription of the SQL, then exit")
+    args = parser.parse_args()
+
+    as_of = args.as_of or datetime.utcnow()
+    started = perf_counter()
+    engine = load_engine(args.data, as_of)
+    print(f"Loaded {len(engine.student_ids):,} students x {len(engine.class_ids):,} published classes "
+          f"= {engine.pair_count:,} pairs in {perf_counter() - started:.1f}s")
+    if args.check:
+        raise SystemExit(0 if check_parity(engine, args.data, as_of, args.check) else 1)
+
+    candidates = None
+    if args.max_distance:
+        from candidate_index import CandidateIndex
+        candidates = CandidateIndex(engine, args.max_distance, args.grade_slack)
+
+    out = args.out or args.data
+    tables = {"recs_training_pairs": FEATURE_SCHEMAS["recs_training_pairs"]}
+    if args.scoring_input:
+        tables["recs_scoring_input"] = FEATURE_SCHEMAS["recs_scoring_input"]
+    writer = DatasetWriter(tables, lambda t: os.path.join(out, f"{t}{FORMAT_EXT[args.format]}"), args.format)
+    for block in engine.blocks(args.chunk_size, candidates=candidates):
+        writer.write("recs_training_pairs", block)
+        if args.scoring_input:
+            writer.write("recs_scoring_input", block.drop(columns="label_clicked_or_enrolled"))
+    print_summary(writer.close())
+    print(f"Features built in {perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+from data_gen import REFERENCE_TABLES
+
+
+# Reproducibility check for data_gen.py, run as a script the way it is used
+# (the module is then __main__, which is where seeding bugs have hidden):
+#   - the same seed twice gives identical files
+#   - another seed changes every table except the static lookups
+#   - a sharded run does not depend on --workers
+# Prints one line per check and exits non-zero if any fails.
+#
+#   python scripts\repro_check.py --backend numpy
+
+DATA_GEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_gen.py")
+AS_OF = "2026-10-01"
+
+
+def generate(out: str, *args):
+    subprocess.run([sys.executable, DATA_GEN, "--out", out, "--as-of", AS_OF, *args],
+                   check=True, stdout=subprocess.DEVNULL)
+    digests = {}
+    for name in sorted(os.listdir(out)):
+        path = os.path.join(out, name)
+        if os.path.isfile(path) and not name.startswith("_"):
+            with open(path, "rb") as f:
+                digests[name.split(".")[0]] = hashlib.md5(f.read()).hexdigest()
+    return digests
+
+
+def check(label: str, failed):
+    print(f"{'FAIL' if failed else 'ok':<4}  {label}" + (f": {', '.join(failed)}" if failed else ""))
+    return not failed
+
+
+def run_checks(root: str, backend: str, scale: str, shards: int):
+    common = ["--backend", backend, "--scale", scale]
+    a = generate(os.path.join(root, "a"), "--seed", "1", *common)
+    b = generate(os.path.join(root, "b"), "--seed", "1", *common)
+    c = generate(os.path.join(root, "c"), "--seed", "2", *common)
+    sharded = ["--seed", "1", "--shards", str(shards), *common]
+    w1 = generate(os.path.join(root, "w1"), *sharded, "--workers", "1")
+    wn = generate(os.path.join(root, "wn"), *sharded, "--workers", str(shards))
+    ok = check(f"{backend}: same seed, same files", [t for t in a if a[t] != b[t]])
+    ok &= check(f"{backend}: --seed 1 vs 2 differ", [t for t in a if t not in REFERENCE_TABLES and a[t] == c[t]])
+    ok &= check(f"{backend}: --shards {shards} same for 1 and {shards} workers", [t for t in w1 if w1[t] != wn[t]])
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that data_gen.py output follows --seed and only --seed")
+    parser.add_argument("--backend", choices=["python", "numpy", "both"], default="both")
+    parser.add_argument("--scale", default="0.2")
+    parser.add_argument("--shards", type=int, default=3)
+    args = parser.parse_args()
+
+    ok = True
+    for backend in (["python", "numpy"] if args.backend == "both" else [args.backend]):
+        with tempfile.TemporaryDirectory() as root:
+            ok &= run_checks(root, backend, args.scale, args.shards)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Table layouts shared by data_gen.py, the writers in table_io.py and the
+# downstream tooling. Types mirror sql/ddl.sql.
+
+# Output tables in write order, with columns per schema
+TABLE_COLUMNS = {
+    "user": [
+        "user_id", "email", "phone", "display_name", "role", "is_active", "created_at", "updated_at"
+    ],
+    "student_profile": [
+        "user_id", "grade", "area_code", "subjects_of_interest"
+    ],
+    "tutor_profile": [
+        "user_id", "bio", "qualifications", "subjects_taught", "area_code", "mode", "base_price",
+        "rating_avg", "rating_count", "status", "reviewed_by", "reviewed_at"
+    ],
+    "admin_profile": [
+        "user_id", "role_type"
+    ],
+    "subject": [
+        "subject_code", "name", "level"
+    ],
+    "area": [
+        "area_code", "area_name", "lat", "lng"
+    ],
+    "venue": [
+        "venue_id", "name", "address", "area_code", "capacity"
+    ],
+    "class": [
+        "class_id", "tutor_id", "subject_code", "grade", "mode", "area_code", "venue_id",
+        "fee", "price_band", "capacity_seats", "status", "created_at", "published_at"
+    ],
+    "class_session": [
+        "session_id", "class_id", "session_date", "start_time", "end_time", "room",
+        "is_cancelled", "cancel_reason"
+    ],
+    "enrollment": [
+        "enrollment_id", "class_id", "student_id", "status", "enrolled_at", "cancelled_at", "cancel_reason"
+    ],
+    "invoice": [
+        "invoice_id", "enrollment_id", "amount_due", "due_date", "status", "created_at"
+    ],
+    "payment": [
+        "payment_id", "invoice_id", "paid_amount", "paid_at", "method", "proof_url",
+        "verify_status", "verified_by", "verified_at", "verify_note"
+    ],
+    "refund": [
+        "refund_id", "payment_id", "refund_amount", "refunded_at", "reason", "processed_by"
+    ],
+    "material": [
+        "material_id", "class_id", "title", "file_url", "allow_download", "uploaded_by", "uploaded_at"
+    ],
+    "announcement": [
+        "announcement_id", "scope", "class_id", "grade", "area_code", "title", "body", "created_by", "created_at"
+    ],
+    "message": [
+        "message_id", "sender_id", "recipient_id", "class_id", "text", "sent_at", "is_deleted"
+    ],
+    "notification": [
+        "notification_id", "recipient_id", "type", "title", "body", "is_read", "created_at"
+    ],
+    "rating": [
+        "rating_id", "student_id", "tutor_id", "class_id", "stars", "comment", "created_at"
+    ],
+    "event_interaction": [
+        "event_id", "student_id", "tutor_id", "class_id", "event_type", "query_text", "ts"
+    ],
+    "weekly_demand": [
+        "week_start", "subject_code", "area_code", "views", "clicks", "enrols"
+    ],
+}
+
+# Time-series tables written as dt=YYYY-MM-DD partitions by data_gen.py --partition,
+# with the timestamp they are partitioned and sorted on (PARTITION BY in ddl.sql)
+PARTITION_COLUMNS = {
+    "event_interaction": "ts",
+    "message": "sent_at",
+    "notification": "created_at",
+    "payment": "paid_at",
+}
+
+# Logical column types, named after BigQuery types; anything not listed is STRING
+COLUMN_TYPES = {
+    "grade": "INT64",
+    "capacity": "INT64",
+    "capacity_seats": "INT64",
+    "rating_count": "INT64",
+    "stars": "INT64",
+    "views": "INT64",
+    "clicks": "INT64",
+    "enrols": "INT64",
+    "rating_avg": "FLOAT64",
+    "lat": "FLOAT64",
+    "lng": "FLOAT64",
+    "base_price": "NUMERIC",
+    "fee": "NUMERIC",
+    "amount_due": "NUMERIC",
+    "paid_amount": "NUMERIC",
+    "refund_amount": "NUMERIC",
+    "session_date": "DATE",
+    "due_date": "DATE",
+    "week_start": "DATE",
+    "start_time": "TIME",
+    "end_time": "TIME",
+    "allow_download": "BOOL",
+    "subjects_of_interest": "ARRAY<STRING>",
+    "subjects_taught": "ARRAY<STRING>",
+}
+
+
+def column_type(column: str) -> str:
+    if column in COLUMN_TYPES:
+        return COLUMN_TYPES[column]
+    if column.startswith("is_"):
+        return "BOOL"
+    if column.endswith("_at") or column == "ts":
+        return "TIMESTAMP"
+    return "STRING"
+
+
+# table -> [(column, type)], in column order
+TABLE_SCHEMAS = {
+    table: [(c, column_type(c)) for c in columns]
+    for table, columns in TABLE_COLUMNS.items()
+}
+
+
+# Derived tables built locally from the generated data (sql/rec_features.sql, sql/rec_scoring_input.sql)
+FEATURE_COLUMNS = [
+    ("subject_match", "BOOL"),
+    ("grade_match", "BOOL"),
+    ("time_overlap", "BOOL"),
+    ("distance_bucket", "STRING"),
+    ("price_band_fit", "BOOL"),
+    ("tutor_popularity", "FLOAT64"),
+    ("past_clicks_30d", "INT64"),
+    ("past_enrols_90d", "INT64"),
+]
+
+FEATURE_SCHEMAS = {
+    "recs_training_pairs": [
+        ("student_id", "STRING"),
+        ("class_id", "STRING"),
+        ("label_clicked_or_enrolled", "BOOL"),
+    ] + FEATURE_COLUMNS,
+    "recs_scoring_input": [("student_id", "STRING"), ("class_id", "STRING")] + FEATURE_COLUMNS,
+    # Ranked top-K from local batch scoring (local_predict.py)
+    "recs_predictions": [
+        ("student_id", "STRING"),
+        ("class_id", "STRING"),
+        ("score", "FLOAT64"),
+        ("rank", "INT64"),
+    ],
+}
+
+# Local demand forecasts (demand_forecast.py), same columns as sql/forecast_next.sql and sql/subject_forecast.sql
+FORECAST_SCHEMAS = {
+    "weekly_demand_forecast": [
+        ("ts_id", "STRING"),
+        ("subject_code", "STRING"),
+        ("area_code", "STRING"),
+        ("week_start", "DATE"),
+        ("enrols_pred", "FLOAT64"),
+        ("pred_lo", "FLOAT64"),
+        ("pred_hi", "FLOAT64"),
+    ],
+    "subject_clicks_forecast": [
+        ("subject_code", "STRING"),
+        ("week_start", "DATE"),
+        ("clicks_pred", "FLOAT64"),
+        ("pred_lo", "FLOAT64"),
+        ("pred_hi", "FLOAT64"),
+    ],
+}
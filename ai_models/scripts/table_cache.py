@@ -0,0 +1,216 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from importlib import metadata
+
+
+# Content-addressed cache of generated tables for data_gen.py --cache. An entry
+# is what one generator task wrote (or a whole run, for the sequential and
+# sharded paths), keyed by a hash of the generator code, the options that
+# decide its rows (seed, counts, --as-of, ...) and the keys of the entries it
+# was built from, so a change upstream gives every table below it a new key.
+# Entries never change once stored:
+#   <cache_dir>/<key[:2]>/<key>/<table>.<ext>
+#   <cache_dir>/<key[:2]>/<key>/manifest.json     rows per table, bytes and sha256 per file
+# Reused files are hard-linked into the output directory (copied where a link
+# isn't possible). A manifest's mtime is its entry's last use; the least
+# recently used entries go once the cache is over its size limit.
+#
+#   python scripts\table_cache.py --verify        (re-hash every file, drop broken entries)
+
+MANIFEST = "manifest.json"
+DEFAULT_MAX_MB = 2048
+
+# Modules and packages whose code decides what the generators write
+SOURCES = ("data_gen.py", "data_gen_np.py", "event_sim.py", "ids.py", "workload.py", "text_pool.py",
+           "demand_rollup.py", "schemas.py", "table_io.py")
+PACKAGES = ("faker", "numpy", "pandas", "pyarrow")
+
+
+def code_version() -> str:
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(name.encode("utf-8") + b"\0" + f.read())
+    for package in PACKAGES:
+        try:
+            h.update(f"{package}=={metadata.version(package)}".encode("utf-8"))
+        except metadata.PackageNotFoundError:
+            pass
+    return h.hexdigest()[:16]
+
+
+def cache_key(*parts) -> str:
+    blob = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def walk_files(root: str):
+    # (relative path with "/", path) for every file under root
+    for dirpath, _, names in os.walk(root):
+        for name in sorted(names):
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def file_table(rel: str) -> str:
+    # "user.csv" or "user/part-00000.csv" -> "user"
+    return rel.split("/")[0].split(".")[0]
+
+
+def link_or_copy(src: str, dst: str):
+    # Swaps dst for the new file; an old dst (maybe itself a link) is never written through
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:  # other filesystem, or no hard links
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+class TableCache:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_MB << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str):
+        path = os.path.join(self.entry_dir(key), MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        os.utime(path)  # last use, for eviction
+        return manifest
+
+    def staging(self, key: str) -> str:
+        # Empty directory to write a new entry into; put() moves it into place
+        path = os.path.join(self.root, "tmp", f"{key}-{os.getpid()}")
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def put(self, key: str, staging: str, label: str, config, summary):
+        # summary: {table: (rows, bytes)} as returned by the writers
+        manifest = {
+            "key": key,
+            "label": label,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": config,
+            "tables": {t: list(v) for t, v in summary.items()},
+            "files": {rel: {"bytes": os.path.getsize(p), "sha256": file_sha256(p)} for rel, p in walk_files(staging)},
+        }
+        with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        target = self.entry_dir(key)
+        if os.path.exists(target):  # a concurrent run stored it first
+            shutil.rmtree(staging)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(staging, target)
+        return manifest
+
+    def link(self, manifest, out_dir: str, tables=None):
+        # Puts the entry's files (only those of `tables`, if given) into out_dir
+        root = self.entry_dir(manifest["key"])
+        for rel in manifest["files"]:
+            if tables is None or file_table(rel) in tables:
+                link_or_copy(os.path.join(root, rel), os.path.join(out_dir, *rel.split("/")))
+        return {t: tuple(v) for t, v in manifest["tables"].items() if tables is None or t in tables}
+
+    def entries(self):
+        # (last used, bytes, entry dir), oldest first
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for prefix in sorted(os.listdir(self.root)):
+            if prefix == "tmp" or not os.path.isdir(os.path.join(self.root, prefix)):
+                continue
+            for key in os.listdir(os.path.join(self.root, prefix)):
+                path = os.path.join(self.root, prefix, key)
+                manifest = os.path.join(path, MANIFEST)
+                if os.path.exists(manifest):
+                    size = sum(os.path.getsize(p) for _, p in walk_files(path))
+                    found.append((os.path.getmtime(manifest), size, path))
+        return sorted(found)
+
+    def evict(self):
+        # -> (entries removed, bytes left)
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path)
+            total -= size
+            removed += 1
+        return removed, total
+
+    def verify(self, workers: int = None):
+        # Re-hashes every file in parallel (hashlib releases the GIL) and removes
+        # entries with a missing or changed file. -> (files checked, bad entry dirs)
+        jobs = []
+        for _, _, path in self.entries():
+            with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+                files = json.load(f)["files"]
+            jobs += [(path, os.path.join(path, *rel.split("/")), info["sha256"]) for rel, info in files.items()]
+
+        def check(job):
+            entry, path, expected = job
+            return entry, os.path.exists(path) and file_sha256(path) == expected
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            bad = sorted({entry for entry, ok in pool.map(check, jobs) if not ok})
+        for entry in bad:
+            shutil.rmtree(entry)
+        return len(jobs), bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, verify or trim the data_gen.py table cache")
+    parser.add_argument("--cache-dir", default=os.path.join("data", "_cache", "tables"))
+    parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB, help="Evict least recently used entries past this")
+    parser.add_argument("--verify", action="store_true", help="Recompute every checksum and drop broken entries")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    cache = TableCache(args.cache_dir, args.max_mb << 20)
+    if args.verify:
+        checked, bad = cache.verify(args.workers)
+        for entry in bad:
+            print(f"removed {os.path.basename(entry)}: checksum mismatch or missing file")
+        print(f"Verified {checked:,} files on {args.workers} workers; {len(bad)} broken entries removed")
+    removed, total = cache.evict()
+    entries = cache.entries()
+    for used, size, path in entries:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        rows = sum(r for r, _ in manifest["tables"].values())
+        print(f"{os.path.basename(path)[:12]}  {manifest['label']:<18}  {rows:>12,} rows  {size / 1e6:>9.2f} MB  "
+              f"last used {datetime.fromtimestamp(used):%Y-%m-%d %H:%M}")
+    print(f"{len(entries)} entries, {total / 1e6:.1f} MB (limit {args.max_mb} MB); {removed} evicted")
+
+
+if __name__ == "__main__":
+    main()
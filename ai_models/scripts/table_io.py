@@ -0,0 +1,476 @@
+from __future__ import annotations
+
+import os
+import json
+import pickle
+import shutil
+from itertools import islice
+
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+CHUNK_SIZE = 50_000
+
+
+# -----------------------------
+# Batching
+# -----------------------------
+
+def chunked(table: str, rows, chunk_size: int = CHUNK_SIZE):
+    # Yield (table, batch) pairs from a list, iterator or DataFrame
+    if isinstance(rows, pd.DataFrame):
+        for start in range(0, len(rows), chunk_size):
+            yield table, rows.iloc[start:start + chunk_size]
+        return
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, chunk_size))
+        if not batch:
+            return
+        yield table, batch
+
+
+def routed(pairs, chunk_size: int = CHUNK_SIZE):
+    # Batch an interleaved stream of (table, row) pairs per table
+    buffers = {}
+    for table, row in pairs:
+        buf = buffers.setdefault(table, [])
+        buf.append(row)
+        if len(buf) >= chunk_size:
+            yield table, buf
+            buffers[table] = []
+    for table, buf in buffers.items():
+        if buf:
+            yield table, buf
+
+
+# -----------------------------
+# Arrow conversion
+# -----------------------------
+
+def arrow():
+    # pyarrow is only needed for the typed formats; keep CSV runs free of it
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+    except ImportError as exc:
+        raise SystemExit("Parquet/Arrow output needs pyarrow (pip install -r scripts/requirements.txt)") from exc
+    return pyarrow
+
+
+def arrow_type(logical: str):
+    pa = arrow()
+    return {
+        "STRING": pa.string(),
+        "INT64": pa.int64(),
+        "FLOAT64": pa.float64(),
+        "NUMERIC": pa.decimal128(12, 2),
+        "BOOL": pa.bool_(),
+        "DATE": pa.date32(),
+        "TIME": pa.time32("s"),
+        "TIMESTAMP": pa.timestamp("s", tz="UTC"),
+        "ARRAY<STRING>": pa.list_(pa.string()),
+    }[logical]
+
+
+def arrow_schema(schema):
+    pa = arrow()
+    return pa.schema([(name, arrow_type(logical)) for name, logical in schema])
+
+
+def arrow_column(series: pd.Series, logical: str):
+    # Generator values are CSV-shaped strings ("true", "2024-01-01T00:00:00Z", "1500.00", "");
+    # empty and missing become NULL, everything else is cast to the logical type
+    pa = arrow()
+    pc = pa.compute
+    if logical in ("BOOL", "INT64", "FLOAT64") and series.dtype != object:
+        # Already typed (feature tables); no round trip through strings
+        return pa.array(series, from_pandas=True).cast(arrow_type(logical))
+    if logical == "STRING" and isinstance(series.dtype, pd.CategoricalDtype):
+        return pa.array(series, from_pandas=True).dictionary_decode()
+    missing = series.isna().to_numpy()
+    values = series.astype(str).to_numpy(dtype=object)
+    missing |= values == ""
+    if logical == "ARRAY<STRING>":
+        return pa.array([None if m else json.loads(v) for v, m in zip(values, missing)], type=arrow_type(logical))
+    strings = pa.array(values, type=pa.string(), mask=missing)
+    if logical == "STRING":
+        return strings
+    if logical == "TIME":
+        return pc.cast(pc.strptime(strings, format="%H:%M:%S", unit="s"), pa.time32("s"))
+    return pc.cast(strings, arrow_type(logical))
+
+
+def to_arrow_table(batch, schema):
+    pa = arrow()
+    columns = [name for name, _ in schema]
+    df = batch.reindex(columns=columns) if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch, columns=columns)
+    return pa.table(
+        [arrow_column(df[name], logical) for name, logical in schema],
+        schema=arrow_schema(schema),
+    )
+
+
+# -----------------------------
+# Writers
+# -----------------------------
+
+def prepare_path(path: str):
+    # Writers never truncate in place: the old file may be hard-linked into the
+    # table cache (see table_cache.py), so it is unlinked first
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class CsvTableWriter:
+    def __init__(self, path: str, schema):
+        self.path = path
+        self.columns = [name for name, _ in schema]
+        self.bools = [name for name, logical in schema if logical == "BOOL"]
+        self.rows = 0
+        self.bytes = 0
+        prepare_path(path)
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        pd.DataFrame(columns=self.columns).to_csv(self._f, index=False)
+
+    def write(self, batch):
+        if isinstance(batch, pd.DataFrame):
+            df = batch.reindex(columns=self.columns, fill_value="")
+            for name in self.bools:
+                # Typed booleans are written like the generator's strings; NULL stays empty
+                if df[name].dtype != object:
+                    df[name] = df[name].map({True: "true", False: "false"})
+        else:
+            df = pd.DataFrame(batch, columns=self.columns)
+        df.to_csv(self._f, header=False, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        self.bytes = self._f.tell()
+        self._f.close()
+
+
+class ParquetTableWriter:
+    # Each batch becomes (at least) one row group
+    def __init__(self, path: str, schema, compression: str = "zstd"):
+        arrow()
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self.bytes = 0
+        prepare_path(path)
+        self._w = pq.ParquetWriter(path, arrow_schema(schema), compression=compression)
+
+    def write(self, batch):
+        table = to_arrow_table(batch, self.schema)
+        if table.num_rows:
+            self._w.write_table(table, row_group_size=table.num_rows)
+        self.rows += table.num_rows
+
+    def close(self):
+        self._w.close()
+        self.bytes = os.path.getsize(self.path)
+
+
+class ArrowIpcTableWriter:
+    # Uncompressed IPC file format so readers can memory-map it (see read_table)
+    def __init__(self, path: str, schema):
+        pa = arrow()
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self.bytes = 0
+        prepare_path(path)
+        self._sink = pa.OSFile(path, "wb")
+        self._w = pa.ipc.new_file(self._sink, arrow_schema(schema))
+
+    def write(self, batch):
+        table = to_arrow_table(batch, self.schema)
+        self._w.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        self._w.close()
+        self._sink.close()
+        self.bytes = os.path.getsize(self.path)
+
+
+FORMATS = {
+    "csv": CsvTableWriter,
+    "parquet": ParquetTableWriter,
+    "arrow": ArrowIpcTableWriter,
+}
+
+FORMAT_EXT = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+# -----------------------------
+# Date partitions
+# -----------------------------
+
+PARTITION_STATS = "_partitions.json"
+HIVE_DEFAULT = "__HIVE_DEFAULT_PARTITION__"  # rows with no value in the partition column
+
+
+def partition_days(column: pd.Series) -> pd.Series:
+    # YYYY-MM-DD of ISO strings ("2024-01-01T08:00:00Z") or typed timestamps
+    if pd.api.types.is_datetime64_any_dtype(column):
+        days = column.dt.strftime("%Y-%m-%d")
+    else:
+        days = column.astype(str).str[:10]
+    return days.fillna("").replace({"": HIVE_DEFAULT, "nan": HIVE_DEFAULT, "None": HIVE_DEFAULT})
+
+
+def iso_text(value) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ") if hasattr(value, "strftime") else str(value)
+
+
+class PartitionedTableWriter:
+    # Hive-style <table>/dt=YYYY-MM-DD/part-NNNNN.<ext> by a timestamp column,
+    # rows sorted by it within each day, with rows/min/max/files per day in
+    # <table>/_partitions.json. Rows arrive in any time order, so each batch is
+    # split by day and appended (pickled, dtypes intact) to a spill file per day;
+    # close() sorts and writes one day at a time, which bounds memory by the
+    # largest day rather than the table. append=True keeps the partitions already
+    # there (e.g. for --append-days): a day seen again gets further part files.
+    def __init__(self, path: str, schema, column: str, fmt: str = "csv", rows_per_file: int = CHUNK_SIZE,
+                 append: bool = False):
+        self.path = os.path.splitext(path)[0]
+        self.schema = schema
+        self.column = column
+        self.fmt = fmt
+        self.rows_per_file = rows_per_file
+        self.columns = [name for name, _ in schema]
+        self.rows = 0
+        self.bytes = 0
+        self.existing = {}
+        stats_path = os.path.join(self.path, PARTITION_STATS)
+        if append and os.path.exists(stats_path):
+            with open(stats_path, encoding="utf-8") as f:
+                self.existing = json.load(f)["partitions"]
+        elif not append:
+            clear_table(os.path.dirname(self.path), os.path.basename(self.path))
+        self.spill_dir = os.path.join(self.path, "_spill")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.days = set()
+
+    def write(self, batch):
+        df = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch, columns=self.columns)
+        for day, part in df.groupby(partition_days(df[self.column]), sort=False):
+            with open(os.path.join(self.spill_dir, f"{day}.pkl"), "ab") as f:
+                pickle.dump(part, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.days.add(day)
+        self.rows += len(df)
+
+    def read_spill(self, day: str) -> pd.DataFrame:
+        parts = []
+        with open(os.path.join(self.spill_dir, f"{day}.pkl"), "rb") as f:
+            while True:
+                try:
+                    parts.append(pickle.load(f))
+                except EOFError:
+                    break
+        return pd.concat(parts, ignore_index=True)
+
+    def close(self):
+        writer_cls, ext = FORMATS[self.fmt], FORMAT_EXT[self.fmt]
+        stats = dict(self.existing)
+        for day in sorted(self.days):
+            df = self.read_spill(day).sort_values(self.column, kind="stable", ignore_index=True)
+            before = self.existing.get(day, {"rows": 0, "min": None, "max": None, "files": []})
+            files = []
+            for i, start in enumerate(range(0, len(df), self.rows_per_file), start=len(before["files"])):
+                rel = f"dt={day}/part-{i:05d}{ext}"
+                writer = writer_cls(os.path.join(self.path, *rel.split("/")), self.schema)
+                writer.write(df.iloc[start:start + self.rows_per_file])
+                writer.close()
+                self.bytes += writer.bytes
+                files.append(rel)
+            values = df[self.column][partition_days(df[self.column]) != HIVE_DEFAULT]
+            bounds = [iso_text(values.iloc[0]), iso_text(values.iloc[-1])] if len(values) else []
+            lows = [v for v in (before["min"], *bounds[:1]) if v]
+            highs = [v for v in (before["max"], *bounds[1:]) if v]
+            stats[day] = {
+                "rows": before["rows"] + len(df),
+                "min": min(lows) if lows else None,
+                "max": max(highs) if highs else None,
+                "files": before["files"] + files,
+            }
+        shutil.rmtree(self.spill_dir)
+        with open(os.path.join(self.path, PARTITION_STATS), "w", encoding="utf-8") as f:
+            json.dump({"column": self.column, "format": self.fmt, "partitions": dict(sorted(stats.items()))}, f, indent=2)
+
+
+def clear_table(data_dir: str, table: str):
+    # Removes <table>.<ext> and any dt= partitions (increment and part files stay),
+    # so a table switching layout is never read twice
+    for ext in FORMAT_EXT.values():
+        path = os.path.join(data_dir, f"{table}{ext}")
+        if os.path.exists(path):
+            os.remove(path)
+    part_dir = os.path.join(data_dir, table)
+    if os.path.isdir(part_dir):
+        for name in os.listdir(part_dir):
+            path = os.path.join(part_dir, name)
+            if name.startswith("dt=") or name in ("_spill",):
+                shutil.rmtree(path)
+            elif name == PARTITION_STATS:
+                os.remove(path)
+        if not os.listdir(part_dir):
+            os.rmdir(part_dir)
+
+
+def partition_table(data_dir: str, table: str, schema, column: str, fmt: str = "csv", chunk_size: int = CHUNK_SIZE):
+    # Rewrites a flat table (one file or shard parts) as dt= partitions
+    sources = [f for f in table_files(data_dir, table) if not os.path.basename(f).startswith("inc-")]
+    staged = os.path.join(data_dir, f"_{table}")
+    shutil.rmtree(staged, ignore_errors=True)
+    writer = PartitionedTableWriter(os.path.join(staged, table), schema, column, fmt, chunk_size)
+    for path in sources:
+        for batch in iter_table_batches(path, chunk_size=chunk_size):
+            writer.write(batch)
+    writer.close()
+    for path in sources:
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    os.makedirs(os.path.join(data_dir, table), exist_ok=True)
+    for name in os.listdir(os.path.join(staged, table)):
+        os.replace(os.path.join(staged, table, name), os.path.join(data_dir, table, name))
+    shutil.rmtree(staged)
+    return writer.rows, writer.bytes
+
+
+class DatasetWriter:
+    # One open appending writer per table; chunks are written as they arrive.
+    # partition_by: {table: timestamp column} for tables written as dt= partitions;
+    # append adds to the partitions already there instead of replacing them
+    def __init__(self, table_schemas, path_for, fmt: str = "csv", partition_by=None, rows_per_file: int = CHUNK_SIZE,
+                 append: bool = False):
+        partition_by = partition_by or {}
+        self.writers = {
+            t: PartitionedTableWriter(path_for(t), schema, partition_by[t], fmt, rows_per_file, append)
+            if t in partition_by
+            else FORMATS[fmt](path_for(t), schema)
+            for t, schema in table_schemas.items()
+        }
+
+    def write(self, table: str, batch):
+        self.writers[table].write(batch)
+
+    def write_all(self, batches):
+        for table, batch in batches:
+            self.write(table, batch)
+
+    def close(self):
+        for w in self.writers.values():
+            w.close()
+        return {t: (w.rows, w.bytes) for t, w in self.writers.items()}
+
+
+def write_table(rows, path: str, schema, fmt: str = "csv"):
+    writer = FORMATS[fmt](path, schema)
+    writer.write(rows)
+    writer.close()
+    return writer.rows, writer.bytes
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+def table_files(data_dir: str, table: str, since=None, until=None):
+    # <table>.csv/.parquet/.arrow plus any part or increment files under <table>/
+    # and the files of its dt=YYYY-MM-DD partitions. since/until (dates,
+    # inclusive) skip the partitions outside that range.
+    since, until = (str(d)[:10] if d else None for d in (since, until))
+    files = [os.path.join(data_dir, f"{table}{ext}") for ext in FORMAT_EXT.values()]
+    files = [f for f in files if os.path.exists(f)][:1]
+    part_dir = os.path.join(data_dir, table)
+    if os.path.isdir(part_dir):
+        for name in sorted(os.listdir(part_dir)):
+            path = os.path.join(part_dir, name)
+            if name.startswith((".", "_")):
+                continue
+            if not name.startswith("dt="):
+                files.append(path)
+            elif name[3:] == HIVE_DEFAULT or ((not since or name[3:] >= since) and (not until or name[3:] <= until)):
+                files += sorted(os.path.join(path, f) for f in os.listdir(path) if not f.startswith((".", "_")))
+    if not files:
+        raise FileNotFoundError(f"No {table} table in {data_dir}")
+    return files
+
+
+def read_table(path: str, memory_map: bool = True) -> pd.DataFrame:
+    # Reads a single file or a directory of part files in any supported format
+    if os.path.isdir(path):
+        parts = sorted(os.path.join(path, f) for f in os.listdir(path) if not f.startswith((".", "_")))
+        return pd.concat([read_table(p, memory_map) for p in parts], ignore_index=True)
+    if path.endswith(".parquet"):
+        arrow()
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, memory_map=memory_map).to_pandas()
+    if path.endswith(".arrow"):
+        pa = arrow()
+        source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+        with source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    return pd.read_csv(path)
+
+
+def iter_table_batches(path: str, columns=None, chunk_size: int = CHUNK_SIZE):
+    # Streams one file as DataFrames of at most chunk_size rows (CSV values stay strings)
+    if path.endswith(".parquet"):
+        arrow()
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    if path.endswith(".arrow"):
+        pa = arrow()
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                df = reader.get_batch(i).to_pandas()
+                yield df[columns] if columns else df
+        return
+    yield from pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+def read_dataset(data_dir: str, table: str, memory_map: bool = True, since=None, until=None) -> pd.DataFrame:
+    return pd.concat([read_table(p, memory_map) for p in table_files(data_dir, table, since, until)],
+                     ignore_index=True)
+
+
+def peak_rss_mb(children: bool = False):
+    # children: the largest finished child process (e.g. a shard worker) instead of this one
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def print_summary(summary, workers: bool = False):
+    # workers: the run used a process pool, so its largest worker's peak is printed too
+    total_rows = sum(r for r, _ in summary.values())
+    total_bytes = sum(b for _, b in summary.values())
+    width = max(len(t) for t in summary)
+    print(f"{'table':<{width}}  {'rows':>12}  {'MB':>10}")
+    for table, (rows, size) in summary.items():
+        print(f"{table:<{width}}  {rows:>12,}  {size / 1e6:>10.2f}")
+    print(f"{'total':<{width}}  {total_rows:>12,}  {total_bytes / 1e6:>10.2f}")
+    peak = peak_rss_mb()
+    if peak is not None:
+        worker_peak = peak_rss_mb(children=True) if workers else None
+        print(f"Peak RSS: {peak:,.0f} MB" + (f" (largest worker process: {worker_peak:,.0f} MB)" if worker_peak else ""))
@@ -0,0 +1,106 @@
+from collections import namedtuple
+from time import time
+
+
+# Small task-graph executor. A task declares the values it needs and the ones
+# it makes; it is submitted to a process pool as soon as everything it needs
+# exists, so independent tasks overlap and a run takes about as long as its
+# longest dependency chain. Values no pending task needs are dropped.
+#
+#   Task(name, fn, needs=("class", "student_ids"), makes=("enrollment",))
+#   runner(name, fn, inputs) -> {key: value} for every key in makes (runs in a worker)
+
+Task = namedtuple("Task", "name fn needs makes")
+
+
+def timed_call(runner, name, fn, inputs):
+    started = time()
+    out = runner(name, fn, inputs)
+    return out, started, time()
+
+
+def check_graph(tasks):
+    producer = {}
+    for t in tasks:
+        for key in t.makes:
+            if key in producer:
+                raise ValueError(f"{key} is made by both {producer[key]} and {t.name}")
+            producer[key] = t.name
+    for t in tasks:
+        missing = [k for k in t.needs if k not in producer]
+        if missing:
+            raise ValueError(f"{t.name} needs {', '.join(missing)}, which no task makes")
+    return producer
+
+
+def upstream(tasks, keys):
+    # Just the tasks needed to make keys (their producers and everything those
+    # need, transitively), in their original order
+    producer = check_graph(tasks)
+    by_name = {t.name: t for t in tasks}
+    wanted, stack = set(), [producer[k] for k in keys]
+    while stack:
+        name = stack.pop()
+        if name not in wanted:
+            wanted.add(name)
+            stack.extend(producer[k] for k in by_name[name].needs)
+    return [t for t in tasks if t.name in wanted]
+
+
+def run_graph(tasks, runner, workers: int = 1, on_done=None):
+    # on_done(task, outputs) runs in this process as each task finishes.
+    # Returns {task name: (start offset, seconds)}.
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    check_graph(tasks)
+    pending = {t.name: t for t in tasks}
+    values, timings, running = {}, {}, {}
+    epoch = time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for t in [t for t in pending.values() if all(k in values for k in t.needs)]:
+                del pending[t.name]
+                future = pool.submit(timed_call, runner, t.name, t.fn, {k: values[k] for k in t.needs})
+                running[future] = t
+            if not running:
+                raise ValueError(f"Dependency cycle among: {', '.join(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                t = running.pop(future)
+                out, started, ended = future.result()
+                timings[t.name] = (started - epoch, ended - started)
+                values.update(out)
+                if on_done:
+                    on_done(t, out)
+            needed = {k for t in pending.values() for k in t.needs}
+            for key in [k for k in values if k not in needed]:
+                del values[key]
+    return timings
+
+
+def critical_path(tasks, timings):
+    # Longest chain of task seconds through the graph -> (names, seconds)
+    producer = check_graph(tasks)
+    by_name = {t.name: t for t in tasks}
+    best = {}
+
+    def longest(name):
+        if name not in best:
+            deps = {producer[k] for k in by_name[name].needs}
+            chain, secs = max((longest(d) for d in deps), key=lambda p: p[1], default=([], 0.0))
+            best[name] = (chain + [name], secs + timings[name][1])
+        return best[name]
+
+    return max((longest(t.name) for t in tasks), key=lambda p: p[1])
+
+
+def report(tasks, timings, wall: float):
+    path, path_secs = critical_path(tasks, timings)
+    width = max(len(t.name) for t in tasks)
+    print(f"{'task':<{width}}  {'start':>7}  {'secs':>7}")
+    for t in sorted(tasks, key=lambda t: timings[t.name][0]):
+        start, secs = timings[t.name]
+        print(f"{t.name:<{width}}  {start:>7.2f}  {secs:>7.2f}" + ("  *" if t.name in path else ""))
+    total = sum(secs for _, secs in timings.values())
+    print(f"Critical path (*): {' -> '.join(path)} = {path_secs:.2f}s; "
+          f"wall clock {wall:.2f}s; all tasks {total:.2f}s")
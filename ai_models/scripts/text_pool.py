@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import os
+import gzip
+import json
+import random
+
+from lazy import lazy_import
+
+faker = lazy_import("faker")
+np = lazy_import("numpy")
+
+
+# Pools of Faker text for data_gen.py. Faker is the slowest per-row call in the
+# generators (names, bios, titles, message bodies, ...); with a pool each field
+# is one index draw instead. Pools are deduplicated, built once per (locale,
+# seed, size, Faker version) from a private Faker instance, so building them
+# never moves the generators' random streams, and cached as gzipped JSON:
+#   <cache_dir>/textpool-<locale>-<seed>-<size>-faker<version>.json.gz
+
+# kind -> how one value is made
+KINDS = {
+    "name": lambda f: f.name(),
+    "company": lambda f: f.company(),
+    "address": lambda f: f.address(),
+    "sentence4": lambda f: f.sentence(nb_words=4),
+    "sentence5": lambda f: f.sentence(nb_words=5),
+    "sentence6": lambda f: f.sentence(nb_words=6),
+    "sentence10": lambda f: f.sentence(nb_words=10),
+    "sentence12": lambda f: f.sentence(nb_words=12),
+    "paragraph3": lambda f: f.paragraph(nb_sentences=3),
+}
+
+_LOADED = {}  # cache path -> TextPool, so shards in one process load it once
+
+
+def pool_path(cache_dir: str, locale: str, seed: int, size: int) -> str:
+    return os.path.join(cache_dir, f"textpool-{locale}-{seed}-{size}-faker{faker.VERSION}.json.gz")
+
+
+def build_pools(locale: str, seed: int, size: int):
+    fake = faker.Faker(locale)
+    fake.seed_instance(seed)
+    pools = {}
+    for kind, make in KINDS.items():
+        values = {}
+        # Small vocabularies (e.g. short sentences) can run out of new values
+        for _ in range(3 * size):
+            values[make(fake)] = None
+            if len(values) >= size:
+                break
+        pools[kind] = list(values)
+    return pools
+
+
+class TextPool:
+    def __init__(self, pools):
+        self.pools = pools
+        self.arrays = {}
+
+    @classmethod
+    def load(cls, size: int, locale: str = "en_US", seed: int = 0, cache_dir: str = "."):
+        path = pool_path(cache_dir, locale, seed, size)
+        if path not in _LOADED:
+            if os.path.exists(path):
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    pools = json.load(f)
+            else:
+                pools = build_pools(locale, seed, size)
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = path + ".tmp"
+                with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                    json.dump(pools, f)
+                os.replace(tmp, path)
+            _LOADED[path] = cls(pools)
+        return _LOADED[path]
+
+    def draw(self, kind: str) -> str:
+        # From the seeded `random` module, like every other draw in data_gen
+        pool = self.pools[kind]
+        return pool[random.randrange(len(pool))]
+
+    def sample(self, kind: str, rng: np.random.Generator, n: int) -> np.ndarray:
+        if kind not in self.arrays:
+            self.arrays[kind] = np.array(self.pools[kind], dtype=object)
+        values = self.arrays[kind]
+        return values[rng.integers(0, len(values), size=n)]
@@ -1,25 +1,60 @@
+import os
 import argparse
-from google.cloud import aiplatform
 
 
 def main():
 	parser = argparse.ArgumentParser()
-	parser.add_argument("--project", required=True)
+	parser.add_argument("--backend", choices=["vertex", "local", "fake"], default="vertex",
+		help="local scores a scoring-input file in a process pool (see local_predict.py); "
+		"fake runs the job orchestration without GCP (see batch_jobs.py)")
+	parser.add_argument("--project")
 	parser.add_argument("--location", default="asia-south1")
-	parser.add_argument("--model_id", required=True)
+	parser.add_argument("--model_id")
 	parser.add_argument("--bq_source", default="ai-classmate-sri-lanka-001.ai_classmate.recs_scoring_input")
 	parser.add_argument("--bq_destination_prefix", default="ai-classmate-sri-lanka-001.ai_classmate")
+	# --backend vertex / fake: sharded jobs, state kept in --state_file for resumption
+	parser.add_argument("--shards", type=int, default=1, help="Split --bq_source into N tables by student hash")
+	parser.add_argument("--max_concurrent", type=int, default=4)
+	parser.add_argument("--retries", type=int, default=2)
+	parser.add_argument("--state_file", default="batch_jobs.json")
+	parser.add_argument("--poll_seconds", type=float, default=15.0, help="First poll interval; doubles up to 5 minutes")
+	parser.add_argument("--no_wait", action="store_true", help="Submit and exit; rerun to resume polling")
+	# --backend local
+	parser.add_argument("--model_path", help="ML.WEIGHTS JSON, pickled/joblib classifier or XGBoost booster")
+	parser.add_argument("--source", default=os.path.join("data", "recs_scoring_input.parquet"))
+	parser.add_argument("--destination", default=os.path.join("data", "recs_predictions.parquet"))
+	parser.add_argument("--top_k", type=int, default=10)
+	parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+	parser.add_argument("--chunk_size", type=int, default=50_000)
 	args = parser.parse_args()
 
-	aiplatform.init(project=args.project, location=args.location)
-	model = aiplatform.Model(model_name=f"projects/{args.project}/locations/{args.location}/models/{args.model_id}")
+	if args.backend == "local":
+		if not args.model_path:
+			parser.error("--backend local requires --model_path")
+		from local_predict import run_local
+		run_local(args.model_path, args.source, args.destination, args.top_k, args.workers, args.chunk_size)
+		return
 
-	job = model.batch_predict(
-		bigquery_source=f"bq://{args.bq_source}",
-		bigquery_destination_prefix=f"bq://{args.bq_destination_prefix}",
-		sync=False,
+	from batch_jobs import FakeClient, VertexClient, run_jobs
+	if args.backend == "fake":
+		client = FakeClient(seconds=(args.poll_seconds, args.poll_seconds * 4))
+	else:
+		if not args.project or not args.model_id:
+			parser.error("--backend vertex requires --project and --model_id")
+		client = VertexClient(args.project, args.location, args.model_id)
+
+	run_jobs(
+		client,
+		args.bq_source,
+		args.bq_destination_prefix,
+		shards=args.shards,
+		max_concurrent=args.max_concurrent,
+		retries=args.retries,
+		state_path=args.state_file,
+		wait=not args.no_wait,
+		poll_initial=args.poll_seconds,
+		poll_max=300.0,
 	)
-	print(f"Batch prediction started: {job.resource_name}")
 
 
 if __name__ == "__main__":
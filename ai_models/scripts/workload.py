@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+# Skewed workload profiles for data_gen.py. Production traffic is Zipfian (a
+# few popular classes, star tutors, chatty users) and bursty (evenings, exam
+# season); that is what drives hot documents in Firestore. A profile gives
+#   zipf                 exponent for rank-based popularity of students, tutors and classes
+#   hot_class_fraction   share of classes that get hot_class_boost on top of their Zipf weight
+#   hour_weights         relative activity per local hour of day (Sri Lanka, UTC+5:30 rounded to 5h)
+#   exam_months          months whose days get exam_boost
+# Popularity follows an entity's position in its id list, so the same students
+# and classes are hot in enrollments, events, messages and notifications.
+# Every weighted draw goes through a precomputed alias table: O(1) per draw.
+
+# Local hour -> relative activity: school-day evenings peak, nights are quiet
+EVENING_HOURS = [0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 0.6, 0.8, 0.7, 0.6, 0.6, 0.7,
+                 0.8, 0.9, 1.2, 1.6, 2.2, 2.6, 2.8, 2.6, 2.2, 1.5, 0.8, 0.3]
+LOCAL_OFFSET = timedelta(hours=5, minutes=30)  # Asia/Colombo
+
+PROFILES = {
+    "uniform": None,
+    "zipf": {"zipf": 1.1, "hot_class_fraction": 0.02, "hot_class_boost": 5.0,
+             "hour_weights": None, "exam_months": [], "exam_boost": 1.0},
+    "peak": {"zipf": 1.1, "hot_class_fraction": 0.02, "hot_class_boost": 5.0,
+             "hour_weights": EVENING_HOURS, "exam_months": [7, 8, 11, 12], "exam_boost": 2.5},
+}
+
+
+def profile_params(name: str, **overrides):
+    # Profile dict with non-None overrides applied; None for the uniform profile
+    base = PROFILES[name]
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    if base is None and not overrides:
+        return None
+    params = dict(base or PROFILES["zipf"])
+    if base is None:
+        # Overrides on "uniform" start from no skew at all
+        params.update(zipf=0.0, hot_class_fraction=0.0)
+    params.update(overrides)
+    return params
+
+
+class AliasTable:
+    # Vose's alias method: O(n) to build, O(1) per draw
+
+    def __init__(self, weights):
+        w = np.asarray(weights, dtype=float)
+        n = len(w)
+        p = w * n / w.sum()
+        prob = np.ones(n)
+        alias = np.arange(n)
+        small = np.flatnonzero(p < 1).tolist()
+        large = np.flatnonzero(p >= 1).tolist()
+        while small and large:
+            s, g = small.pop(), large.pop()
+            prob[s] = p[s]
+            alias[s] = g
+            p[g] -= 1 - p[s]
+            (small if p[g] < 1 else large).append(g)
+        self.n = n
+        self.prob = prob
+        self.alias = alias
+        # Python lists index faster than arrays for single draws
+        self._prob = prob.tolist()
+        self._alias = alias.tolist()
+
+    def draw(self) -> int:
+        # From the seeded `random` module, like every other draw in data_gen
+        u = random.random() * self.n
+        i = int(u)
+        return i if u - i < self._prob[i] else self._alias[i]
+
+    def draws(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        i = rng.integers(0, self.n, size=size)
+        return np.where(rng.random(size) < self.prob[i], i, self.alias[i])
+
+
+class Workload:
+    def __init__(self, params):
+        self.params = params
+        self.tables = {}
+
+    def weights(self, kind: str, n: int) -> np.ndarray:
+        w = 1.0 / np.arange(1, n + 1) ** self.params["zipf"]
+        if kind == "class" and self.params["hot_class_fraction"] > 0:
+            hot = max(1, int(round(n * self.params["hot_class_fraction"])))
+            w[:hot] *= self.params["hot_class_boost"]
+        return w
+
+    def table(self, kind: str, n: int) -> AliasTable:
+        key = (kind, n)
+        if key not in self.tables:
+            self.tables[key] = AliasTable(self.weights(kind, n))
+        return self.tables[key]
+
+    def pick(self, kind: str, items):
+        return items[self.table(kind, len(items)).draw()]
+
+    def pick_recipient(self, student_ids, tutor_ids):
+        # Students and tutors each keep their own popularity ranks
+        key = ("recipient", len(student_ids), len(tutor_ids))
+        if key not in self.tables:
+            w = np.concatenate([self.weights("student", len(student_ids)), self.weights("tutor", len(tutor_ids))])
+            self.tables[key] = AliasTable(w)
+        i = self.tables[key].draw()
+        return student_ids[i] if i < len(student_ids) else tutor_ids[i - len(student_ids)]
+
+    # Timestamps: day and local hour from alias tables, seconds uniform
+
+    def calendar(self, start: datetime, end: datetime):
+        key = ("calendar", start, end)
+        if key not in self.tables:
+            days = max(1, (end - start).days)
+            months = np.array([(start + timedelta(days=d)).month for d in range(days)])
+            boost = np.where(np.isin(months, self.params["exam_months"]), self.params["exam_boost"], 1.0)
+            hours = self.params["hour_weights"] or [1.0] * 24
+            # Table hour h is UTC; weight it by the local hour it falls in
+            local = [hours[(h + int(LOCAL_OFFSET.total_seconds()) // 3600) % 24] for h in range(24)]
+            self.tables[key] = (AliasTable(boost), AliasTable(local))
+        return self.tables[key]
+
+    def timestamp(self, start: datetime, end: datetime) -> datetime:
+        days, hours = self.calendar(start, end)
+        ts = start + timedelta(days=days.draw(), hours=hours.draw(), seconds=random.randrange(3600))
+        return min(ts, end - timedelta(seconds=1))
+
+    def timestamps(self, rng: np.random.Generator, size: int, start: datetime, end: datetime) -> np.ndarray:
+        # Epoch seconds, for data_gen_np
+        days, hours = self.calendar(start, end)
+        base = int((start - datetime(1970, 1, 1)).total_seconds())
+        ts = base + days.draws(rng, size) * 86400 + hours.draws(rng, size) * 3600 + rng.integers(0, 3600, size=size)
+        return np.minimum(ts, int((end - datetime(1970, 1, 1)).total_seconds()) - 1)